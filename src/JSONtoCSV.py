@@ -1,7 +1,16 @@
 import json
 import csv
+import time
 import pandas as pd
+from collections import Counter
 from pathlib import Path
+from typing import Iterator
+
+READ_CHUNK_SIZE = 1 << 20
+# Batas ukuran satu record, agar file yang rusak tidak terbaca seluruhnya ke memori
+MAX_RECORD_SIZE = 64 * READ_CHUNK_SIZE
+PROGRESS_EVERY = 100_000
+JSON_WHITESPACE = ' \t\n\r'
 
 def extract_text_to_csv(json_file_path, output_csv_path='extracted_text.csv'):
     """
@@ -88,6 +97,176 @@ def extract_text_to_csv_basic(json_file_path, output_csv_path='extracted_text.cs
     except Exception as e:
         print(f"Error: {str(e)}")
 
+def iter_json_records(json_file_path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """
+    Membaca record satu per satu dari file JSON array (`[{...}, {...}]`) atau
+    JSON-lines (satu object per baris), tanpa memuat seluruh file ke memori.
+    
+    Args:
+        json_file_path (str): Path ke file JSON / JSONL
+        chunk_size (int): Jumlah karakter yang dibaca per sekali baca
+    
+    Yields:
+        Setiap record (biasanya dict) sesuai urutan di file
+    """
+    decoder = json.JSONDecoder()
+    
+    with open(json_file_path, 'r', encoding='utf-8') as file:
+        buffer = file.read(chunk_size)
+        is_eof = len(buffer) < chunk_size
+        
+        # Spasi di awal file bisa lebih panjang dari satu chunk
+        while not is_eof and not buffer.lstrip(JSON_WHITESPACE):
+            buffer = file.read(chunk_size)
+            is_eof = len(buffer) < chunk_size
+        position = len(buffer) - len(buffer.lstrip(JSON_WHITESPACE))
+        
+        # JSON array: lewati '[' pembuka, pemisah record berupa ','
+        is_array = buffer[position:position + 1] == '['
+        if is_array:
+            position += 1
+        
+        while True:
+            # Lewati spasi dan pemisah antar record
+            while position < len(buffer) and (buffer[position] in JSON_WHITESPACE or (is_array and buffer[position] == ',')):
+                position += 1
+            
+            if position < len(buffer) and is_array and buffer[position] == ']':
+                return
+            
+            if position >= len(buffer):
+                if is_eof:
+                    # JSON array tanpa ']' penutup berarti file terpotong
+                    if is_array:
+                        raise json.JSONDecodeError("Array tidak ditutup dengan ']'", buffer, position)
+                    return
+                buffer = file.read(chunk_size)
+                position = 0
+                is_eof = len(buffer) < chunk_size
+                continue
+            
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                record, end = None, None
+            
+            # Record yang terpotong di akhir buffer: baca chunk berikutnya lalu ulangi
+            if end is None or (end == len(buffer) and not is_eof):
+                if is_eof or len(buffer) - position > MAX_RECORD_SIZE:
+                    raise json.JSONDecodeError("Record tidak lengkap atau tidak valid", buffer, position)
+                more = file.read(chunk_size)
+                is_eof = len(more) < chunk_size
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            
+            yield record
+            position = end
+
+def get_field(record: dict, field: str):
+    """Ambil field dari record, field bertingkat ditulis dengan titik (contoh: `authorMeta.name`)."""
+    value = record
+    for key in field.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    
+    return value
+
+def extract_text_to_csv_streaming(
+        json_file_path,
+        output_csv_path='extracted_text.csv',
+        fields: tuple = ('text',),
+        batch_size: int = 10_000,
+        chunk_size: int = READ_CHUNK_SIZE
+    ) -> dict:
+    """
+    Versi streaming dari `extract_text_to_csv` untuk file hasil scraper yang
+    berukuran besar (beberapa GB). Record dibaca satu per satu dan ditulis ke
+    CSV per batch, sehingga pemakaian memori hanya bergantung pada `batch_size`.
+    
+    Record tanpa field 'text' dilewati, field tambahan yang tidak ada diisi
+    kosong. Warning tidak dicetak per record, tetapi dirangkum di akhir.
+    
+    Args:
+        json_file_path (str): Path ke file JSON array atau JSONL
+        output_csv_path (str): Path untuk output file CSV
+        fields (tuple): Field yang diambil, 'text' wajib ada
+        batch_size (int): Jumlah baris yang ditulis ke CSV per batch
+        chunk_size (int): Jumlah karakter yang dibaca dari file per sekali baca
+    
+    Returns:
+        Statistik ekstraksi (jumlah record, jumlah text, field yang hilang,
+        panjang komentar), atau None jika terjadi error
+    """
+    fields = list(dict.fromkeys(['text', *fields]))
+    missing_fields = Counter()
+    first_missing = {}
+    stats = {'records': 0, 'extracted': 0, 'total_length': 0, 'max_length': 0, 'min_length': None}
+    
+    start_time = time.perf_counter()
+    
+    try:
+        with open(output_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['index', *fields])
+            
+            rows = []
+            for i, item in enumerate(iter_json_records(json_file_path, chunk_size)):
+                stats['records'] += 1
+                item = item if isinstance(item, dict) else {}
+                
+                values = [get_field(item, field) for field in fields]
+                for field, value in zip(fields, values):
+                    if value is None:
+                        missing_fields[field] += 1
+                        first_missing.setdefault(field, i + 1)
+                
+                text = values[0]
+                if text is None:
+                    continue
+                
+                text = str(text)
+                stats['extracted'] += 1
+                stats['total_length'] += len(text)
+                stats['max_length'] = max(stats['max_length'], len(text))
+                stats['min_length'] = len(text) if stats['min_length'] is None else min(stats['min_length'], len(text))
+                
+                rows.append([i + 1, text, *('' if value is None else value for value in values[1:])])
+                
+                if len(rows) >= batch_size:
+                    writer.writerows(rows)
+                    rows = []
+                
+                if stats['records'] % PROGRESS_EVERY == 0:
+                    elapsed = time.perf_counter() - start_time
+                    print(f"{stats['records']:,} record dibaca ({stats['records'] / max(elapsed, 1e-9):,.0f} record/detik)")
+            
+            writer.writerows(rows)
+    
+    except FileNotFoundError:
+        print(f"Error: File '{json_file_path}' tidak ditemukan.")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"Error: File '{json_file_path}' bukan format JSON yang valid ({e.msg}, record ke-{stats['records'] + 1}).")
+        return None
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return None
+    
+    elapsed = time.perf_counter() - start_time
+    size_mb = Path(json_file_path).stat().st_size / (1024 * 1024)
+    
+    print(f"Berhasil mengekstrak {stats['extracted']:,} dari {stats['records']:,} record ke '{output_csv_path}'")
+    print(f"Waktu: {elapsed:.2f} detik ({stats['records'] / max(elapsed, 1e-9):,.0f} record/detik, {size_mb / max(elapsed, 1e-9):,.1f} MB/detik)")
+    
+    # Rangkuman warning, satu baris per field
+    for field, count in missing_fields.items():
+        print(f"Warning: {count:,} record tidak memiliki field '{field}' (pertama: record ke-{first_missing[field]})")
+    
+    stats['missing_fields'] = dict(missing_fields)
+    return stats
+
 # Penggunaan
 if __name__ == "__main__":
     # Path ke file JSON Anda
@@ -96,18 +275,22 @@ if __name__ == "__main__":
     # Path output CSV
     output_file = r"data/CSV/tiktok_comments_text.csv"
     
-    # Ekstrak text menggunakan pandas (direkomendasikan)
-    print("=== Menggunakan Pandas ===")
-    df = extract_text_to_csv(json_file, output_file)
+    # Ekstrak text secara streaming (direkomendasikan, memori tetap kecil untuk file besar)
+    print("=== Menggunakan Streaming ===")
+    stats = extract_text_to_csv_streaming(json_file, output_file)
+    
+    # Atau memuat seluruh file dengan pandas
+    # print("=== Menggunakan Pandas ===")
+    # df = extract_text_to_csv(json_file, output_file)
     
     # Atau menggunakan versi basic tanpa pandas
     # print("=== Menggunakan CSV Writer Basic ===")
     # extract_text_to_csv_basic(json_file, "tiktok_comments_text_basic.csv")
     
     # Statistik tambahan jika berhasil
-    if df is not None:
+    if stats is not None and stats['extracted']:
         print(f"\n=== Statistik ===")
-        print(f"Total komentar: {len(df)}")
-        print(f"Rata-rata panjang komentar: {df['text'].str.len().mean():.1f} karakter")
-        print(f"Komentar terpanjang: {df['text'].str.len().max()} karakter")
-        print(f"Komentar terpendek: {df['text'].str.len().min()} karakter")
\ No newline at end of file
+        print(f"Total komentar: {stats['extracted']}")
+        print(f"Rata-rata panjang komentar: {stats['total_length'] / stats['extracted']:.1f} karakter")
+        print(f"Komentar terpanjang: {stats['max_length']} karakter")
+        print(f"Komentar terpendek: {stats['min_length']} karakter")
\ No newline at end of file
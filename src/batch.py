@@ -0,0 +1,254 @@
+"""
+Headless runner for the whole text mining flow, without any questionary menu.
+
+Usage:
+    python src/batch.py --config config/pipeline.yaml
+    python src/batch.py --steps "Data cleaning,Case folding,Tokenizing" --workers 4 --no-sentiment
+
+Options given on the command line override the YAML file. Relative paths are
+resolved against the project root.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from constants import BASE_PATH, DATASET_FILE_PATH, RUN_REPORT_DIR, SENTIMENT_OUTPUT_DIR, STAGE_CACHE_DIR, TIMESTAMP
+from helpers.io import OUTPUT_FORMATS, duplicate_positions, read_stage_file, row_weights
+from helpers.metrics import RunReport, path_size
+from helpers.parallel import DEFAULT_SHARD_SIZE
+from helpers.stage_cache import DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_SIZE_MB, StageCache
+from pipeline import resolve_step_name, run_pipeline, run_pipeline_streaming, validate_steps
+
+
+DEFAULT_CONFIG = {
+    'input': str(DATASET_FILE_PATH),
+    'steps': ["Data cleaning", "Case folding", "Word repair", "Stopword removal", "Stemming", "Tokenizing"],
+    'output_format': 'auto',
+    'workers': 1,
+    'shard_size': DEFAULT_SHARD_SIZE,
+    'chunk_size': None,
+    'save_checkpoints': False,
+    'token_ids': True,
+    'cache': {
+        'enabled': True,
+        'max_size_mb': DEFAULT_MAX_SIZE_MB,
+        'max_age_days': DEFAULT_MAX_AGE_DAYS,
+    },
+    'vectorize': True,
+    'incremental_tfidf': False,
+    'word_cloud': False,
+    'sentiment': {
+        'enabled': True,
+        'label_new_tokens': False,
+        'weighted': False,
+        'neutral': False,
+        'batch_size': 64,
+        'num_threads': None,
+        'model': None,
+        'backend': 'fp32',
+    },
+    'metrics': True,
+    'trace_memory': False,
+}
+
+
+def resolve_path(path: str) -> Path:
+    path = Path(path)
+    return path if path.is_absolute() else BASE_PATH / path
+
+def load_config(config_file: Path = None) -> dict:
+    config = {**DEFAULT_CONFIG, 'cache': dict(DEFAULT_CONFIG['cache']), 'sentiment': dict(DEFAULT_CONFIG['sentiment'])}
+
+    if config_file is not None:
+        with open(config_file, 'r', encoding='utf-8') as file:
+            file_config = yaml.safe_load(file) or {}
+
+        config.update({key: value for key, value in file_config.items() if key not in ('cache', 'sentiment')})
+        config['cache'].update(file_config.get('cache') or {})
+        config['sentiment'].update(file_config.get('sentiment') or {})
+
+    return config
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run preprocessing, TF-IDF vectorization and sentiment analysis unattended.")
+    parser.add_argument('--config', type=Path, help="YAML pipeline spec")
+    parser.add_argument('--input', help="Source CSV file with a `text` column, or a token store")
+    parser.add_argument('--steps', help="Comma separated preprocessing steps, in order (e.g. 'data-cleaning,tokenizing')")
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, help="'auto' stores token lists as a token store, 'csv' always writes CSV")
+    parser.add_argument('--workers', type=int, help="Worker processes for data cleaning and stemming")
+    parser.add_argument('--shard-size', type=int, help="Rows sent to a worker process at a time")
+    parser.add_argument('--chunk-size', type=int, help="Stream the input in chunks of this many rows")
+    parser.add_argument('--save-checkpoints', action=argparse.BooleanOptionalAction, default=None, help="Also write the output of every intermediate step")
+    parser.add_argument('--token-ids', action=argparse.BooleanOptionalAction, default=None, help="Run the token level steps after tokenizing on interned token IDs")
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=None, help="Reuse cached outputs of unchanged preprocessing steps")
+    parser.add_argument('--vectorize', action=argparse.BooleanOptionalAction, default=None, help="Run TF-IDF vectorization after preprocessing")
+    parser.add_argument('--incremental-tfidf', action=argparse.BooleanOptionalAction, default=None, help="Add the documents to the persistent TF-IDF state instead of refitting")
+    parser.add_argument('--word-cloud', action=argparse.BooleanOptionalAction, default=None, help="Generate a word cloud after vectorization")
+    parser.add_argument('--sentiment', action=argparse.BooleanOptionalAction, default=None, help="Run sentiment analysis after vectorization")
+    parser.add_argument('--label-new-tokens', action=argparse.BooleanOptionalAction, default=None, help="Label tokens missing from the lexicon store with IndoBERT")
+    parser.add_argument('--neutral', action=argparse.BooleanOptionalAction, default=None, help="Label comments scoring zero 'neutral' instead of 'negative'")
+    parser.add_argument('--sentiment-backend', choices=['fp32', 'int8'], help="IndoBERT inference backend, 'int8' quantizes the linear layers for CPU")
+    parser.add_argument('--metrics', action=argparse.BooleanOptionalAction, default=None, help="Write a JSON report of per-stage timings, memory, rows and bytes")
+    parser.add_argument('--trace-memory', action=argparse.BooleanOptionalAction, default=None, help="Also record the tracemalloc peak of every stage (slower)")
+
+    return parser.parse_args(argv)
+
+def merge_args(config: dict, args: argparse.Namespace) -> dict:
+    overrides = {
+        'input': args.input,
+        'steps': args.steps.split(',') if args.steps else None,
+        'output_format': args.output_format,
+        'workers': args.workers,
+        'shard_size': args.shard_size,
+        'chunk_size': args.chunk_size,
+        'save_checkpoints': args.save_checkpoints,
+        'token_ids': args.token_ids,
+        'vectorize': args.vectorize,
+        'incremental_tfidf': args.incremental_tfidf,
+        'word_cloud': args.word_cloud,
+        'metrics': args.metrics,
+        'trace_memory': args.trace_memory,
+    }
+    config.update({key: value for key, value in overrides.items() if value is not None})
+
+    if args.cache is not None:
+        config['cache']['enabled'] = args.cache
+    if args.sentiment is not None:
+        config['sentiment']['enabled'] = args.sentiment
+    if args.label_new_tokens is not None:
+        config['sentiment']['label_new_tokens'] = args.label_new_tokens
+    if args.neutral is not None:
+        config['sentiment']['neutral'] = args.neutral
+    if args.sentiment_backend is not None:
+        config['sentiment']['backend'] = args.sentiment_backend
+
+    config['steps'] = [resolve_step_name(step) for step in config['steps']]
+
+    return config
+
+def run(config: dict) -> dict:
+    """Run the flow described by `config` and return the produced outputs."""
+    report = RunReport("batch", enabled=config['metrics'], trace_memory=config['trace_memory'])
+
+    try:
+        return run_stages(config, report)
+    finally:
+        report_file_name = report.export(RUN_REPORT_DIR / f"batch_{TIMESTAMP}.json")
+        if report_file_name:
+            print(f"Run metrics report successfully exported as {report_file_name}")
+
+def run_stages(config: dict, report: RunReport) -> dict:
+    steps = config['steps']
+    validate_steps(steps)
+    if config['output_format'] not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {config['output_format']}")
+
+    source_file = resolve_path(config['input'])
+    print(f"Input: {source_file}")
+    print(f"Steps: {' -> '.join(steps) if steps else '(none)'}")
+
+    cache_config = config['cache']
+    stage_cache = None
+    if cache_config['enabled']:
+        stage_cache = StageCache(STAGE_CACHE_DIR, cache_config['max_size_mb'], cache_config['max_age_days'])
+
+    pipeline_options = {
+        'save_checkpoints': config['save_checkpoints'],
+        'stage_cache': stage_cache,
+        'workers': config['workers'],
+        'shard_size': config['shard_size'],
+        'output_format': config['output_format'],
+        'token_ids': config['token_ids'],
+        'report': report,
+    }
+
+    if not steps:
+        with report.stage("Reading source") as stage:
+            preprocessed_df = read_stage_file(source_file)
+            stage.add(rows_out=len(preprocessed_df), bytes_read=path_size(source_file))
+    elif config['chunk_size']:
+        output_path = run_pipeline_streaming(steps, source_file=source_file, chunk_size=config['chunk_size'], **pipeline_options)
+        preprocessed_df = None
+        if config['vectorize']:
+            with report.stage("Reading preprocessed output") as stage:
+                preprocessed_df = read_stage_file(output_path)
+                stage.add(rows_out=len(preprocessed_df), bytes_read=path_size(output_path))
+    else:
+        preprocessed_df = run_pipeline(steps, source_file=source_file, **pipeline_options)
+
+    result = {'steps': steps}
+    if not config['vectorize']:
+        return result
+
+    # Vectorization pulls in scikit-learn, only import it when it is needed
+    from tf_idf import analyze_vocabulary_stats_df, compute_tfidf, update_tfidf
+    from deduplication import expand_duplicates
+    from incremental_tf_idf import DEFAULT_DRIFT_THRESHOLD
+
+    analyze_vocabulary_stats_df(preprocessed_df, 'text')
+    if config['incremental_tfidf']:
+        # The incremental state counts every comment as its own row
+        preprocessed_df = expand_duplicates(preprocessed_df)
+        tfidf_matrix, model = update_tfidf(preprocessed_df, token_column="text", drift_threshold=config.get('idf_drift_threshold', DEFAULT_DRIFT_THRESHOLD), report=report)
+        terms = model.terms
+    else:
+        tfidf_matrix, vectorizer = compute_tfidf(preprocessed_df, token_column="text", preprocessing_steps=steps, report=report)
+        terms = vectorizer.get_feature_names_out()
+
+    if config['word_cloud']:
+        from word_cloud import visualize_word_cloud
+        with report.stage("Word cloud"):
+            visualize_word_cloud(tfidf_matrix, terms, sample_weight=row_weights(preprocessed_df))
+
+    sentiment_config = config['sentiment']
+    if not sentiment_config['enabled']:
+        return result
+
+    from sentiment_analysis import PRETRAINED_MODEL, run_sentiment
+
+    with report.stage("Sentiment analysis") as stage:
+        labels, summary = run_sentiment(
+            tfidf_matrix,
+            terms,
+            label_new_tokens=sentiment_config['label_new_tokens'],
+            weighted=sentiment_config['weighted'],
+            neutral=sentiment_config['neutral'],
+            sample_weight=row_weights(preprocessed_df),
+            batch_size=sentiment_config['batch_size'],
+            num_threads=sentiment_config['num_threads'],
+            pretrained=sentiment_config['model'] or PRETRAINED_MODEL,
+            backend=sentiment_config['backend']
+        )
+        stage.add(rows_in=tfidf_matrix.shape[0], rows_out=len(labels))
+
+    SENTIMENT_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output_file_name = SENTIMENT_OUTPUT_DIR / f"sentiment_{TIMESTAMP}.csv"
+    with report.stage("Saving sentiment") as stage:
+        # One label per source comment, collapsed comments get the label of the text they were collapsed into
+        index, positions = duplicate_positions(preprocessed_df)
+        pd.DataFrame({'index': index, 'sentiment': labels[positions]}).to_csv(output_file_name, index=False)
+        stage.add(rows_in=len(labels), rows_out=len(index), bytes_written=path_size(output_file_name))
+    print(f"Sentiment CSV file successfully exported as {output_file_name}")
+
+    result['sentiment'] = summary
+    return result
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+
+    try:
+        config = merge_args(load_config(args.config), args)
+        run(config)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    print("=== BATCH RUN IS DONE ===")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,482 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
+
+from constants import BENCHMARK_DIR, CUSTOM_DICTIONARY_FILE_PATH, DATASET_FILE_PATH, TIMESTAMP
+from helpers.metrics import max_rss_mb
+from data_cleaning import clean_texts, clean_text_batch, clean_text_data, clean_text_data_stepwise
+from stopword import remove_stopwords
+
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+
+# Entry point -> (import time budget in seconds, heavy modules it must not load at import)
+IMPORT_BUDGETS = {
+    'main': (0.5, ['pandas', 'sklearn', 'torch', 'wordcloud', 'matplotlib', 'Sastrawi', 'pipeline']),
+    'batch': (1.0, ['sklearn', 'torch', 'wordcloud', 'matplotlib', 'Sastrawi', 'stemming']),
+    'pipeline': (1.0, ['sklearn', 'torch', 'wordcloud', 'matplotlib', 'Sastrawi', 'stemming']),
+}
+IMPORT_TIME_RUNS = 5
+
+# The int8 backend may label at most this share of tokens differently from fp32
+LABEL_DISAGREEMENT_TOLERANCE = 0.03
+DEFAULT_LABELLING_TOKENS = 2_000
+GENERATION_CHUNK_ROWS = 100_000
+
+# Share of generated tokens per kind, the rest are words drawn from the sample dataset
+NOISE_TOKEN_SHARES = {
+    'slang': 0.15,
+    'elongated': 0.03,
+    'emoji': 0.03,
+    'mention': 0.01,
+    'hashtag': 0.01,
+    'url': 0.005,
+    'punctuation': 0.02,
+}
+EMOJIS = ['😂', '😭', '🤣', '🙏', '😡', '👍', '🔥', '😅', '❤️', '🥲']
+PUNCTUATION = ['!!', '??', '...', '!?', ',', '.']
+HASHTAGS = ['#pln', '#diskonlistrik', '#fyp', '#tokenlistrik', '#viral']
+
+
+def sample_comments(rows: int, seed: int = 42) -> pd.Series:
+    """Build a corpus of `rows` cleaned, lowercased comments by resampling the dataset."""
+    source_df = pd.read_csv(DATASET_FILE_PATH)
+    texts = clean_texts(source_df['text']).str.lower()
+    
+    return texts.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+
+def time_call(func, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def benchmark_stopword_removal(rows: int = 1_000_000) -> dict:
+    print(f"\nStopword removal benchmark on {rows:,} comments")
+    texts = sample_comments(rows)
+    
+    sastrawi_remover = StopWordRemoverFactory().create_stop_word_remover()
+    sastrawi_result, sastrawi_seconds = time_call(texts.apply, sastrawi_remover.remove)
+    set_result, set_seconds = time_call(remove_stopwords, texts, more_stop_words=[])
+    
+    # Sastrawi keeps a stop word that directly follows another one, so rows may differ
+    agreement = (sastrawi_result == set_result).mean()
+    
+    print(f"Sastrawi StopWordRemover : {sastrawi_seconds:.2f}s ({rows / sastrawi_seconds:,.0f} rows/s)")
+    print(f"Set-based stopword       : {set_seconds:.2f}s ({rows / set_seconds:,.0f} rows/s)")
+    print(f"Speedup                  : {sastrawi_seconds / set_seconds:.1f}x")
+    print(f"Identical rows           : {agreement:.2%}")
+    
+    return {
+        'rows': rows,
+        'sastrawi_seconds': sastrawi_seconds,
+        'set_seconds': set_seconds,
+        'agreement': float(agreement)
+    }
+
+def synthetic_comments(rows: int, seed: int = 42) -> pd.Series:
+    """
+    Generate `rows` raw TikTok-like comments, reproducibly for a given seed.
+    
+    Words and comment lengths follow the sample dataset; slang from the
+    custom dictionary, elongated words ("bangettt"), emojis, mentions,
+    hashtags, URLs and punctuation runs are mixed in so every preprocessing
+    stage has realistic work to do.
+    """
+    rng = np.random.default_rng(seed)
+    
+    sample_words = [str(text).split() for text in pd.read_csv(DATASET_FILE_PATH)['text']]
+    lengths_pool = np.array([len(text_words) for text_words in sample_words])
+    
+    word_counts = Counter(word for text_words in sample_words for word in text_words)
+    words = np.array(list(word_counts), dtype=object)
+    word_probabilities = np.array(list(word_counts.values()), dtype=np.float64)
+    word_probabilities /= word_probabilities.sum()
+    slang = pd.read_csv(CUSTOM_DICTIONARY_FILE_PATH)['informal'].dropna().astype(str).to_numpy(dtype=object)
+    
+    kinds = ['word', *NOISE_TOKEN_SHARES]
+    kind_probabilities = [1 - sum(NOISE_TOKEN_SHARES.values()), *NOISE_TOKEN_SHARES.values()]
+    
+    comments = []
+    for start in range(0, rows, GENERATION_CHUNK_ROWS):
+        chunk_rows = min(GENERATION_CHUNK_ROWS, rows - start)
+        lengths = np.maximum(rng.choice(lengths_pool, size=chunk_rows), 1)
+        total = int(lengths.sum())
+        
+        token_kinds = rng.choice(len(kinds), size=total, p=kind_probabilities)
+        tokens = rng.choice(words, size=total, p=word_probabilities)
+        
+        for kind_id, kind in enumerate(kinds[1:], 1):
+            positions = np.flatnonzero(token_kinds == kind_id)
+            if not len(positions):
+                continue
+            
+            if kind == 'slang':
+                tokens[positions] = rng.choice(slang, size=len(positions))
+            elif kind == 'elongated':
+                repeats = rng.integers(2, 6, size=len(positions))
+                tokens[positions] = [token + token[-1] * repeat for token, repeat in zip(tokens[positions], repeats)]
+            elif kind == 'emoji':
+                tokens[positions] = rng.choice(EMOJIS, size=len(positions))
+            elif kind == 'mention':
+                tokens[positions] = [f"@user{number}" for number in rng.integers(0, 100_000, size=len(positions))]
+            elif kind == 'hashtag':
+                tokens[positions] = rng.choice(HASHTAGS, size=len(positions))
+            elif kind == 'url':
+                tokens[positions] = [f"https://vt.tiktok.com/ZS{number:x}/" for number in rng.integers(0, 1 << 32, size=len(positions))]
+            elif kind == 'punctuation':
+                tokens[positions] = [token + mark for token, mark in zip(tokens[positions], rng.choice(PUNCTUATION, size=len(positions)))]
+        
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        comments.extend(' '.join(tokens[begin:end]) for begin, end in zip(offsets[:-1], offsets[1:]))
+    
+    return pd.Series(comments, name='text')
+
+def verify_clean_text_golden() -> bool:
+    """Check that the fused cleaner matches the stepwise one byte-for-byte on the sample dataset."""
+    texts = pd.read_csv(DATASET_FILE_PATH)['text'].tolist()
+    expected = [clean_text_data_stepwise(text) for text in texts]
+    
+    mismatches = [
+        i for i, (single, batch, golden) in enumerate(zip(map(clean_text_data, texts), clean_text_batch(texts), expected))
+        if single != golden or batch != golden
+    ]
+    
+    print(f"\nGolden output check on {len(texts):,} comments: {len(mismatches)} mismatch(es)")
+    for i in mismatches[:10]:
+        print(f"- row {i + 1}: {texts[i]!r}")
+    
+    return not mismatches
+
+def benchmark_data_cleaning(rows: int = 1_000_000) -> dict:
+    print(f"\nData cleaning benchmark on {rows:,} comments")
+    texts = pd.read_csv(DATASET_FILE_PATH)['text'].sample(n=rows, replace=True, random_state=42).tolist()
+    
+    stepwise_result, stepwise_seconds = time_call(lambda: [clean_text_data_stepwise(text) for text in texts])
+    fused_result, fused_seconds = time_call(clean_text_batch, texts)
+    
+    print(f"Stepwise cleaner (7 passes) : {stepwise_seconds:.2f}s ({rows / stepwise_seconds:,.0f} rows/s)")
+    print(f"Fused batch cleaner         : {fused_seconds:.2f}s ({rows / fused_seconds:,.0f} rows/s)")
+    print(f"Speedup                     : {stepwise_seconds / fused_seconds:.1f}x")
+    print(f"Identical output            : {stepwise_result == fused_result}")
+    
+    return {
+        'rows': rows,
+        'stepwise_seconds': stepwise_seconds,
+        'fused_seconds': fused_seconds,
+        'identical': stepwise_result == fused_result
+    }
+
+def synthetic_lexicon(terms: list, seed: int = 42) -> dict:
+    """Random positive/neutral/negative labels, so sentiment scoring does not depend on the local lexicon store."""
+    labels = np.random.default_rng(seed).choice(['positive', 'neutral', 'negative'], size=len(terms), p=[0.2, 0.6, 0.2])
+    return dict(zip(terms, labels))
+
+def reset_stem_cache() -> None:
+    """Start the stemming stage cold and keep the persisted stem cache out of the benchmark."""
+    import stemming
+    stemming.stem_cache = stemming.StemCache(stemming.get_stemmer().delegatedStemmer)
+
+def measure_stage(func, *args, measure_memory: bool = True, before_run=None, **kwargs) -> tuple:
+    """
+    Time one stage, then run it again under tracemalloc for its peak traced
+    allocations (tracing slows the stage down, so it never overlaps with timing).
+    Buffers allocated outside Python's allocator (e.g. Arrow-backed strings)
+    only show up in the process high-water mark, see `max_rss_mb`.
+    
+    Returns:
+        result: Output of the timed run.
+        seconds: Wall-clock time of the timed run.
+        peak_memory_mb: Peak traced allocations of the second run, or None.
+    """
+    if before_run is not None:
+        before_run()
+    result, seconds = time_call(func, *args, **kwargs)
+    
+    peak_memory_mb = None
+    if measure_memory:
+        if before_run is not None:
+            before_run()
+        tracemalloc.start()
+        func(*args, **kwargs)
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    
+    return result, seconds, peak_memory_mb
+
+def stage_result(rows: int, seconds: float, peak_memory_mb: float) -> dict:
+    return {
+        'seconds': seconds,
+        'rows_per_second': rows / seconds,
+        'peak_memory_mb': peak_memory_mb,
+        'max_rss_mb': max_rss_mb(),
+    }
+
+def benchmark_stages(rows: int, seed: int = 42, measure_memory: bool = True) -> dict:
+    """
+    Run every stage of the text mining flow on `rows` synthetic comments, each
+    stage on the output of the previous one, and report its throughput.
+    
+    Returns:
+        {stage name: {'seconds', 'rows_per_second', 'peak_memory_mb', 'max_rss_mb'}}
+    """
+    # Imported here so the micro benchmarks do not load the stemmer and scikit-learn
+    from case_folding import fold_case
+    from sentiment_analysis import predict_sentiment
+    from stemming import stem_texts
+    from tf_idf import compute_tfidf
+    from tokenization import tokenize_texts
+    from word_repair import repair_words
+    
+    print(f"\nGenerating {rows:,} synthetic comments (seed {seed})")
+    texts, generation_seconds = time_call(synthetic_comments, rows, seed)
+    print(f"Generated in {generation_seconds:.2f}s")
+    
+    stages = [
+        ("clean_text_data", clean_texts, {}),
+        ("case_folding", fold_case, {}),
+        ("word_repair", repair_words, {}),
+        ("stopword_removal", remove_stopwords, {'more_stop_words': []}),
+        ("stemming", stem_texts, {'before_run': reset_stem_cache}),
+        ("tokenization", tokenize_texts, {}),
+    ]
+    
+    results = {}
+    for name, func, options in stages:
+        texts, seconds, peak_memory_mb = measure_stage(func, texts, measure_memory=measure_memory, **options)
+        results[name] = stage_result(rows, seconds, peak_memory_mb)
+    
+    df = pd.DataFrame({'index': np.arange(1, rows + 1), 'text': texts})
+    (tfidf_matrix, vectorizer), seconds, peak_memory_mb = measure_stage(
+        compute_tfidf, df, "text", measure_memory=measure_memory, export=False
+    )
+    results['compute_tfidf'] = stage_result(rows, seconds, peak_memory_mb)
+    
+    terms = vectorizer.get_feature_names_out()
+    lexicon = synthetic_lexicon(terms, seed)
+    _, seconds, peak_memory_mb = measure_stage(predict_sentiment, tfidf_matrix, terms, lexicon, measure_memory=measure_memory)
+    results['predict_sentiment'] = stage_result(rows, seconds, peak_memory_mb)
+    
+    print(f"\n{'Stage':<20}{'Seconds':>10}{'Rows/s':>14}{'Peak MB':>10}{'Max RSS MB':>12}")
+    for name, result in results.items():
+        peak = f"{result['peak_memory_mb']:.1f}" if result['peak_memory_mb'] is not None else "-"
+        rss = f"{result['max_rss_mb']:.0f}" if result['max_rss_mb'] is not None else "-"
+        print(f"{name:<20}{result['seconds']:>10.2f}{result['rows_per_second']:>14,.0f}{peak:>10}{rss:>12}")
+    
+    return results
+
+def measure_import(module: str, heavy_modules: list) -> tuple:
+    """
+    Import `module` in a fresh interpreter, so nothing is already loaded.
+    
+    Returns:
+        seconds: Time spent importing the module.
+        loaded: The `heavy_modules` that got imported along with it.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"loaded = [name for name in {heavy_modules!r} if name in sys.modules]\n"
+        "print(json.dumps([seconds, loaded]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    
+    seconds, loaded = json.loads(output.splitlines()[-1])
+    return seconds, loaded
+
+def check_import_budgets(budgets: dict = IMPORT_BUDGETS, runs: int = IMPORT_TIME_RUNS) -> list:
+    """
+    Measure the import time of the entry points (median of `runs` fresh
+    interpreters) and check that heavy dependencies stay lazy.
+    
+    Returns:
+        Description of every broken budget, empty when all of them hold.
+    """
+    failures = []
+    
+    print(f"\n{'Module':<12}{'Median s':>10}{'Budget s':>10}  Heavy modules loaded")
+    for module, (budget, heavy_modules) in budgets.items():
+        measurements = [measure_import(module, heavy_modules) for _ in range(runs)]
+        seconds = statistics.median(seconds for seconds, _ in measurements)
+        loaded = measurements[-1][1]
+        
+        print(f"{module:<12}{seconds:>10.3f}{budget:>10.2f}  {', '.join(loaded) or '-'}")
+        
+        if seconds > budget:
+            failures.append(f"importing {module} takes {seconds:.3f}s, budget is {budget:.2f}s")
+        if loaded:
+            failures.append(f"importing {module} loads {', '.join(loaded)}")
+    
+    return failures
+
+def benchmark_labelling_backends(
+        num_tokens: int = DEFAULT_LABELLING_TOKENS,
+        seed: int = 42,
+        batch_size: int = 64,
+        tolerance: float = LABEL_DISAGREEMENT_TOLERANCE
+    ) -> dict:
+    """
+    Label the same distinct dataset words with the fp32 and the int8 IndoBERT
+    backend and compare speed and labels. Model loading (and the one-off int8
+    conversion) is kept out of the timings.
+    
+    Returns:
+        Timings, agreement and whether the disagreement stays within `tolerance`.
+    """
+    from transformers import AutoTokenizer
+    from sentiment_analysis import PRETRAINED_MODEL, label_tokens, load_sentiment_model
+    
+    words = sorted(set(' '.join(sample_comments(num_tokens, seed)).split()))
+    tokens = pd.Series(words).sample(n=min(num_tokens, len(words)), random_state=seed).tolist()
+    tokenizer = AutoTokenizer.from_pretrained(PRETRAINED_MODEL)
+    print(f"\nLabelling backend benchmark on {len(tokens):,} distinct tokens")
+    
+    labels, seconds = {}, {}
+    for backend in ('fp32', 'int8'):
+        model, device = load_sentiment_model(PRETRAINED_MODEL, backend)
+        labels[backend], seconds[backend] = time_call(label_tokens, model, tokenizer, tokens, device, batch_size)
+    
+    agreement = np.mean([labels['fp32'][token] == labels['int8'][token] for token in tokens])
+    
+    print(f"fp32 : {seconds['fp32']:.2f}s ({len(tokens) / seconds['fp32']:,.0f} tokens/s)")
+    print(f"int8 : {seconds['int8']:.2f}s ({len(tokens) / seconds['int8']:,.0f} tokens/s)")
+    print(f"Speedup         : {seconds['fp32'] / seconds['int8']:.1f}x")
+    print(f"Same labels     : {agreement:.2%} (at least {1 - tolerance:.0%} required)")
+    
+    return {
+        'tokens': len(tokens),
+        'fp32_seconds': seconds['fp32'],
+        'int8_seconds': seconds['int8'],
+        'agreement': float(agreement),
+        'within_tolerance': bool(agreement >= 1 - tolerance),
+    }
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compare throughput with a baseline results file.
+    
+    Returns:
+        (rows, stage, slowdown) of every stage more than `tolerance` slower than the baseline.
+    """
+    regressions = []
+    
+    print(f"\nComparison with baseline from {baseline.get('timestamp', 'unknown')}")
+    for rows, stages in results['runs'].items():
+        baseline_stages = baseline.get('runs', {}).get(rows)
+        if not baseline_stages:
+            print(f"- {int(rows):,} rows: not in baseline")
+            continue
+        
+        for name, result in stages.items():
+            if name not in baseline_stages:
+                continue
+            
+            ratio = result['rows_per_second'] / baseline_stages[name]['rows_per_second']
+            is_regression = ratio < 1 - tolerance
+            print(f"- {int(rows):>9,} rows {name:<20} {ratio:>6.2f}x{'  REGRESSION' if is_regression else ''}")
+            
+            if is_regression:
+                regressions.append((int(rows), name, 1 / ratio))
+    
+    return regressions
+
+def run_suite(sizes: list, seed: int = 42, measure_memory: bool = True) -> dict:
+    results = {
+        'timestamp': TIMESTAMP,
+        'seed': seed,
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'runs': {},
+    }
+    
+    for rows in sizes:
+        # JSON object keys are strings, keep them that way in memory too
+        results['runs'][str(rows)] = benchmark_stages(rows, seed, measure_memory)
+    
+    return results
+
+def export_results(results: dict) -> str:
+    BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    output_file_name = BENCHMARK_DIR / f"benchmark_{TIMESTAMP}.json"
+    
+    with open(output_file_name, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    
+    return output_file_name
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks of the text mining flow.")
+    parser.add_argument('--suite', choices=['stages', 'micro', 'startup', 'labelling'], default='stages',
+                        help="'stages' times every stage on synthetic corpora, 'micro' runs the cleaner and stopword comparisons, "
+                             "'startup' checks the import time budgets of the entry points, "
+                             "'labelling' compares the fp32 and int8 IndoBERT backends")
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Corpus sizes of the stage suite")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass (halves the run time)")
+    parser.add_argument('--baseline', help="Results JSON to compare with, exits with status 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed throughput loss against the baseline")
+    parser.add_argument('--tokens', type=int, default=DEFAULT_LABELLING_TOKENS, help="Distinct tokens labelled by the labelling suite")
+    
+    return parser.parse_args(argv)
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+    
+    if args.suite == 'micro':
+        is_golden = verify_clean_text_golden()
+        benchmark_data_cleaning()
+        benchmark_stopword_removal()
+        return 0 if is_golden else 1
+    
+    if args.suite == 'startup':
+        failures = check_import_budgets()
+        for failure in failures:
+            print(f"OVER BUDGET: {failure}")
+        
+        return 1 if failures else 0
+    
+    if args.suite == 'labelling':
+        result = benchmark_labelling_backends(args.tokens, args.seed)
+        if not result['within_tolerance']:
+            print(f"\nint8 labels differ from fp32 on more than {LABEL_DISAGREEMENT_TOLERANCE:.0%} of the tokens")
+        
+        return 0 if result['within_tolerance'] else 1
+    
+    results = run_suite(args.rows, args.seed, not args.no_memory)
+    output_file_name = export_results(results)
+    print(f"\nBenchmark results successfully exported as {output_file_name}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = compare_with_baseline(results, json.load(file), args.tolerance)
+        
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed more than {args.tolerance:.0%}")
+            return 1
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,24 @@
 import pandas as pd
 import questionary
+from functools import lru_cache
 from pathlib import Path
 
 from constants import TIMESTAMP, DATASET_FILE_PATH, CASE_FOLDING_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, STEMMING_OUTPUT_DIR
+from helpers.io import export_stage_file, read_stage_file, is_tokenized
+from helpers.vocabulary import TokenMap, is_encoded
+
+@lru_cache(maxsize=1)
+def load_case_map() -> TokenMap:
+    return TokenMap(lambda terms: [[term.lower()] for term in terms])
+
+def fold_case(texts: pd.Series) -> pd.Series:
+    if is_encoded(texts):
+        return load_case_map().apply_texts(texts)
+    
+    if is_tokenized(texts):
+        return texts.apply(lambda tokens: [token.lower() for token in tokens])
+    
+    return texts.str.lower()
 
 def main(prev_process: str = None):
     print("\nCase folding is starting")
@@ -30,7 +46,7 @@ def main(prev_process: str = None):
         selected_file: str = questionary.select(f"Select {prev_process} file", choices=sources_files).ask()
         
         print(f"Selected file: {selected_file}")
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -39,18 +55,17 @@ def main(prev_process: str = None):
     print("Preview top 20 data")
     print(source_df.head(10))
     
-    source_df['text'] = source_df['text'].str.lower()
+    source_df['text'] = fold_case(source_df['text'])
     
     print("\nPreview result from case-folding (lowercasing)")
     print(source_df.head(20))
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = CASE_FOLDING_OUTPUT_DIR / f"case_folding_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Case folding CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, CASE_FOLDING_OUTPUT_DIR, "case_folding", TIMESTAMP)
+        print(f"Case folding file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Case folding process is done!")
     
@@ -8,6 +8,10 @@ DATA_DIR                    = BASE_PATH / "data"
 DATASET_FILE_PATH           = DATA_DIR / "dataset" / "tiktok_comments_text.csv"
 
 DICTIONARY_PATH             = DATA_DIR / "dictionary"
+CUSTOM_DICTIONARY_FILE_PATH = DICTIONARY_PATH / "custom_dictionary.csv"
+STEM_CACHE_FILE_PATH        = DICTIONARY_PATH / "stem_cache.json"
+CUSTOM_STOPWORDS_FILE_PATH  = DICTIONARY_PATH / "custom_stopwords.txt"
+LEXICON_STORE_FILE_PATH     = DICTIONARY_PATH / "lexicon.jsonl"
 
 PREPROCESSED_DATA_DIR       = DATA_DIR / "preprocessed-data"
 
@@ -18,8 +22,20 @@ STEMMING_OUTPUT_DIR         = PREPROCESSED_DATA_DIR / "stemming"
 TOKENIZATION_OUTPUT_DIR     = PREPROCESSED_DATA_DIR / "tokenization" 
 WORD_REPAIR_OUTPUT_DIR      = PREPROCESSED_DATA_DIR / "word-repair"
 STOPWORD_OUTPUT_DIR         = PREPROCESSED_DATA_DIR / "stopword-removal"
+DEDUPLICATION_OUTPUT_DIR    = PREPROCESSED_DATA_DIR / "deduplication"
 
 VECTORIZATION_DIR          = BASE_PATH / "data" / "vectorization"
+TFIDF_STATE_DIR             = VECTORIZATION_DIR / "incremental-state"
+VECTORIZER_DIR              = VECTORIZATION_DIR / "vectorizer"
+
+SENTIMENT_OUTPUT_DIR        = DATA_DIR / "sentiment"
+
+STAGE_CACHE_DIR             = DATA_DIR / "cache" / "stages"
+MODEL_CACHE_DIR             = DATA_DIR / "cache" / "models"
+
+BENCHMARK_DIR               = DATA_DIR / "benchmark"
+
+RUN_REPORT_DIR              = DATA_DIR / "reports"
 
 IMG_DIR                     = BASE_PATH / "img"
 
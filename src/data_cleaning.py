@@ -1,10 +1,13 @@
 import json
+import operator
 import pandas as pd
 from pathlib import Path
 import questionary
 import re
 
 from constants import TIMESTAMP, DATASET_FILE_PATH, CASE_FOLDING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, STEMMING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, VECTORIZATION_DIR
+from helpers.io import export_stage_file, read_stage_file, is_tokenized
+from helpers.parallel import DEFAULT_SHARD_SIZE, parallel_apply
 
 
 URL_PATTERN = re.compile(
@@ -17,6 +20,14 @@ WHITESPACE_PATTERN = re.compile(r'\s+')
 SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s]', flags=re.UNICODE)
 SINGLE_CHAR_PATTERN = re.compile(r'\b\w\b')
 
+# Patterns of the fused cleaner. Removing a mention can never create a new hashtag
+# (and vice versa), so both go in one pass. After whitespace is collapsed the only
+# whitespace left is ' ', so special characters can be removed as whole runs.
+MENTION_OR_HASHTAG_PATTERN = re.compile(r'[@#]\w+')
+SPECIAL_CHAR_RUN_PATTERN = re.compile(r'[^\w ]+')
+# Calling m[1] from C is faster than expanding the r'\1' replacement template
+FIRST_GROUP = operator.itemgetter(1)
+
 
 def remove_urls(text: str) -> str:
     return URL_PATTERN.sub('', text)
@@ -41,7 +52,8 @@ def remove_special_characters(text: str) -> str:
 def remove_single_characters(text: str) -> str:
     return SINGLE_CHAR_PATTERN.sub('', text)
 
-def clean_text_data(text: str) -> str:
+def clean_text_data_stepwise(text: str) -> str:
+    """Reference cleaner, one regex pass per rule. `clean_text_data` must match it byte-for-byte."""
     text = remove_urls(text)
     text = remove_repeated_chars(text)
     text = remove_mentions(text)
@@ -51,6 +63,47 @@ def clean_text_data(text: str) -> str:
     text = remove_single_characters(text)
     return text
 
+def remove_single_words(text: str) -> str:
+    # Only word characters and ' ' are left at this point, so a `\b\w\b` match is a one-character word
+    return ' '.join(['' if len(word) == 1 else word for word in text.split(' ')])
+
+def clean_text_data(text: str) -> str:
+    if 'http' in text:
+        text = URL_PATTERN.sub('', text)
+    if not text.isdigit():
+        text = REPEATED_CHARS.sub(FIRST_GROUP, text)
+    if '@' in text or '#' in text:
+        text = MENTION_OR_HASHTAG_PATTERN.sub('', text)
+    text = SPECIAL_CHAR_RUN_PATTERN.sub('', ' '.join(text.split()))
+    return remove_single_words(text)
+
+def clean_text_batch(texts: list) -> list:
+    """Column-wise version of `clean_text_data`: every rule runs over the whole batch in turn."""
+    remove_url = URL_PATTERN.sub
+    collapse_repeated = REPEATED_CHARS.sub
+    remove_mention_or_hashtag = MENTION_OR_HASHTAG_PATTERN.sub
+    remove_special = SPECIAL_CHAR_RUN_PATTERN.sub
+    
+    texts = [remove_url('', text) if 'http' in text else text for text in texts]
+    texts = [text if text.isdigit() else collapse_repeated(FIRST_GROUP, text) for text in texts]
+    texts = [remove_mention_or_hashtag('', text) if '@' in text or '#' in text else text for text in texts]
+    texts = [remove_special('', ' '.join(text.split())) for text in texts]
+    return [remove_single_words(text) for text in texts]
+
+def clean_tokens(tokens: list) -> list:
+    """Clean every token of a token list, tokens that come out empty are dropped."""
+    return [word for text in clean_text_batch(tokens) for word in text.split()]
+
+def clean_texts(texts: pd.Series, workers: int = 1, shard_size: int = DEFAULT_SHARD_SIZE) -> pd.Series:
+    # Data cleaning may run after Tokenizing, the column then holds token lists
+    tokenized = is_tokenized(texts)
+    
+    if workers <= 1:
+        cleaned = [clean_tokens(tokens) for tokens in texts] if tokenized else clean_text_batch(texts.tolist())
+        return pd.Series(cleaned, index=texts.index, name=texts.name)
+    
+    return parallel_apply(texts, clean_tokens if tokenized else clean_text_data, workers=workers, shard_size=shard_size)
+
 def main(prev_process: str = None) -> None:
     print("\nData cleaning is starting")
     
@@ -77,7 +130,7 @@ def main(prev_process: str = None) -> None:
         selected_file: str = questionary.select(f"Select {prev_process} file", choices=sources_files).ask()
         
         print(f"Selected file: {selected_file}")
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -87,18 +140,17 @@ def main(prev_process: str = None) -> None:
     print(source_df.head(20))
     
     print("\nData cleaning is start to process")
-    source_df['text'] = source_df['text'].apply(clean_text_data)
+    source_df['text'] = clean_texts(source_df['text'])
         
     print("\nPreview result from data cleaning")
     print(source_df.head(20))
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = DATA_CLEANING_OUTPUT_DIR / f"data_cleaning_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Data cleaning CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, DATA_CLEANING_OUTPUT_DIR, "data_cleaning", TIMESTAMP)
+        print(f"Data cleaning file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Data cleaning process is done!")
 
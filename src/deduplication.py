@@ -0,0 +1,227 @@
+import hashlib
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+from helpers.io import duplicate_positions, row_weights, split_duplicates
+
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Representatives kept per LSH bucket. Short or boilerplate comments crowd a few buckets with
+# dissimilar texts; past the cap a text is only compared through its other bands
+MAX_BUCKET_REPRESENTATIVES = 8
+
+# Shingles hashed per MinHash batch, bounds the (permutations x shingles) work array to ~32 MB
+MINHASH_BATCH_SHINGLES = 125_000
+
+PUNCTUATION_PATTERN = re.compile(f"[{re.escape(string.punctuation)}]+")
+
+
+def normalize_text(text) -> str:
+    """Casefolded text without punctuation and with single spaces, used to detect duplicates."""
+    text = ' '.join(text) if isinstance(text, list) else str(text)
+    return ' '.join(PUNCTUATION_PATTERN.sub('', text.casefold()).split())
+
+def exact_groups(texts: list) -> np.ndarray:
+    """Group id of every normalised text, equal texts share the position of their first occurrence."""
+    first_position = {}
+    groups = np.empty(len(texts), dtype=np.int64)
+
+    for position, text in enumerate(texts):
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        groups[position] = first_position.setdefault(key, position)
+
+    return groups
+
+def shingle_hashes(texts: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash every character shingle of every text in one pass over the
+    concatenated code points.
+
+    Returns:
+        hashes: 32-bit shingle hashes, text after text.
+        offsets: `offsets[i]:offsets[i + 1]` is the shingle range of text i.
+    """
+    # Shorter texts are padded so every text has at least one shingle
+    texts = [text.ljust(SHINGLE_SIZE) for text in texts]
+    code_points = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+
+    # Polynomial hash of every window, wrapping around at 64 bits
+    num_windows = len(code_points) - SHINGLE_SIZE + 1
+    hashes = np.zeros(num_windows, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(1_000_003) + code_points[offset:offset + num_windows]
+
+    # Keep the windows that start and end inside the same text
+    shingle_counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.concatenate([[0], np.cumsum(shingle_counts)])
+    text_starts = np.cumsum(lengths) - lengths
+    starts = np.repeat(text_starts - offsets[:-1], shingle_counts) + np.arange(offsets[-1])
+
+    # Fold to 32 bits with a multiplicative mix, the permutations work on uint32
+    hashes = hashes[starts]
+    hashes ^= hashes >> np.uint64(32)
+    hashes *= np.uint64(0x9E3779B97F4A7C15)
+    return (hashes >> np.uint64(32)).astype(np.uint32), offsets
+
+def minhash_signatures(texts: list, seed: int = 1) -> np.ndarray:
+    """
+    MinHash signature (NUM_PERMUTATIONS values) of the character shingles of
+    every text. The permutations are `a * x + b` modulo 2**32 with odd `a`,
+    which keeps the work in uint32 arrays.
+    """
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(0, 1 << 32, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64) | np.uint64(1)).astype(np.uint32)
+    b = rng.integers(0, 1 << 32, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64).astype(np.uint32)
+
+    hashes, offsets = shingle_hashes(texts)
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint32)
+    permuted = np.empty((NUM_PERMUTATIONS, MINHASH_BATCH_SHINGLES), dtype=np.uint32)
+
+    first_text = 0
+    while first_text < len(texts):
+        # Whole texts per batch, so every text is reduced within one batch
+        last_text = max(int(np.searchsorted(offsets, offsets[first_text] + MINHASH_BATCH_SHINGLES, side='right')) - 1, first_text + 1)
+        batch = hashes[offsets[first_text]:offsets[last_text]]
+
+        # A single text can be longer than a batch
+        if len(batch) > permuted.shape[1]:
+            permuted = np.empty((NUM_PERMUTATIONS, len(batch)), dtype=np.uint32)
+        batch_permuted = permuted[:, :len(batch)]
+        np.multiply(a, batch, out=batch_permuted)
+        batch_permuted += b
+
+        signatures[first_text:last_text] = np.minimum.reduceat(batch_permuted, offsets[first_text:last_text] - offsets[first_text], axis=1).T
+
+        first_text = last_text
+
+    return signatures
+
+def near_duplicate_groups(texts: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> np.ndarray:
+    """
+    Group id of every normalised text, texts whose estimated Jaccard
+    similarity of character shingles reaches `threshold` share the position
+    of the earliest one.
+
+    Candidates come from LSH over MinHash signatures (LSH_BANDS bands). The
+    earliest text of a group is its representative, and a text joins the
+    earliest representative it shares a bucket with whose signature agrees
+    with its own on at least `threshold` of the permutations, otherwise it
+    represents a new group. Every member is therefore similar to the kept
+    row, similarity is never chained from member to member. A bucket keeps
+    at most MAX_BUCKET_REPRESENTATIVES, so a text is checked against at most
+    LSH_BANDS * MAX_BUCKET_REPRESENTATIVES candidates.
+    """
+    groups = np.arange(len(texts))
+    if len(texts) < 2:
+        return groups
+
+    signatures = minhash_signatures(texts)
+    rows_per_band = NUM_PERMUTATIONS // LSH_BANDS
+
+    band_buckets = np.empty((len(texts), LSH_BANDS), dtype=np.int64)
+    has_candidates = np.zeros(len(texts), dtype=bool)
+    for band in range(LSH_BANDS):
+        # Hash the rows of the band into one uint64 key, colliding keys only add candidates that are verified below
+        keys = np.zeros(len(texts), dtype=np.uint64)
+        for column in signatures[:, band * rows_per_band:(band + 1) * rows_per_band].T:
+            keys = keys * np.uint64(0x100000001B3) ^ column
+        _, band_buckets[:, band], bucket_sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        has_candidates |= bucket_sizes[band_buckets[:, band]] > 1
+
+    # One integer key per (band, bucket), so the loop below only handles plain ints
+    bucket_keys = (band_buckets + np.arange(LSH_BANDS) * len(texts)).tolist()
+    min_agreements = threshold * NUM_PERMUTATIONS
+
+    # Bucket key -> representatives hashed into it so far; texts alone in all their buckets stay alone
+    representatives = {}
+    for position in np.flatnonzero(has_candidates).tolist():
+        buckets = bucket_keys[position]
+        candidates = set()
+        for bucket in buckets:
+            if bucket in representatives:
+                candidates.update(representatives[bucket])
+
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            matches = candidates[np.count_nonzero(signatures[candidates] == signatures[position], axis=1) >= min_agreements]
+            if len(matches):
+                groups[position] = matches.min()
+                continue
+
+        for bucket in buckets:
+            bucket_representatives = representatives.setdefault(bucket, [])
+            if len(bucket_representatives) < MAX_BUCKET_REPRESENTATIVES:
+                bucket_representatives.append(position)
+
+    return groups
+
+def deduplicate(
+        df: pd.DataFrame,
+        near_duplicates: bool = True,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD
+    ) -> pd.DataFrame:
+    """
+    Collapse duplicate comments so later stages process every text once.
+
+    Exact duplicates share the hash of their normalised text (casefolded,
+    without punctuation, single spaces); near duplicates are then found among
+    the remaining texts with MinHash/LSH. Every group keeps its earliest row.
+    When the pipeline streams chunks, only duplicates within a chunk collapse.
+
+    Args:
+        df: Frame with `index` and `text` columns, possibly already deduplicated.
+        near_duplicates: Also collapse near duplicates, not only exact ones.
+        threshold: Estimated Jaccard similarity from which texts are near duplicates.
+
+    Returns:
+        The kept rows, with `count` (number of source comments the row stands
+        for) and `duplicates` (space separated indexes of the collapsed rows).
+        `expand_duplicates` turns it back into one row per source comment.
+    """
+    texts = [normalize_text(text) for text in df['text']]
+    groups = exact_groups(texts)
+    num_exact = int(np.sum(groups != np.arange(len(texts))))
+
+    if near_duplicates:
+        unique_positions = np.flatnonzero(groups == np.arange(len(texts)))
+        near_groups = near_duplicate_groups([texts[position] for position in unique_positions], threshold)
+        groups = unique_positions[near_groups][np.searchsorted(unique_positions, groups)]
+
+    index = df['index'].to_numpy() if 'index' in df.columns else np.arange(1, len(df) + 1)
+    weights = row_weights(df)
+    weights = np.ones(len(df), dtype=np.int64) if weights is None else weights.astype(np.int64)
+    previous_duplicates = [split_duplicates(value) for value in df['duplicates']] if 'duplicates' in df.columns else [[] for _ in texts]
+
+    duplicates = {}
+    for position in np.flatnonzero(groups != np.arange(len(texts))):
+        duplicates.setdefault(groups[position], []).extend([int(index[position]), *previous_duplicates[position]])
+
+    kept = np.flatnonzero(groups == np.arange(len(texts)))
+    result = df.iloc[kept].copy()
+    result['count'] = np.bincount(groups, weights=weights, minlength=len(texts))[kept].astype(np.int64)
+    result['duplicates'] = [
+        ' '.join(map(str, sorted(previous_duplicates[position] + duplicates.get(position, []))))
+        for position in kept
+    ]
+
+    print(f"Deduplication: {len(df):,} rows -> {len(result):,} ({num_exact:,} exact and {len(df) - len(result) - num_exact:,} near duplicates collapsed)")
+
+    return result.reset_index(drop=True)
+
+def expand_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per source comment again, collapsed rows get the values of the row they were collapsed into."""
+    if 'duplicates' not in df.columns:
+        return df
+
+    index, positions = duplicate_positions(df)
+    expanded = df.iloc[positions].drop(columns=['count', 'duplicates'])
+    expanded['index'] = index
+
+    return expanded.reset_index(drop=True)
@@ -0,0 +1,168 @@
+"""
+Reuse a fitted TF-IDF vectorizer to score new comments without refitting.
+
+Usage:
+    python src/fitted_vectorizer.py --text "listrik diskon mantap" --text "bayar makin mahal"
+    python src/fitted_vectorizer.py --input new_comments.csv --artifact data/vectorization/vectorizer/vectorizer_2025-06-02_12-29-44
+"""
+import argparse
+import json
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+
+from constants import TIMESTAMP, VECTORIZATION_DIR, VECTORIZER_DIR
+from helpers.io import export_sparse_matrix, read_json_file, read_stage_file, sparse_rows_to_dicts
+from incremental_tf_idf import count_terms, sublinear_tf, weight_rows
+
+
+ARTIFACT_VERSION = 1
+
+
+def save_vectorizer(
+        terms: list,
+        idf: np.ndarray,
+        output_dir: Path,
+        preprocessing_steps: list = None,
+        n_documents: int = None
+    ) -> Path:
+    """
+    Save a fitted TF-IDF vectorizer as plain files instead of a pickle.
+
+    Layout:
+        config.json         format version, weighting settings, preprocessing steps
+        vocabulary.json     terms, aligned with the IDF array
+        idf.npy             IDF weights, loaded memory-mapped
+
+    Args:
+        terms: Fitted vocabulary, in column order.
+        idf: IDF weight of every term.
+        output_dir: Artifact directory, created if needed.
+        preprocessing_steps: Step names the documents went through before
+            vectorization, replayed on raw input by `transform_texts`.
+        n_documents: Number of documents the vectorizer was fitted on.
+
+    Returns:
+        Path of the artifact directory.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    np.save(output_dir / "idf.npy", np.asarray(idf, dtype=np.float64))
+    with open(output_dir / "vocabulary.json", 'w', encoding='utf-8') as file:
+        json.dump([str(term) for term in terms], file, ensure_ascii=False)
+
+    # config.json is written last, a directory without it is an incomplete artifact
+    with open(output_dir / "config.json", 'w', encoding='utf-8') as file:
+        json.dump({
+            'version': ARTIFACT_VERSION,
+            'created': TIMESTAMP,
+            'n_documents': n_documents,
+            'n_terms': len(terms),
+            'sublinear_tf': True,
+            'smooth_idf': True,
+            'norm': 'l2',
+            'preprocessing_steps': preprocessing_steps,
+        }, file, ensure_ascii=False, indent=2)
+
+    return output_dir
+
+def latest_vectorizer_dir(vectorizer_dir: Path = VECTORIZER_DIR) -> Path:
+    """Most recent complete artifact, artifact names sort by their timestamp."""
+    artifacts = sorted(path.parent for path in vectorizer_dir.glob("*/config.json"))
+    return artifacts[-1] if artifacts else None
+
+
+class FittedVectorizer:
+    """
+    Transform-only TF-IDF vectorizer loaded from a `save_vectorizer` artifact.
+
+    The IDF array is memory-mapped and the vocabulary is a plain JSON list,
+    so loading does not unpickle scikit-learn objects. Rows are identical to
+    `TfidfVectorizer.transform` of the vectorizer the artifact was saved from.
+    """
+
+    def __init__(self, artifact_dir: Path):
+        self.artifact_dir = Path(artifact_dir)
+        self.config = read_json_file(self.artifact_dir / "config.json")
+
+        if not self.config:
+            raise ValueError(f"No vectorizer artifact found in {self.artifact_dir}")
+        if self.config.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported vectorizer artifact version {self.config.get('version')}, expected {ARTIFACT_VERSION}")
+
+        self.terms = read_json_file(self.artifact_dir / "vocabulary.json")
+        self.vocabulary = {term: column for column, term in enumerate(self.terms)}
+        self.idf = np.load(self.artifact_dir / "idf.npy", mmap_mode='r')
+
+    @property
+    def preprocessing_steps(self) -> list:
+        return self.config.get('preprocessing_steps') or []
+
+    def transform(self, documents: list) -> sparse.csr_matrix:
+        """TF-IDF rows of already preprocessed documents (token lists or whitespace separated strings)."""
+        tf = sublinear_tf(count_terms(list(documents), self.vocabulary))
+        return weight_rows(tf, self.idf)
+
+    def transform_texts(self, texts: list) -> sparse.csr_matrix:
+        """TF-IDF rows of raw comments, after replaying the saved preprocessing steps on them."""
+        df = pd.DataFrame({'text': list(texts)})
+
+        if self.preprocessing_steps:
+            # The preprocessing stages load their dictionaries and the stemmer, only import them when needed
+            from pipeline import FRAME_STEPS, apply_steps
+            
+            # Deduplication would drop rows, every input text needs its own row here
+            df = apply_steps(df, [step for step in self.preprocessing_steps if step not in FRAME_STEPS])
+
+        return self.transform(df['text'])
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Vectorize new comments with a saved TF-IDF vectorizer, without refitting.")
+    parser.add_argument('--artifact', type=Path, help="Vectorizer artifact directory (default: the latest one)")
+    parser.add_argument('--input', type=Path, help="CSV file with a `text` column, or a token store")
+    parser.add_argument('--text', action='append', default=[], help="Comment to vectorize, can be repeated")
+    parser.add_argument('--no-preprocess', action='store_true', help="The input is already preprocessed, skip the saved preprocessing steps")
+    parser.add_argument('--no-save', action='store_true', help="Only print the TF-IDF rows, do not write a vectorization file")
+
+    return parser.parse_args(argv)
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+
+    try:
+        artifact_dir = args.artifact or latest_vectorizer_dir()
+        if artifact_dir is None:
+            raise ValueError(f"No vectorizer artifact found in {VECTORIZER_DIR}, run the TF-IDF vectorization first")
+
+        vectorizer = FittedVectorizer(artifact_dir)
+        print(f"Loaded vectorizer {artifact_dir} ({len(vectorizer.terms):,} terms)")
+
+        texts = read_stage_file(args.input)['text'].tolist() if args.input else []
+        texts += args.text
+        if not texts:
+            raise ValueError("Nothing to vectorize, use --input or --text")
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    if args.no_preprocess:
+        tfidf_matrix = vectorizer.transform(texts)
+    else:
+        tfidf_matrix = vectorizer.transform_texts(texts)
+
+    print(f"\nVectorized {tfidf_matrix.shape[0]:,} documents")
+    for document in sparse_rows_to_dicts(tfidf_matrix[:10], vectorizer.terms):
+        print(document)
+
+    if not args.no_save:
+        store_dir = export_sparse_matrix(tfidf_matrix, vectorizer.terms, vectorizer.idf, VECTORIZATION_DIR / f"vectorization_{TIMESTAMP}")
+        print(f"Vectorization store successfully exported as {store_dir}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
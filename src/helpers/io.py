@@ -1,6 +1,11 @@
 import json
+from collections.abc import Sequence
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
 
 def read_json_file(
         file_path: Path, 
@@ -15,6 +20,25 @@ def read_json_file(
     
     return data
 
+def read_jsonl_file(
+        file_path: Path,
+        encoding: str = 'utf-8'
+    ) -> list:
+    if not file_path.exists():
+        return []
+    
+    with open(file_path, 'r', encoding=encoding) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def append_data_to_jsonl(
+        data: list,
+        output_file: Path
+    ) -> None:
+    """Append one JSON object per line, so existing content is never rewritten."""
+    with open(output_file, 'a', encoding='utf-8') as file:
+        for item in data:
+            file.write(json.dumps(item, ensure_ascii=False) + '\n')
+
 def export_data_to_json(
         data: list,
         output_file: Path
@@ -26,4 +50,349 @@ def export_data_to_json(
             json.dump(data, file, ensure_ascii=False)
         print("\nData successfully convert to JSON file!")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred: {e}")
+
+VECTORIZATION_STORE_VERSION = 1
+
+
+class StoredTerms(Sequence):
+    """
+    Vocabulary of a vectorization store, read from its memory-mapped UTF-8
+    buffer. Only the looked up terms are decoded, so a huge vocabulary is
+    not turned into Python strings up front.
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("term index out of range")
+
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.buffer[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        # One copy of the buffer beats a memmap slice per term when every term is read
+        buffer = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield buffer[start:end].decode('utf-8')
+
+
+def term_aggregates(matrix: sparse.csr_matrix) -> np.ndarray:
+    """
+    Per-term aggregates of a TF-IDF matrix: row 0 holds the column sums,
+    row 1 the number of documents containing every term. Word clouds are
+    drawn from them without loading the matrix.
+    """
+    return np.vstack([
+        np.asarray(matrix.sum(axis=0), dtype=np.float64).ravel(),
+        np.bincount(matrix.indices, minlength=matrix.shape[1])
+    ])
+
+def export_sparse_matrix(
+        matrix: sparse.spmatrix,
+        terms: list,
+        idf: np.ndarray,
+        output_dir: Path
+    ) -> Path:
+    """
+    Save a sparse TF-IDF matrix as a vectorization store: a directory of
+    uncompressed .npy arrays that readers memory-map instead of loading.
+
+    Layout:
+        data.npy, indices.npy, indptr.npy   CSR arrays of the matrix
+        terms.npy, term_offsets.npy         UTF-8 vocabulary buffer, term i is
+                                            `terms[term_offsets[i]:term_offsets[i + 1]]`
+        idf.npy                             IDF weight of every term
+        aggregates.npy                      see `term_aggregates`
+        meta.json                           shape and version, written last
+
+    Args:
+        matrix: Sparse document-term matrix.
+        terms: Vocabulary, aligned with the matrix columns.
+        idf: IDF weight of every term, aligned with `terms`.
+        output_dir: Directory of the store, created when missing.
+
+    Returns:
+        Path of the store directory.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # scipy keeps int32 indices whenever they fit, saving them that way lets readers wrap the memmaps without a copy
+    index_dtype = np.int32 if max(matrix.nnz, *matrix.shape) < np.iinfo(np.int32).max else np.int64
+    np.save(output_dir / "data.npy", matrix.data)
+    np.save(output_dir / "indices.npy", matrix.indices.astype(index_dtype, copy=False))
+    np.save(output_dir / "indptr.npy", matrix.indptr.astype(index_dtype, copy=False))
+
+    encoded_terms = [str(term).encode('utf-8') for term in terms]
+    term_lengths = np.fromiter((len(term) for term in encoded_terms), dtype=np.int64, count=len(encoded_terms))
+    np.save(output_dir / "terms.npy", np.frombuffer(b''.join(encoded_terms), dtype=np.uint8))
+    np.save(output_dir / "term_offsets.npy", np.concatenate([[0], np.cumsum(term_lengths)]))
+    np.save(output_dir / "idf.npy", np.asarray(idf, dtype=np.float64))
+    np.save(output_dir / "aggregates.npy", term_aggregates(matrix))
+
+    # Readers treat a store without meta.json as incomplete
+    with open(output_dir / "meta.json", 'w', encoding='utf-8') as file:
+        json.dump({
+            'version': VECTORIZATION_STORE_VERSION,
+            'shape': list(matrix.shape),
+            'nnz': int(matrix.nnz),
+            'terms': len(encoded_terms),
+        }, file)
+
+    return output_dir
+
+def is_vectorization_store(path: Path) -> bool:
+    return (Path(path) / "meta.json").exists()
+
+def list_vectorizations(vectorization_dir: Path) -> list:
+    """Saved vectorizations, oldest first: stores and older .npz matrix files."""
+    return sorted(
+        path for path in Path(vectorization_dir).glob("vectorization_*")
+        if is_vectorization_store(path) or (path.suffix == '.npz' and path.is_file())
+    )
+
+def read_term_aggregates(matrix_file: Path) -> tuple[list, np.ndarray]:
+    """
+    Load the terms and TF-IDF column sums of a saved vectorization.
+    
+    Returns:
+        terms: Vocabulary, or an empty list when the aggregates are missing.
+        column_sums: Summed TF-IDF score of every term.
+    """
+    if is_vectorization_store(matrix_file):
+        aggregates_file = matrix_file / "aggregates.npy"
+    else:
+        aggregates_file = matrix_file.with_name(f"{matrix_file.stem}_aggregates.npy")
+    if not aggregates_file.exists():
+        return [], np.zeros(0)
+    
+    column_sums = np.load(aggregates_file, mmap_mode='r')[0]
+    vocabulary = read_vocabulary_file(matrix_file)
+    
+    return vocabulary.get('terms', []) if vocabulary else [], column_sums
+
+def read_vocabulary_file(matrix_file: Path) -> dict:
+    """
+    Read the vocabulary and IDF weights of a saved vectorization. Stores
+    return them memory-mapped (`StoredTerms`), .npz files their JSON sidecar.
+    """
+    if is_vectorization_store(matrix_file):
+        return {
+            'terms': StoredTerms(
+                np.load(matrix_file / "terms.npy", mmap_mode='r'),
+                np.load(matrix_file / "term_offsets.npy", mmap_mode='r')
+            ),
+            'idf': np.load(matrix_file / "idf.npy", mmap_mode='r'),
+        }
+
+    vocabulary_file = matrix_file.with_name(f"{matrix_file.stem}_vocabulary.json")
+    return read_json_file(vocabulary_file)
+
+def read_sparse_matrix(matrix_file: Path) -> tuple[sparse.csr_matrix, list]:
+    """
+    Load a sparse TF-IDF matrix and its vocabulary without densifying it.
+
+    A vectorization store is memory-mapped: the CSR matrix wraps the mapped
+    arrays without copying them, so only the rows and terms a reader
+    touches are paged in and concurrent readers share the page cache.
+    Older .npz files are loaded into memory.
+
+    Returns:
+        matrix: CSR document-term matrix.
+        terms: Vocabulary, aligned with the matrix columns.
+    """
+    vocabulary = read_vocabulary_file(matrix_file)
+    terms = vocabulary.get('terms', []) if vocabulary else []
+
+    if not is_vectorization_store(matrix_file):
+        return sparse.load_npz(matrix_file).tocsr(), terms
+
+    meta = read_json_file(matrix_file / "meta.json")
+    matrix = sparse.csr_matrix((
+        np.load(matrix_file / "data.npy", mmap_mode='r'),
+        np.load(matrix_file / "indices.npy", mmap_mode='r'),
+        np.load(matrix_file / "indptr.npy", mmap_mode='r')
+    ), shape=tuple(meta['shape']), copy=False)
+    
+    return matrix, terms
+
+def sparse_rows_to_dicts(matrix: sparse.csr_matrix, terms: list) -> list[dict]:
+    """Convert every CSR row into a `{term: score}` dict of its non-zero entries."""
+    documents = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        documents.append({
+            terms[column]: float(score)
+            for column, score in zip(matrix.indices[start:end], matrix.data[start:end])
+        })
+    
+    return documents
+
+TOKEN_SEPARATOR = '\n'
+
+
+def split_document(document) -> list:
+    """Analyzer for TF-IDF: token lists are used as they are, strings are split on whitespace."""
+    return document if isinstance(document, list) else document.split()
+
+def is_tokenized(texts: pd.Series) -> bool:
+    """True when the text column holds token lists instead of strings."""
+    return len(texts) > 0 and isinstance(texts.iloc[0], list)
+
+def split_duplicates(value) -> list:
+    """
+    Indexes of the rows collapsed into a deduplicated row. The `duplicates`
+    column holds them space separated; rows without duplicates are empty (or
+    NaN when read back from CSV).
+    """
+    return [int(index) for index in value.split()] if isinstance(value, str) else []
+
+def row_weights(df: pd.DataFrame) -> np.ndarray:
+    """Number of source comments every row stands for, None when the rows were not deduplicated."""
+    return df['count'].to_numpy(dtype=np.float64) if 'count' in df.columns else None
+
+def duplicate_positions(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Map the rows of a deduplicated frame back to the source rows.
+    
+    Returns:
+        index: Source row indexes, sorted.
+        positions: Position in `df` of the row every source row was collapsed into.
+    """
+    index = df['index'].to_numpy() if 'index' in df.columns else np.arange(1, len(df) + 1)
+    if 'duplicates' not in df.columns:
+        return index, np.arange(len(df))
+    
+    duplicates = [split_duplicates(value) for value in df['duplicates']]
+    positions = np.repeat(np.arange(len(df)), [1 + len(members) for members in duplicates])
+    index = np.fromiter((source_index for row_index, members in zip(index, duplicates) for source_index in (row_index, *members)), dtype=np.int64, count=len(positions))
+    
+    order = np.argsort(index, kind='stable')
+    return index[order], positions[order]
+
+def export_token_store(df: pd.DataFrame, output_file: Path) -> None:
+    """
+    Save a column of token lists as flat arrays plus offsets in a .npz file.
+    
+    All tokens are stored as one UTF-8 buffer, `offsets[i]:offsets[i + 1]` is
+    the token range of document i, so loading needs no Python literal parsing.
+    Deduplicated frames also keep their `count` and `duplicates` columns, the
+    latter as a flat index array with its own offsets.
+    """
+    documents = df['text']
+    offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+    np.cumsum([len(tokens) for tokens in documents], out=offsets[1:])
+    
+    # Tokens never contain whitespace (they come from str.split), so a newline is a safe separator
+    buffer = TOKEN_SEPARATOR.join(token for tokens in documents for token in tokens).encode('utf-8')
+    index = df['index'].to_numpy() if 'index' in df.columns else np.arange(1, len(documents) + 1)
+    
+    arrays = {}
+    if 'count' in df.columns:
+        arrays['count'] = df['count'].to_numpy(dtype=np.int64)
+    if 'duplicates' in df.columns:
+        duplicates = [split_duplicates(value) for value in df['duplicates']]
+        arrays['duplicate_offsets'] = np.concatenate([[0], np.cumsum([len(members) for members in duplicates])]).astype(np.int64)
+        arrays['duplicates'] = np.fromiter((member for members in duplicates for member in members), dtype=np.int64)
+    
+    np.savez(
+        output_file,
+        index=index,
+        offsets=offsets,
+        tokens=np.frombuffer(buffer, dtype=np.uint8),
+        **arrays
+    )
+
+def read_token_store(file_path: Path) -> pd.DataFrame:
+    """
+    Load a token store written by `export_token_store`. A directory is read as
+    a sequence of part files (written by the streaming pipeline), in name order.
+    """
+    if file_path.is_dir():
+        parts = [read_token_store(part) for part in sorted(file_path.glob("part-*.npz"))]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({'index': [], 'text': []})
+    
+    columns = {}
+    with np.load(file_path) as store:
+        index = store['index']
+        offsets = store['offsets']
+        buffer = store['tokens'].tobytes().decode('utf-8')
+        
+        if 'count' in store.files:
+            columns['count'] = store['count']
+        if 'duplicates' in store.files:
+            duplicates, duplicate_offsets = store['duplicates'], store['duplicate_offsets']
+            columns['duplicates'] = [
+                ' '.join(map(str, duplicates[start:end])) for start, end in zip(duplicate_offsets[:-1], duplicate_offsets[1:])
+            ]
+    
+    tokens = buffer.split(TOKEN_SEPARATOR) if offsets[-1] else []
+    documents = [tokens[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    
+    return pd.DataFrame({'index': index, 'text': documents, **columns})
+
+def read_stage_file(file_path: Path) -> pd.DataFrame:
+    """Read the output of a preprocessing stage, either a CSV file or a token store."""
+    file_path = Path(file_path)
+    
+    if file_path.is_dir() or file_path.suffix == '.npz':
+        return read_token_store(file_path)
+    
+    # Space separated indexes would otherwise be parsed as numbers when there is only one
+    return pd.read_csv(file_path, dtype={'duplicates': str})
+
+OUTPUT_FORMATS = ('auto', 'csv')
+
+
+def as_csv_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Join token lists with spaces so they can be written to CSV and split back on whitespace."""
+    if not is_tokenized(df['text']):
+        return df
+    
+    return df.assign(text=df['text'].apply(' '.join))
+
+def export_stage_file(df: pd.DataFrame, output_dir: Path, prefix: str, timestamp: str, output_format: str = 'auto') -> Path:
+    """
+    Write a stage output. With the 'auto' format a tokenized output becomes a
+    token store and anything else a CSV file, 'csv' always writes CSV.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    if output_format == 'auto' and is_tokenized(df['text']):
+        output_file_name = output_dir / f"{prefix}_{timestamp}.npz"
+        export_token_store(df, output_file_name)
+    else:
+        output_file_name = output_dir / f"{prefix}_{timestamp}.csv"
+        as_csv_frame(df).to_csv(output_file_name, index=False)
+    
+    return output_file_name
+
+def export_stage_chunk(df: pd.DataFrame, output_dir: Path, prefix: str, timestamp: str, num_chunk: int, output_format: str = 'auto') -> Path:
+    """
+    Append one streamed chunk to a stage output. Strings are appended to a CSV
+    file, token lists are written as the next part file of a token store
+    directory (unless the output format is 'csv').
+    """
+    if output_format == 'auto' and is_tokenized(df['text']):
+        output_path = output_dir / f"{prefix}_{timestamp}"
+        output_path.mkdir(parents=True, exist_ok=True)
+        export_token_store(df, output_path / f"part-{num_chunk:05d}.npz")
+    else:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f"{prefix}_{timestamp}.csv"
+        as_csv_frame(df).to_csv(output_path, mode='w' if num_chunk == 0 else 'a', header=num_chunk == 0, index=False)
+    
+    return output_path
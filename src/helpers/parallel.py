@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+import pandas as pd
+
+
+DEFAULT_SHARD_SIZE = 2_000
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+def apply_shard(func: Callable, shard: list) -> list:
+    return [func(item) for item in shard]
+
+def parallel_map(
+        func: Callable,
+        items: list,
+        workers: int = 1,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        initializer: Callable = None,
+        initargs: tuple = ()
+    ) -> list:
+    """
+    Apply `func` to every item, sharding the items across a process pool.
+
+    Args:
+        func: Picklable (module level) function applied to every item.
+        items: Items to process.
+        workers: Number of worker processes. 1 or less runs serially in this process.
+        shard_size: Number of items sent to a worker at a time.
+        initializer: Called once in every worker before it processes a shard,
+            used to build expensive objects (the stemmer) once.
+        initargs: Arguments for `initializer`.
+
+    Returns:
+        Results in the same order as `items`.
+    """
+    items = list(items)
+
+    if workers <= 1 or len(items) <= shard_size:
+        if initializer is not None:
+            initializer(*initargs)
+        return apply_shard(func, items)
+
+    shards = [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+    workers = min(workers, len(shards))
+
+    # executor.map yields results in submission order, so shards are reassembled in place
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        results = []
+        for shard_result in executor.map(apply_shard, [func] * len(shards), shards):
+            results.extend(shard_result)
+
+    return results
+
+def parallel_apply(
+        texts: pd.Series,
+        func: Callable,
+        workers: int = 1,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        initializer: Callable = None,
+        initargs: tuple = ()
+    ) -> pd.Series:
+    """Process-pool counterpart of `texts.apply(func)`, keeping index and order."""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return texts.apply(func)
+
+    results = parallel_map(func, texts.tolist(), workers, shard_size, initializer, initargs)
+    return pd.Series(results, index=texts.index, name=texts.name)
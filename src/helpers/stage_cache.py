@@ -0,0 +1,151 @@
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from helpers.io import export_token_store, is_tokenized, read_stage_file
+
+
+DEFAULT_MAX_SIZE_MB = 1_024
+DEFAULT_MAX_AGE_DAYS = 30
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_path(path: Path) -> str:
+    """SHA-256 of a file, or of every file of a directory (token store parts) in name order."""
+    path = Path(path)
+    digest = hashlib.sha256()
+    files = sorted(file for file in path.rglob("*") if file.is_file()) if path.is_dir() else [path]
+
+    for file in files:
+        digest.update(file.name.encode('utf-8'))
+        with open(file, 'rb') as handle:
+            while block := handle.read(HASH_BLOCK_SIZE):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+def chain_key(parent_key: str, step: str, fingerprint: str) -> str:
+    """Cache key of a step output: the upstream key, the step name and the step parameters."""
+    return hashlib.sha256(f"{parent_key}\0{step}\0{fingerprint}".encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    Content-addressed store of preprocessing step outputs.
+
+    An artifact is named after the key of the data it holds, which is derived
+    from the hash of the source data and of every step applied to it (see
+    `chain_key`), so an unchanged pipeline prefix always maps to the same
+    artifact. Reading an artifact refreshes its modification time, `collect_garbage`
+    evicts the least recently used artifacts once the cache is too old or too big.
+    """
+
+    def __init__(
+            self,
+            cache_dir: Path,
+            max_size_mb: int = DEFAULT_MAX_SIZE_MB,
+            max_age_days: int = DEFAULT_MAX_AGE_DAYS
+        ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_size_mb = max_size_mb
+        self.max_age_days = max_age_days
+
+    def lookup(self, key: str) -> Path:
+        """Path of the artifact stored for `key`, or None on a cache miss."""
+        for artifact in self.cache_dir.glob(f"{key}.*"):
+            if '.tmp' in artifact.suffixes:
+                continue
+            os.utime(artifact)
+            return artifact
+
+        return None
+
+    def load(self, key: str) -> pd.DataFrame:
+        artifact = self.lookup(key)
+        if artifact is None:
+            return None
+
+        if artifact.suffix == '.csv':
+            # Keep empty documents as empty strings, like the in-memory pipeline has them
+            return pd.read_csv(artifact, keep_default_na=False, dtype={'duplicates': str})
+
+        return read_stage_file(artifact)
+
+    def store(self, df: pd.DataFrame, key: str) -> Path:
+        """Write a step output under `key`, token lists as a token store and strings as CSV."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        suffix = '.npz' if is_tokenized(df['text']) else '.csv'
+        artifact = self.cache_dir / f"{key}{suffix}"
+        temp_file = self.cache_dir / f"{key}.tmp{suffix}"
+
+        if suffix == '.npz':
+            export_token_store(df, temp_file)
+        else:
+            df.to_csv(temp_file, index=False)
+
+        # Readers never see a half written artifact
+        os.replace(temp_file, artifact)
+
+        return artifact
+
+    def store_path(self, path: Path, key: str) -> Path:
+        """Copy an already written stage output (file or token store directory) under `key`."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = Path(path)
+
+        if path.is_dir():
+            artifact = self.cache_dir / f"{key}.store"
+            shutil.rmtree(artifact, ignore_errors=True)
+            shutil.copytree(path, artifact)
+        else:
+            artifact = self.cache_dir / f"{key}{path.suffix}"
+            shutil.copyfile(path, artifact)
+
+        return artifact
+
+    def collect_garbage(self) -> int:
+        """
+        Evict artifacts not used for `max_age_days`, then the least recently
+        used ones until the cache fits in `max_size_mb`.
+
+        Returns:
+            Number of evicted artifacts.
+        """
+        if not self.cache_dir.exists():
+            return 0
+
+        artifacts = []
+        for artifact in self.cache_dir.iterdir():
+            if artifact.is_dir():
+                size = sum(file.stat().st_size for file in artifact.rglob("*") if file.is_file())
+            else:
+                size = artifact.stat().st_size
+            artifacts.append((artifact.stat().st_mtime, size, artifact))
+
+        # Most recently used first
+        artifacts.sort(key=lambda item: item[0], reverse=True)
+
+        oldest_allowed = time.time() - self.max_age_days * 86_400
+        max_size = self.max_size_mb * 1024 * 1024
+        total_size = 0
+        evicted = 0
+
+        for last_used, size, artifact in artifacts:
+            total_size += size
+            if last_used >= oldest_allowed and total_size <= max_size:
+                continue
+
+            if artifact.is_dir():
+                shutil.rmtree(artifact, ignore_errors=True)
+            else:
+                artifact.unlink(missing_ok=True)
+            total_size -= size
+            evicted += 1
+
+        return evicted
@@ -0,0 +1,162 @@
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+TOKEN_ID_DTYPE = np.int32
+
+
+class Vocabulary:
+    """
+    Interner of every token seen by this process: a token is stored once and
+    documents refer to it by a compact int32 ID, so repeated words cost four
+    bytes instead of a string object and comparisons are integer comparisons.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def intern(self, token: str) -> int:
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.terms)
+            self.terms.append(token)
+
+        return token_id
+
+    def encode(self, tokens: list) -> np.ndarray:
+        return np.fromiter((self.intern(token) for token in tokens), dtype=TOKEN_ID_DTYPE, count=len(tokens))
+
+    def decode(self, ids: np.ndarray) -> list:
+        terms = self.terms
+        return [terms[token_id] for token_id in ids.tolist()]
+
+
+vocabulary = None
+
+def get_vocabulary() -> Vocabulary:
+    global vocabulary
+
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+
+    return vocabulary
+
+def is_encoded(texts: pd.Series) -> bool:
+    """True when the text column holds token ID arrays (see `encode_texts`)."""
+    return len(texts) > 0 and isinstance(texts.iloc[0], np.ndarray)
+
+def flatten_texts(texts: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Join the ID arrays of an encoded column into one flat array.
+
+    Returns:
+        ids: Token IDs of all documents, back to back.
+        offsets: `ids[offsets[i]:offsets[i + 1]]` are the IDs of document i.
+    """
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in texts], out=offsets[1:])
+    ids = np.concatenate(list(texts)).astype(TOKEN_ID_DTYPE, copy=False) if len(texts) else np.zeros(0, dtype=TOKEN_ID_DTYPE)
+
+    return ids, offsets
+
+def unflatten_texts(ids: np.ndarray, offsets: np.ndarray, like: pd.Series) -> pd.Series:
+    """Inverse of `flatten_texts`, every row is a view into `ids`."""
+    bounds = offsets.tolist()
+    return pd.Series([ids[start:end] for start, end in zip(bounds, bounds[1:])], index=like.index, name=like.name, dtype=object)
+
+def encode_texts(texts: pd.Series, token_vocabulary: Vocabulary = None) -> pd.Series:
+    """Turn a column of token lists into ID arrays that share one flat buffer."""
+    token_vocabulary = get_vocabulary() if token_vocabulary is None else token_vocabulary
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(tokens) for tokens in texts], out=offsets[1:])
+    intern = token_vocabulary.intern
+    ids = np.fromiter((intern(token) for tokens in texts for token in tokens), dtype=TOKEN_ID_DTYPE, count=offsets[-1])
+
+    return unflatten_texts(ids, offsets, texts)
+
+def decode_texts(texts: pd.Series, token_vocabulary: Vocabulary = None) -> pd.Series:
+    """Turn a column of ID arrays back into token lists."""
+    token_vocabulary = get_vocabulary() if token_vocabulary is None else token_vocabulary
+
+    return pd.Series([token_vocabulary.decode(ids) for ids in texts], index=texts.index, name=texts.name)
+
+def decode_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The frame with its text column as token lists, for writers and steps that only know strings."""
+    if not is_encoded(df['text']):
+        return df
+
+    return df.assign(text=decode_texts(df['text']))
+
+
+class TokenMap:
+    """
+    ID-to-ID lookup table of a token level transform (stemming, stopword
+    removal, ...). Every token maps to zero, one or several tokens; the
+    transform runs once per distinct token, later occurrences are a table
+    lookup. The table grows with the vocabulary.
+
+    Args:
+        map_terms: Maps a list of terms to the list of replacement tokens of
+            every term, called with the terms whose IDs are not in the table yet.
+        token_vocabulary: Vocabulary the IDs belong to, the global one by default.
+    """
+
+    def __init__(self, map_terms: Callable[[list], list], token_vocabulary: Vocabulary = None):
+        self.map_terms = map_terms
+        self.vocabulary = get_vocabulary() if token_vocabulary is None else token_vocabulary
+        # lengths[i] is the number of tokens ID i maps to, -1 while it is not resolved
+        self.lengths = np.full(0, -1, dtype=np.int32)
+        self.targets = np.zeros(0, dtype=TOKEN_ID_DTYPE)
+        self.expansions = {}
+
+    def resolve(self, ids: np.ndarray) -> None:
+        size = len(self.vocabulary)
+        if len(self.lengths) < size:
+            self.lengths = np.concatenate([self.lengths, np.full(size - len(self.lengths), -1, dtype=np.int32)])
+            self.targets = np.concatenate([self.targets, np.zeros(size - len(self.targets), dtype=TOKEN_ID_DTYPE)])
+
+        missing_ids = np.unique(ids[self.lengths[ids] < 0])
+        if not len(missing_ids):
+            return
+
+        terms = self.vocabulary.terms
+        replacements = self.map_terms([terms[token_id] for token_id in missing_ids.tolist()])
+        for token_id, tokens in zip(missing_ids.tolist(), replacements):
+            self.lengths[token_id] = len(tokens)
+            if len(tokens) == 1:
+                self.targets[token_id] = self.vocabulary.intern(tokens[0])
+            elif tokens:
+                self.expansions[token_id] = self.vocabulary.encode(tokens)
+
+    def apply(self, ids: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Map flat document IDs (see `flatten_texts`), returning the new IDs and offsets."""
+        self.resolve(ids)
+
+        lengths = self.lengths[ids]
+        if lengths.min(initial=1) == 1 and lengths.max(initial=1) == 1:
+            # One token in, one token out (case folding, most dictionaries): the offsets are unchanged
+            return self.targets[ids], offsets
+
+        ends = np.cumsum(lengths, dtype=np.int64)
+        new_offsets = np.concatenate([[0], ends])[offsets]
+
+        new_ids = np.empty(ends[-1] if len(ends) else 0, dtype=TOKEN_ID_DTYPE)
+        is_single = lengths == 1
+        new_ids[ends[is_single] - 1] = self.targets[ids[is_single]]
+
+        # Tokens that expand to several tokens are rare (phrases, normaliser splits)
+        for position in np.flatnonzero(lengths > 1).tolist():
+            new_ids[ends[position] - lengths[position]:ends[position]] = self.expansions[int(ids[position])]
+
+        return new_ids, new_offsets
+
+    def apply_texts(self, texts: pd.Series) -> pd.Series:
+        """Map an encoded column, see `encode_texts`."""
+        return unflatten_texts(*self.apply(*flatten_texts(texts)), texts)
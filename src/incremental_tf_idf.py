@@ -0,0 +1,321 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from constants import TIMESTAMP, TFIDF_STATE_DIR, VECTORIZATION_DIR
+from deduplication import expand_duplicates
+from helpers.io import export_sparse_matrix, read_json_file, split_document
+from helpers.metrics import RunReport, path_size
+
+
+DEFAULT_DRIFT_THRESHOLD = 0.1
+
+
+def count_terms(documents: list, vocabulary: dict, terms: list = None) -> sparse.csr_matrix:
+    """
+    Raw term counts of a batch of documents.
+
+    Args:
+        documents: Token lists or whitespace separated strings.
+        vocabulary: {term: column}.
+        terms: Vocabulary list. When given, unknown terms are added to it and
+            to `vocabulary` with the next free column, otherwise they are ignored.
+
+    Returns:
+        CSR matrix with one column per known term.
+    """
+    indices = []
+    indptr = [0]
+
+    for document in documents:
+        for token in split_document(document):
+            column = vocabulary.get(token)
+            if column is None:
+                if terms is None:
+                    continue
+                column = len(terms)
+                vocabulary[token] = column
+                terms.append(token)
+            indices.append(column)
+        indptr.append(len(indices))
+
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(documents), len(vocabulary))
+    )
+    counts.sum_duplicates()
+
+    return counts
+
+def sublinear_tf(counts: sparse.csr_matrix) -> sparse.csr_matrix:
+    tf = counts.copy()
+    np.log(tf.data, out=tf.data)
+    tf.data += 1
+    return tf
+
+def weight_rows(tf: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    """Apply the IDF to sublinear tf rows and l2-normalise them, like `TfidfVectorizer(sublinear_tf=True)`."""
+    tfidf = tf.copy()
+    tfidf.data *= idf[tfidf.indices]
+    return normalize(tfidf, norm='l2', copy=False)
+
+
+class IncrementalTfidf:
+    """
+    TF-IDF whose vocabulary and document frequencies are kept as persistent
+    state, so a new batch of documents is vectorized without refitting the
+    whole corpus.
+
+    Weights follow the `TfidfVectorizer` setup of `tf_idf.compute_tfidf`
+    (sublinear tf, smooth idf, l2 norm). Every batch is stored as a part file
+    of raw sublinear tf and a part file of its TF-IDF rows, computed with the
+    IDF at the time it was added. When the IDF has drifted more than
+    `drift_threshold` (relative) from the reference IDF, the current IDF
+    becomes the new reference and the IDF version is bumped; no stored part
+    is touched. A part weighted with an older version is re-weighted with the
+    reference IDF when `matrix` reads it (or by an explicit `renormalize`),
+    after which it equals a full refit, up to the column order (terms are
+    numbered in order of first appearance instead of sorted).
+
+    State directory layout:
+        state.json                  documents seen, number of parts, drift threshold,
+                                    IDF version and the IDF version of every part
+        terms.json                  vocabulary, aligned with the columns
+        document_frequency.npy      documents containing every term
+        reference_idf.npy           IDF of the current IDF version
+        tf/part-*.npz               sublinear tf per batch
+        tfidf/part-*.npz            TF-IDF rows per batch
+    """
+
+    def __init__(self, state_dir: Path = TFIDF_STATE_DIR, drift_threshold: float = DEFAULT_DRIFT_THRESHOLD):
+        self.state_dir = Path(state_dir)
+        self.drift_threshold = drift_threshold
+        self.terms = []
+        self.vocabulary = {}
+        self.document_frequency = np.zeros(0, dtype=np.int64)
+        self.reference_idf = np.zeros(0, dtype=np.float64)
+        self.n_documents = 0
+        self.num_parts = 0
+        self.idf_version = 0
+        self.part_versions = []
+
+        if (self.state_dir / "state.json").exists():
+            self.load()
+
+    @property
+    def idf(self) -> np.ndarray:
+        return np.log((1 + self.n_documents) / (1 + self.document_frequency)) + 1
+
+    def idf_drift(self) -> float:
+        """Largest relative change of the IDF of a known term since the stored rows were normalised."""
+        if not len(self.reference_idf):
+            return 0.0
+
+        current_idf = self.idf[:len(self.reference_idf)]
+        return float(np.max(np.abs(current_idf - self.reference_idf) / self.reference_idf))
+
+    def partial_fit_transform(self, documents: list) -> sparse.csr_matrix:
+        """
+        Add a batch of documents to the corpus and return its TF-IDF rows.
+
+        Cost is proportional to the batch (plus the vocabulary size for the
+        IDF): an IDF drift only marks the older rows stale, they are
+        re-weighted when read.
+
+        Args:
+            documents: Token lists or whitespace separated strings.
+
+        Returns:
+            CSR matrix of the batch, with one column per term of the updated vocabulary.
+        """
+        documents = list(documents)
+        counts = count_terms(documents, self.vocabulary, self.terms)
+
+        self.document_frequency = np.concatenate([
+            self.document_frequency,
+            np.zeros(len(self.terms) - len(self.document_frequency), dtype=np.int64)
+        ])
+        self.document_frequency += np.bincount(counts.indices, minlength=len(self.terms))
+        self.n_documents += len(documents)
+
+        tf = sublinear_tf(counts)
+        tfidf = weight_rows(tf, self.idf)
+        self.write_part(tf, tfidf)
+
+        if self.num_parts == 1:
+            self.reference_idf = self.idf
+        elif self.drift_threshold is not None:
+            drift = self.idf_drift()
+            if drift > self.drift_threshold:
+                print(f"IDF drifted by {drift:.1%} (threshold {self.drift_threshold:.1%}), older rows are re-weighted when read")
+                self.reference_idf = self.idf
+                self.idf_version += 1
+                # The batch was just weighted with this IDF
+                self.part_versions[-1] = self.idf_version
+
+        self.save()
+
+        return tfidf
+
+    def transform(self, documents: list) -> sparse.csr_matrix:
+        """TF-IDF rows of documents with the current state, without adding them to the corpus."""
+        tf = sublinear_tf(count_terms(list(documents), self.vocabulary))
+        return weight_rows(tf, self.idf)
+
+    def stale_parts(self) -> list:
+        """Parts whose TF-IDF rows were weighted with an older IDF version than the reference."""
+        return [num_part for num_part, version in enumerate(self.part_versions) if version < self.idf_version]
+
+    def reweight_part(self, num_part: int) -> sparse.csr_matrix:
+        """Re-weight a stored batch with the reference IDF and write it back."""
+        tf = self.read_part("tf", num_part)
+        tfidf = weight_rows(tf, self.reference_idf[:tf.shape[1]])
+        self.write_matrix(tfidf, "tfidf", num_part)
+        self.part_versions[num_part] = self.idf_version
+
+        return tfidf
+
+    def renormalize(self) -> None:
+        """Re-weight every stored batch with the current IDF now instead of when it is read."""
+        self.reference_idf = self.idf
+        self.idf_version += 1
+        for num_part in range(self.num_parts):
+            self.reweight_part(num_part)
+
+        self.save()
+
+    def matrix(self) -> sparse.csr_matrix:
+        """TF-IDF rows of the whole corpus, older batches padded to the current vocabulary."""
+        stale_parts = set(self.stale_parts())
+
+        parts = []
+        for num_part in range(self.num_parts):
+            part = self.reweight_part(num_part) if num_part in stale_parts else self.read_part("tfidf", num_part)
+            part.resize((part.shape[0], len(self.terms)))
+            parts.append(part)
+
+        # Re-weighted parts are written back, so every part is re-weighted once per IDF version
+        if stale_parts:
+            self.write_state()
+
+        if not parts:
+            return sparse.csr_matrix((0, len(self.terms)))
+
+        return sparse.vstack(parts, format='csr')
+
+    def part_file(self, kind: str, num_part: int) -> Path:
+        return self.state_dir / kind / f"part-{num_part:05d}.npz"
+
+    def read_part(self, kind: str, num_part: int) -> sparse.csr_matrix:
+        return sparse.load_npz(self.part_file(kind, num_part)).tocsr()
+
+    def write_matrix(self, matrix: sparse.csr_matrix, kind: str, num_part: int) -> None:
+        part_file = self.part_file(kind, num_part)
+        part_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # np.savez appends .npz to names without it, so the temporary file keeps the suffix
+        temp_file = part_file.with_name(f"{part_file.stem}.tmp.npz")
+        sparse.save_npz(temp_file, matrix, compressed=True)
+        os.replace(temp_file, part_file)
+
+    def write_part(self, tf: sparse.csr_matrix, tfidf: sparse.csr_matrix) -> None:
+        self.write_matrix(tf, "tf", self.num_parts)
+        self.write_matrix(tfidf, "tfidf", self.num_parts)
+        self.part_versions.append(self.idf_version)
+        self.num_parts += 1
+
+    def load(self) -> None:
+        state = read_json_file(self.state_dir / "state.json")
+        self.n_documents = state['n_documents']
+        self.num_parts = state['num_parts']
+        # States written before IDF versions were re-weighted eagerly, so all their parts are current
+        self.idf_version = state.get('idf_version', 0)
+        self.part_versions = state.get('part_versions', [0] * self.num_parts)
+
+        self.terms = read_json_file(self.state_dir / "terms.json")
+        self.vocabulary = {term: column for column, term in enumerate(self.terms)}
+        self.document_frequency = np.load(self.state_dir / "document_frequency.npy")
+        self.reference_idf = np.load(self.state_dir / "reference_idf.npy")
+
+    def save(self) -> None:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+        np.save(self.state_dir / "document_frequency.npy", self.document_frequency)
+        np.save(self.state_dir / "reference_idf.npy", self.reference_idf)
+        with open(self.state_dir / "terms.json", 'w', encoding='utf-8') as file:
+            json.dump(self.terms, file, ensure_ascii=False)
+
+        # state.json is written last, it marks the other files as complete
+        self.write_state()
+
+    def write_state(self) -> None:
+        temp_file = self.state_dir / "state.json.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump({
+                'n_documents': self.n_documents,
+                'num_parts': self.num_parts,
+                'drift_threshold': self.drift_threshold,
+                'idf_version': self.idf_version,
+                'part_versions': self.part_versions,
+            }, file)
+        os.replace(temp_file, self.state_dir / "state.json")
+
+
+def update_tfidf(
+        df: pd.DataFrame,
+        token_column: str,
+        state_dir: Path = TFIDF_STATE_DIR,
+        drift_threshold: float = DEFAULT_DRIFT_THRESHOLD,
+        report: RunReport = None
+    ) -> tuple:
+    """
+    Incremental counterpart of `tf_idf.compute_tfidf`: add the documents of
+    `df` to the persistent TF-IDF state and vectorize only them.
+
+    Args:
+        df: Pandas DataFrame containing the new documents.
+        token_column: Name of the column containing lists of tokens (or
+            whitespace separated strings) per document.
+        state_dir: Directory of the persistent state, created on first use.
+        drift_threshold: Relative IDF drift that marks the older rows for
+            re-weighting, None never re-weights them.
+        report: Collects per-stage metrics, None disables them.
+
+    Returns:
+        tfidf_matrix: Sparse CSR matrix with TF-IDF scores of the new documents.
+        model: Updated IncrementalTfidf state.
+    """
+    report = report or RunReport("vectorization", enabled=False)
+
+    # The state counts documents one by one, so collapsed comments are added back as rows
+    df = expand_duplicates(df)
+
+    with report.stage("Loading TF-IDF state") as stage:
+        model = IncrementalTfidf(state_dir, drift_threshold)
+        stage.add(bytes_read=path_size(state_dir))
+    previous_documents = model.n_documents
+
+    with report.stage("TF-IDF update") as stage:
+        tfidf_matrix = model.partial_fit_transform(df[token_column])
+        stage.add(rows_in=len(df), rows_out=tfidf_matrix.shape[0])
+        stage.set(vocabulary_size=len(model.terms), nnz=tfidf_matrix.nnz, idf_drift=model.idf_drift())
+
+    print("\nIncremental TF-IDF update:")
+    print(f"Documents: {previous_documents:,} + {tfidf_matrix.shape[0]:,} = {model.n_documents:,}")
+    print(f"Vocabulary size: {len(model.terms):,} terms")
+    print(f"IDF drift since the reference IDF: {model.idf_drift():.2%} ({len(model.stale_parts()):,} older batch(es) re-weighted when read)")
+
+    print("\nSaving sparse TF-IDF matrix of the new documents to the vectorization store")
+    try:
+        with report.stage("Saving vectorization") as stage:
+            store_dir = export_sparse_matrix(tfidf_matrix, model.terms, model.idf, VECTORIZATION_DIR / f"vectorization_{TIMESTAMP}")
+            stage.add(rows_in=tfidf_matrix.shape[0], bytes_written=path_size(store_dir))
+        print(f"Vectorization store successfully exported as {store_dir}")
+    except Exception as e:
+        print("An error occurred while saving the vectorization store:", e)
+
+    return tfidf_matrix, model
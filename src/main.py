@@ -1,28 +1,27 @@
-import pandas as pd
 import os
 import questionary
 
-from constants import DATASET_FILE_PATH
+from constants import DATASET_FILE_PATH, RUN_REPORT_DIR, STAGE_CACHE_DIR, TIMESTAMP
 
-from case_folding import main as case_folding
-from data_cleaning import main as data_cleaning
-from stopword import main as stopword
-from stemming import main as stemming
-from word_repair import main as word_repair
-from tokenization import main as tokenization
+from helpers.metrics import RunReport
 
-from tf_idf import main as tf_idf
+# The pipeline, stage modules and scikit-learn are imported by the menu entry
+# that needs them, so the menu shows up without loading them first
+
+PREVIEW_ROWS = 20
 
 
 last_process_of_preprocessing = None
+preprocessing_steps_done = None
+is_write_metrics = False
 
 
 def preprocessing_data() -> None:
-    global last_process_of_preprocessing
+    global last_process_of_preprocessing, preprocessing_steps_done, is_write_metrics
     
     print("Preprocessing data is running!")
     
-    preprocessing_steps = ["Data cleaning", "Stemming", "Stopword removal", "Case folding", "Word repair", "Tokenizing"]
+    preprocessing_steps = ["Deduplication", "Data cleaning", "Stemming", "Stopword removal", "Case folding", "Word repair", "Tokenizing"]
     chosen_steps = []
     num_step = 0
     
@@ -47,25 +46,34 @@ def preprocessing_data() -> None:
         print("Preprocessing is cancelled")
         return
     
-    prev_step = None
-
-    for step in chosen_steps:
-        if step == "Data cleaning":
-            data_cleaning(prev_process=prev_step)
-        elif step == "Stopword removal":
-            stopword(prev_process=prev_step)
-        elif step == "Case folding":
-            case_folding(prev_process=prev_step)
-        elif step == "Word repair":
-            word_repair(prev_process=prev_step)
-        elif step == "Tokenizing":
-            tokenization(prev_process=prev_step)
-        elif step == "Stemming":
-            stemming(prev_process=prev_step)
-        
-        prev_step = step
+    from helpers.parallel import default_workers
+    from helpers.stage_cache import StageCache
+    from pipeline import run_pipeline, run_pipeline_streaming
+    
+    is_save_checkpoints = questionary.confirm("Save intermediate result of every step?", default=False).ask()
+    workers = questionary.text(
+        "Worker processes for data cleaning and stemming (1 = serial)",
+        default=str(default_workers()),
+        validate=lambda x: x.isdigit() and int(x) > 0
+    ).ask()
+    is_use_cache = questionary.confirm("Reuse cached results of unchanged steps?", default=True).ask()
+    stage_cache = StageCache(STAGE_CACHE_DIR) if is_use_cache else None
+    is_streaming = questionary.confirm("Process the dataset in chunks (streaming mode for large corpora)?", default=False).ask()
+    is_write_metrics = questionary.confirm("Write a run metrics report (timings, memory, rows, bytes)?", default=True).ask()
+    report = RunReport("preprocessing", enabled=is_write_metrics)
+    
+    if is_streaming:
+        chunk_size = questionary.text("Rows per chunk", default="10000", validate=lambda x: x.isdigit() and int(x) > 0).ask()
+        run_pipeline_streaming(chosen_steps, source_file=DATASET_FILE_PATH, chunk_size=int(chunk_size), save_checkpoints=is_save_checkpoints, workers=int(workers), stage_cache=stage_cache, report=report)
+    else:
+        run_pipeline(chosen_steps, source_file=DATASET_FILE_PATH, save_checkpoints=is_save_checkpoints, workers=int(workers), stage_cache=stage_cache, report=report)
     
-    last_process_of_preprocessing = prev_step
+    report_file_name = report.export(RUN_REPORT_DIR / f"preprocessing_{TIMESTAMP}.json")
+    if report_file_name:
+        print(f"Run metrics report successfully exported as {report_file_name}")
+    
+    last_process_of_preprocessing = chosen_steps[-1] if chosen_steps else None
+    preprocessing_steps_done = chosen_steps
     
     print("=== PREPROCESSING IS DONE ===")
 
@@ -73,18 +81,26 @@ def preprocessing_data() -> None:
 def vectorization() -> None:
     print("Vectorization is running!")
     
-    tf_idf(last_process_of_preprocessing=last_process_of_preprocessing)
+    from tf_idf import main as tf_idf
+    
+    tf_idf(last_process_of_preprocessing=last_process_of_preprocessing, preprocessing_steps=preprocessing_steps_done, write_metrics=is_write_metrics)
 
 def sentiment_analysis() -> None:
     print("Sentiment analysis is running!")
 
 
+def read_preview(source_file, rows: int = PREVIEW_ROWS):
+    import pandas as pd
+    
+    return pd.read_csv(source_file, nrows=rows)
+
 def main() -> None:
     print("Preview dataset")
     
-    raw_data_df = pd.read_csv(DATASET_FILE_PATH)
+    # Only the previewed rows are parsed, not the whole dataset
+    raw_data_df = read_preview(DATASET_FILE_PATH, PREVIEW_ROWS)
     
-    print(raw_data_df.head(20))
+    print(raw_data_df)
     print("\n")
     
     selected_menu = "" 
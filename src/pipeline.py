@@ -0,0 +1,379 @@
+import importlib
+import shutil
+import pandas as pd
+from functools import lru_cache
+from importlib import metadata, util
+from pathlib import Path
+from typing import Iterator
+
+from constants import TIMESTAMP, DATASET_FILE_PATH, CUSTOM_DICTIONARY_FILE_PATH, CUSTOM_STOPWORDS_FILE_PATH, CASE_FOLDING_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, DEDUPLICATION_OUTPUT_DIR, STEMMING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR
+from helpers.io import export_stage_chunk, export_stage_file, is_tokenized, read_stage_file
+from helpers.metrics import RunReport, path_size
+from helpers.parallel import DEFAULT_SHARD_SIZE
+from helpers.stage_cache import StageCache, chain_key, hash_path
+from helpers.vocabulary import decode_frame, encode_texts, is_encoded
+
+
+# Step name -> ("module:function" transform over the text column, output directory, output file prefix)
+# Stage modules are only imported when their step runs, see `load_transform`
+PREPROCESSING_STEPS = {
+    "Data cleaning": ("data_cleaning:clean_texts", DATA_CLEANING_OUTPUT_DIR, "data_cleaning"),
+    "Stemming": ("stemming:stem_texts", STEMMING_OUTPUT_DIR, "stemming"),
+    "Stopword removal": ("stopword:remove_stopwords", STOPWORD_OUTPUT_DIR, "stopword_removal"),
+    "Case folding": ("case_folding:fold_case", CASE_FOLDING_OUTPUT_DIR, "case_folding"),
+    "Word repair": ("word_repair:repair_words", WORD_REPAIR_OUTPUT_DIR, "word_repair"),
+    "Tokenizing": ("tokenization:tokenize_texts", TOKENIZATION_OUTPUT_DIR, "tokenization"),
+    "Deduplication": ("deduplication:deduplicate", DEDUPLICATION_OUTPUT_DIR, "deduplication"),
+}
+
+# Step name -> "module:function" run once after the last chunk, for state the transform keeps across calls
+STEP_FINALIZERS = {
+    "Stemming": "stemming:save_stem_cache",
+}
+
+# Steps whose transform takes and returns the whole frame because they change the rows
+FRAME_STEPS = {"Deduplication"}
+
+# Row-wise steps whose transform accepts the `workers`/`shard_size` executor options. Stopword
+# removal is not one of them: a set lookup per word costs less than sending the rows to a worker
+PARALLEL_STEPS = {"Data cleaning", "Stemming"}
+
+# Steps that map token ID arrays (see `helpers.vocabulary`) as well as token lists and strings
+TOKEN_ID_STEPS = {"Case folding", "Word repair", "Stopword removal", "Stemming", "Tokenizing"}
+
+# Bump by hand when the layout or meaning of cached step outputs changes
+CACHE_FORMAT_VERSION = 1
+
+# Helper modules every step's output depends on (token store encoding, token IDs, the executor)
+SHARED_STEP_MODULES = ["helpers.io", "helpers.vocabulary", "helpers.parallel"]
+
+# Files and libraries a step reads besides its own module, they are part of the step's cache key
+STEP_DEPENDENCIES = {
+    "Word repair": ([CUSTOM_DICTIONARY_FILE_PATH], []),
+    "Stopword removal": ([CUSTOM_STOPWORDS_FILE_PATH], ["Sastrawi"]),
+    "Stemming": ([], ["Sastrawi"]),
+}
+
+
+def export_step_output(df: pd.DataFrame, step: str, output_format: str = 'auto') -> Path:
+    _, output_dir, prefix = PREPROCESSING_STEPS[step]
+
+    return export_stage_file(decode_frame(df), output_dir, prefix, TIMESTAMP, output_format)
+
+@lru_cache(maxsize=None)
+def load_transform(step: str):
+    """Import the module of a step and return its transform."""
+    module_name, function_name = PREPROCESSING_STEPS[step][0].split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def finalize_steps(steps: list) -> None:
+    """Run the finalizer of every step that ran, e.g. to write the stem cache once per run."""
+    for step in steps:
+        if step in STEP_FINALIZERS:
+            module_name, function_name = STEP_FINALIZERS[step].split(':')
+            getattr(importlib.import_module(module_name), function_name)()
+
+@lru_cache(maxsize=None)
+def step_fingerprint(step: str) -> str:
+    """
+    Identify everything a step's output depends on besides its input: the
+    cache format version, the source of the step's module and of the shared
+    helper modules, its dictionary files and library versions. Editing any
+    of them changes the cache key of this step and every later one.
+    """
+    module_name = PREPROCESSING_STEPS[step][0].split(':')[0]
+    dependency_files, libraries = STEP_DEPENDENCIES.get(step, ([], []))
+
+    # Modules are located without importing them, a full cache hit never loads the stage
+    parts = [f"format={CACHE_FORMAT_VERSION}"]
+    parts += [hash_path(util.find_spec(name).origin) for name in [module_name, *SHARED_STEP_MODULES]]
+    parts += [hash_path(file) if file.exists() else "missing" for file in dependency_files]
+    parts += [f"{library}=={metadata.version(library)}" for library in libraries]
+
+    return "|".join(parts)
+
+def step_cache_keys(source_file: Path, steps: list) -> list:
+    """Cache key of the output of every step prefix, `keys[i]` identifies the output of `steps[:i + 1]`."""
+    keys = []
+    key = hash_path(source_file)
+
+    for step in steps:
+        key = chain_key(key, step, step_fingerprint(step))
+        keys.append(key)
+
+    return keys
+
+def apply_steps(
+        df: pd.DataFrame,
+        steps: list,
+        workers: int = 1,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        token_ids: bool = False
+    ) -> pd.DataFrame:
+    """
+    Apply `steps` to the text column. With `token_ids`, token lists are
+    interned into token ID arrays before the first step that can map them
+    and decoded again before a step that cannot, so the token level steps run
+    as table lookups. The returned frame may be encoded, see `decode_frame`.
+    """
+    for step in steps:
+        transform = load_transform(step)
+        
+        if token_ids and step in TOKEN_ID_STEPS and is_tokenized(df['text']):
+            df['text'] = encode_texts(df['text'])
+        elif step not in TOKEN_ID_STEPS and is_encoded(df['text']):
+            df = decode_frame(df)
+        
+        if step in FRAME_STEPS:
+            df = transform(df)
+        elif workers > 1 and step in PARALLEL_STEPS:
+            df['text'] = transform(df['text'], workers=workers, shard_size=shard_size)
+        else:
+            df['text'] = transform(df['text'])
+
+    return df
+
+def resolve_step_name(name: str) -> str:
+    """Accept step names in any case and with '-'/'_' separators, e.g. `word-repair`."""
+    normalized = name.strip().lower().replace('-', ' ').replace('_', ' ')
+    aliases = {'tokenization': "Tokenizing", 'stopword': "Stopword removal", 'dedup': "Deduplication"}
+
+    for step in PREPROCESSING_STEPS:
+        if step.lower() == normalized:
+            return step
+
+    return aliases.get(normalized, name)
+
+def validate_steps(steps: list) -> None:
+    unknown_steps = [step for step in steps if step not in PREPROCESSING_STEPS]
+    if unknown_steps:
+        raise ValueError(f"Unknown preprocessing step(s): {', '.join(unknown_steps)}")
+
+def run_pipeline(
+        steps: list,
+        source_file: Path = DATASET_FILE_PATH,
+        save_checkpoints: bool = False,
+        workers: int = 1,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        output_format: str = 'auto',
+        stage_cache: StageCache = None,
+        report: RunReport = None,
+        token_ids: bool = True
+    ) -> pd.DataFrame:
+    """
+    Run the chosen preprocessing steps on one in-memory text column.
+
+    The source file is parsed once and only the result of the last step is
+    written, into that step's output directory, so `tf_idf.main` can pick it
+    up exactly like the output of a standalone stage.
+
+    With a stage cache, every step output is stored under a key derived from
+    the source data and the steps applied to it. A rerun starts from the
+    longest cached prefix of `steps` instead of from the source file.
+
+    Args:
+        steps: Step names from PREPROCESSING_STEPS, in execution order.
+        source_file: CSV file with a `text` column, or a token store.
+        save_checkpoints: Also write the output of every intermediate step.
+        workers: Worker processes for the row-wise steps, 1 runs serially.
+        shard_size: Rows sent to a worker process at a time.
+        output_format: 'auto' writes token lists as a token store, 'csv' always writes CSV.
+        stage_cache: Cache of step outputs, None disables caching.
+        report: Collects per-stage metrics, None disables them.
+        token_ids: Run the token level steps after tokenizing on token ID
+            arrays instead of string lists, see `apply_steps`.
+
+    Returns:
+        DataFrame holding the output of the last step.
+    """
+    validate_steps(steps)
+    report = report or RunReport("preprocessing", enabled=False)
+    report.set_info(source_file=str(source_file), steps=steps, workers=workers, output_format=output_format)
+
+    source_df = None
+    num_cached_steps = 0
+
+    if stage_cache is not None:
+        with report.stage("Stage cache lookup") as stage:
+            cache_keys = step_cache_keys(source_file, steps)
+
+            # Resume from the longest prefix of the pipeline that is already cached
+            for num_cached_steps in range(len(steps), 0, -1):
+                source_df = stage_cache.load(cache_keys[num_cached_steps - 1])
+                if source_df is not None:
+                    print(f"\nCache hit: reusing the output of {' -> '.join(steps[:num_cached_steps])}")
+                    break
+            else:
+                num_cached_steps = 0
+
+            stage.set(cached_steps=steps[:num_cached_steps])
+            if source_df is not None:
+                stage.add(rows_out=len(source_df))
+
+    if source_df is None:
+        print(f"\nReading source file: {source_file}")
+        with report.stage("Reading source") as stage:
+            source_df = read_stage_file(source_file)
+            stage.add(rows_out=len(source_df), bytes_read=path_size(source_file))
+
+    for num_step, step in enumerate(steps, 1):
+        if num_step <= num_cached_steps:
+            print(f"Step {num_step}/{len(steps)}: {step} (cached)")
+            continue
+
+        print(f"Step {num_step}/{len(steps)}: {step}")
+
+        with report.stage(step) as stage:
+            rows_in = len(source_df)
+            source_df = apply_steps(source_df, [step], workers=workers, shard_size=shard_size, token_ids=token_ids)
+            stage.add(rows_in=rows_in, rows_out=len(source_df))
+
+        if stage_cache is not None:
+            with report.stage("Stage cache store") as stage:
+                stage.add(bytes_written=path_size(stage_cache.store(decode_frame(source_df), cache_keys[num_step - 1])))
+
+        if save_checkpoints and num_step < len(steps):
+            with report.stage("Saving checkpoints") as stage:
+                checkpoint_file_name = export_step_output(source_df, step, output_format)
+                stage.add(rows_in=len(source_df), bytes_written=path_size(checkpoint_file_name))
+            print(f"Checkpoint saved as {checkpoint_file_name}")
+
+    finalize_steps(steps[num_cached_steps:])
+    source_df = decode_frame(source_df)
+
+    print("\nPreview result from preprocessing")
+    print(source_df.head(20))
+
+    if steps:
+        print("\nSaving result from pandas data frame")
+        try:
+            with report.stage("Saving output") as stage:
+                output_file_name = export_step_output(source_df, steps[-1], output_format)
+                stage.add(rows_in=len(source_df), bytes_written=path_size(output_file_name))
+            print(f"Preprocessing file successfully exported as {output_file_name}")
+        except Exception as e:
+            print("An error occurred while saving the file:", e)
+
+    if stage_cache is not None:
+        evicted = stage_cache.collect_garbage()
+        if evicted:
+            print(f"Stage cache: evicted {evicted} old artifact(s)")
+
+    return source_df
+
+def copy_cached_output(artifact: Path, output_path: Path) -> Path:
+    """Copy a cached streamed output to `output_path`, adding the suffix of the artifact."""
+    if artifact.is_dir():
+        shutil.copytree(artifact, output_path)
+        return output_path
+
+    output_file_name = output_path.with_suffix(artifact.suffix)
+    shutil.copyfile(artifact, output_file_name)
+    return output_file_name
+
+def iter_batches(source_file: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield the source CSV as DataFrames of at most `chunk_size` rows."""
+    with pd.read_csv(source_file, chunksize=chunk_size, dtype={'duplicates': str}) as reader:
+        yield from reader
+
+def run_pipeline_streaming(
+        steps: list,
+        source_file: Path = DATASET_FILE_PATH,
+        chunk_size: int = 10_000,
+        save_checkpoints: bool = False,
+        workers: int = 1,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        output_format: str = 'auto',
+        stage_cache: StageCache = None,
+        report: RunReport = None,
+        token_ids: bool = True
+    ) -> Path:
+    """
+    Run the chosen preprocessing steps chunk by chunk for corpora larger than RAM.
+
+    Every chunk goes through all steps and is appended to the output right
+    away (CSV rows, or one part file per chunk for a token store), so peak
+    memory depends on `chunk_size` and not on the size of the source file.
+
+    Intermediate steps are never held as a whole, so the stage cache only
+    keeps the final output: an unchanged rerun copies it into the output
+    directory instead of streaming the source again.
+
+    Args:
+        steps: Step names from PREPROCESSING_STEPS, in execution order.
+        source_file: CSV file with a `text` column.
+        chunk_size: Number of rows read and processed at a time.
+        save_checkpoints: Also append the output of every intermediate step.
+        workers: Worker processes for the row-wise steps, 1 runs serially.
+        shard_size: Rows sent to a worker process at a time.
+        output_format: 'auto' writes token lists as a token store, 'csv' always writes CSV.
+        stage_cache: Cache of the final output, None disables caching.
+        report: Collects per-stage metrics (summed over chunks), None disables them.
+        token_ids: Run the token level steps after tokenizing on token ID
+            arrays, the ID tables stay warm from one chunk to the next.
+
+    Returns:
+        Path of the file or token store directory holding the output of the last step.
+    """
+    validate_steps(steps)
+    if not steps:
+        print("No preprocessing step chosen")
+        return None
+
+    report = report or RunReport("preprocessing", enabled=False)
+    report.set_info(source_file=str(source_file), steps=steps, workers=workers, output_format=output_format, chunk_size=chunk_size)
+
+    if stage_cache is not None:
+        # The streamed output layout depends on the output format, so it is part of the key
+        with report.stage("Stage cache lookup") as stage:
+            cache_key = chain_key(step_cache_keys(source_file, steps)[-1], "streaming", output_format)
+            artifact = stage_cache.lookup(cache_key)
+
+            if artifact is not None:
+                _, output_dir, prefix = PREPROCESSING_STEPS[steps[-1]]
+                output_file_name = copy_cached_output(artifact, output_dir / f"{prefix}_{TIMESTAMP}")
+                stage.set(cached_steps=steps)
+                stage.add(bytes_written=path_size(output_file_name))
+
+        if artifact is not None:
+            print(f"\nCache hit: reusing the output of {' -> '.join(steps)}")
+            print(f"Preprocessing output successfully exported as {output_file_name}")
+            return output_file_name
+
+    output_files = {}
+    print(f"\nStreaming source file: {source_file} ({chunk_size:,} rows per chunk)")
+
+    total_rows = 0
+    for num_chunk, chunk_df in enumerate(report.iterate("Reading source", iter_batches(source_file, chunk_size))):
+        for num_step, step in enumerate(steps, 1):
+            with report.stage(step) as stage:
+                rows_in = len(chunk_df)
+                chunk_df = apply_steps(chunk_df, [step], workers=workers, shard_size=shard_size, token_ids=token_ids)
+                stage.add(rows_in=rows_in, rows_out=len(chunk_df))
+
+            if num_step == len(steps) or save_checkpoints:
+                _, output_dir, prefix = PREPROCESSING_STEPS[step]
+                with report.stage("Saving output") as stage:
+                    output_files[step] = export_stage_chunk(decode_frame(chunk_df), output_dir, prefix, TIMESTAMP, num_chunk, output_format)
+                    stage.add(rows_in=len(chunk_df))
+
+        total_rows += len(chunk_df)
+        print(f"Chunk {num_chunk + 1} done, {total_rows:,} rows processed")
+
+    finalize_steps(steps)
+
+    output_file_name = output_files.get(steps[-1])
+    print(f"Preprocessing output successfully exported as {output_file_name}")
+
+    # Chunks are appended to the same files, so their sizes are only known at the end
+    with report.stage("Saving output") as stage:
+        stage.set(bytes_written=sum(path_size(path) for path in output_files.values()))
+    with report.stage("Reading source") as stage:
+        stage.add(bytes_read=path_size(source_file))
+
+    if stage_cache is not None and output_file_name is not None:
+        with report.stage("Stage cache store") as stage:
+            stage.add(bytes_written=path_size(stage_cache.store_path(output_file_name, cache_key)))
+        stage_cache.collect_garbage()
+
+    return output_file_name
@@ -1,33 +1,46 @@
+import os
+import time
 from itertools import islice
 from pathlib import Path
 from pprint import pprint
 
+import numpy as np
 import questionary
+from scipy import sparse
 
-from constants import VECTORIZATION_OUTPUT_DIR, DICTIONARY_PATH, TIMESTAMP
-from helpers.io import read_json_file, export_data_to_json
+from constants import VECTORIZATION_DIR, DICTIONARY_PATH, LEXICON_STORE_FILE_PATH, MODEL_CACHE_DIR
+from helpers.io import read_json_file, read_jsonl_file, append_data_to_jsonl, list_vectorizations, read_vocabulary_file, read_sparse_matrix
+from helpers.stage_cache import chain_key, hash_path
 
 
+PRETRAINED_MODEL = "mdhugol/indonesia-bert-sentiment-classification"
+
+# 'fp32' runs the model as published, 'int8' a copy with dynamically quantized linear layers (CPU only)
+INFERENCE_BACKENDS = ('fp32', 'int8')
+
 
 def get_unique_tokens() -> set:
-    vectorization_files = [str(f) for f in Path(VECTORIZATION_OUTPUT_DIR).iterdir() if f.is_file()]
+    """Unique tokens of a vectorization picked by the user, an empty set when there is none to pick."""
+    vectorization_files = [str(f) for f in list_vectorizations(VECTORIZATION_DIR)]
 
     if not vectorization_files:
-        print("No file found in :", VECTORIZATION_OUTPUT_DIR)
-        return
+        print("No file found in :", VECTORIZATION_DIR)
+        return set()
 
     selected_file = questionary.select(
         "Select the file output from vectorization directory",
         choices=vectorization_files
     ).ask()
+    
+    if selected_file is None:
+        return set()
 
     print(f"Selected file: {selected_file}")
     
-    documents: list[dict] = read_json_file(Path(selected_file))
+    # The vocabulary sidecar already holds every unique token, so the matrix itself is not loaded
+    vocabulary: dict = read_vocabulary_file(Path(selected_file))
     
-    unique_tokens = set()
-    for sentence in documents:
-        unique_tokens.update(sentence.keys())
+    unique_tokens = set(vocabulary.get('terms', []) if vocabulary else [])
         
     print("\nPreview all unique token")
     preview_10_tokens = list(islice(unique_tokens, 50))
@@ -37,100 +50,334 @@ def get_unique_tokens() -> set:
     
     return unique_tokens
 
-def auto_labelling_with_indobert(tokens: list) -> list[dict]:
-    print("\nAuto labelling with IndoBERT is running")
+def quantized_model_file(pretrained: str, cache_dir: Path = MODEL_CACHE_DIR) -> Path:
+    """
+    Cache file of the int8 copy of a model. The name holds a key of the model
+    id (or the content of a local model directory) and the torch and
+    transformers versions, so an upgrade never loads a stale pickle.
+    """
+    import torch
+    import transformers
+    
+    source = hash_path(pretrained) if Path(pretrained).is_dir() else pretrained
+    key = chain_key(source, "int8", f"torch=={torch.__version__}|transformers=={transformers.__version__}")
     
+    return cache_dir / f"{Path(pretrained).name}-int8-{key[:16]}.pt"
+
+def load_quantized_model(pretrained: str = PRETRAINED_MODEL, cache_dir: Path = MODEL_CACHE_DIR):
+    """
+    The sentiment model with its linear layers quantized to int8 (dynamic
+    quantization: int8 weights, activations quantized per batch), which is
+    where BERT spends most of its CPU time. The first call converts the fp32
+    model and caches the quantized weights; later calls build the model from
+    its config alone and load them, the fp32 weights are not read again.
+    """
     import torch
-    from transformers import pipeline
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+    
+    def quantize(model):
+        model.eval()
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
     
-    DEVICE = 0 if torch.cuda.is_available() else -1
+    model_file = quantized_model_file(pretrained, cache_dir)
+    if model_file.exists():
+        print(f"Loading int8 model from {model_file}")
+        model = quantize(AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(pretrained)))
+        model.load_state_dict(torch.load(model_file, weights_only=True))
+        return model
     
-    pretrained= "mdhugol/indonesia-bert-sentiment-classification"
+    print(f"Quantizing {pretrained} to int8, the result is cached as {model_file}")
+    model = quantize(AutoModelForSequenceClassification.from_pretrained(pretrained))
+    
+    # Write to a temporary file first so a crash never leaves a half-written model
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp_file = model_file.with_name(f"{model_file.name}.{os.getpid()}.tmp")
+    torch.save(model.state_dict(), temp_file)
+    os.replace(temp_file, model_file)
+    
+    return model
 
-    model = AutoModelForSequenceClassification.from_pretrained(pretrained)
-    tokenizer = AutoTokenizer.from_pretrained(pretrained)
+def load_sentiment_model(pretrained: str = PRETRAINED_MODEL, backend: str = 'fp32'):
+    """Load the classifier for one of the INFERENCE_BACKENDS, returns (model, device)."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+    
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    
+    if backend == 'int8':
+        # Quantized kernels only exist for the CPU
+        model, device = load_quantized_model(pretrained), torch.device("cpu")
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = AutoModelForSequenceClassification.from_pretrained(pretrained).to(device)
+    
+    model.eval()
+    return model, device
 
-    sentiment_analysis = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=DEVICE)
+def label_tokens(model, tokenizer, tokens: list, device, batch_size: int = 64) -> dict:
+    """
+    Label `tokens` with a loaded classifier, see `load_sentiment_model`.
+    The mapping follows the order of `tokens`, whatever order the batches ran in.
+    """
+    import torch
+    
     label_index = {'LABEL_0': 'positive', 'LABEL_1': 'neutral', 'LABEL_2': 'negative'}
+    id_to_label = [label_index[model.config.id2label[i]] for i in range(len(label_index))]
+    
+    # Sorting by length keeps similar lengths in one batch, so dynamic padding adds little
+    original_tokens = tokens
+    tokens = sorted(tokens, key=len)
+    total_batches = (len(tokens) + batch_size - 1) // batch_size
     
     result = {}
-    for token in tokens:
-        sentiment = sentiment_analysis(token)
-        label = label_index[sentiment[0]['label']]
-        result[token] = label
+    start_time = time.perf_counter()
+    with torch.inference_mode():
+        for num_batch, start in enumerate(range(0, len(tokens), batch_size), 1):
+            batch = tokens[start:start + batch_size]
+            
+            # padding=True pads to the longest sequence of this batch only
+            encoded = tokenizer(batch, padding=True, truncation=True, return_tensors="pt").to(device)
+            predictions = model(**encoded).logits.argmax(dim=-1).tolist()
+            
+            for token, prediction in zip(batch, predictions):
+                result[token] = id_to_label[prediction]
+            
+            if num_batch % 20 == 0 or num_batch == total_batches:
+                elapsed = time.perf_counter() - start_time
+                print(f"Batch {num_batch}/{total_batches} - {len(result):,} tokens - {len(result) / elapsed:,.1f} tokens/s")
+    
+    return {token: result[token] for token in original_tokens}
+
+def auto_labelling_with_indobert(
+        tokens: list,
+        batch_size: int = 64,
+        num_threads: int = None,
+        pretrained: str = PRETRAINED_MODEL,
+        backend: str = 'fp32'
+    ) -> dict:
+    """
+    Label every token with the IndoBERT sentiment classifier in batches.
+    
+    Args:
+        tokens: Tokens to label.
+        batch_size: Number of tokens per forward pass.
+        num_threads: Intra-op threads used by torch on CPU, None keeps the torch default.
+        pretrained: Hugging Face model id or local directory, a tiny local model can be used for tests.
+        backend: One of INFERENCE_BACKENDS, 'int8' is faster on CPU-only hosts,
+            see `benchmark.py --suite labelling` for its agreement with 'fp32'.
+        
+    Returns:
+        Mapping of token to 'positive', 'neutral' or 'negative'.
+    """
+    print(f"\nAuto labelling with IndoBERT ({backend}) is running")
+    
+    import torch
+    from transformers import AutoTokenizer
+    
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    
+    model, device = load_sentiment_model(pretrained, backend)
+    tokenizer = AutoTokenizer.from_pretrained(pretrained)
+    
+    result = label_tokens(model, tokenizer, tokens, device, batch_size)
     
     print("\nPreview labelling with indobert")
     for token, label in list(result.items())[:20]:
         print(f"- {token} : {label}")
     
-    output_file = DICTIONARY_PATH / f"labelled-tokens-{TIMESTAMP}.json"
-    export_data_to_json(data=result, output_file=output_file)
-    
     return result
 
-def predict_sentiment(input_data: list[dict], lexicon: list[dict]) -> None:
+def load_lexicon_store(store_file: Path = LEXICON_STORE_FILE_PATH) -> dict:
+    """
+    Load the persistent lexicon, merging in every `labelled-tokens-*.json`
+    file from earlier runs. Tokens found only in those files are appended to
+    the store once, so later loads read the store alone for them.
+    """
+    lexicon = {entry['token']: entry['label'] for entry in read_jsonl_file(store_file)}
+    
+    merged = {}
+    for labelled_file in sorted(Path(DICTIONARY_PATH).glob("labelled-tokens-*.json")):
+        for token, label in read_json_file(labelled_file).items():
+            if token not in lexicon and token not in merged:
+                merged[token] = label
+    
+    if merged:
+        append_data_to_jsonl([{'token': token, 'label': label} for token, label in merged.items()], store_file)
+        lexicon.update(merged)
+        print(f"Merged {len(merged):,} tokens from earlier labelled-tokens files into {store_file}")
+    
+    print(f"Lexicon store holds {len(lexicon):,} labelled tokens")
+    
+    return lexicon
+
+def label_missing_tokens(tokens: set, store_file: Path = LEXICON_STORE_FILE_PATH, **labelling_options) -> dict:
+    """
+    Label only the tokens that are not in the lexicon store yet and append
+    them to it, so a rerun costs as much as its new vocabulary.
+    
+    Args:
+        tokens: Tokens that need a label.
+        store_file: JSON lines lexicon store.
+        labelling_options: Passed on to `auto_labelling_with_indobert`.
+        
+    Returns:
+        The complete lexicon, old and new labels.
+    """
+    lexicon = load_lexicon_store(store_file)
+    missing_tokens = [token for token in tokens if token not in lexicon]
+    
+    print(f"{len(tokens) - len(missing_tokens):,} tokens reused from the store, {len(missing_tokens):,} new tokens to label")
+    
+    if missing_tokens:
+        new_labels = auto_labelling_with_indobert(missing_tokens, **labelling_options)
+        append_data_to_jsonl([{'token': token, 'label': label} for token, label in new_labels.items()], store_file)
+        lexicon.update(new_labels)
+    
+    return lexicon
+
+# Every labelled token that is not positive counts against the comment, like the original count
+LABEL_POLARITY = {'positive': 1.0, 'neutral': -1.0, 'negative': -1.0}
+SCORING_CHUNK_ROWS = 100_000
+
+
+def build_polarity_vector(lexicon: dict, terms: list) -> np.ndarray:
+    """Polarity of every vocabulary term (+1 positive, -1 neutral or negative, 0 unlabelled)."""
+    return np.fromiter(
+        (LABEL_POLARITY.get(lexicon.get(term), 0.0) for term in terms),
+        dtype=np.float64,
+        count=len(terms)
+    )
+
+def predict_sentiment(
+        tfidf_matrix: sparse.spmatrix,
+        terms: list,
+        lexicon: dict,
+        weighted: bool = False,
+        sample_weight: np.ndarray = None,
+        neutral: bool = False
+    ) -> tuple:
+    """
+    Score every document with one sparse matrix-vector product against the
+    lexicon polarity of the vocabulary. A document is positive when it has
+    more positive tokens than neutral and negative ones, and negative
+    otherwise, like the original per comment count; tokens missing from the
+    lexicon are skipped instead of raising a KeyError.
+    
+    Args:
+        tfidf_matrix: Sparse document-term matrix.
+        terms: Vocabulary, aligned with the matrix columns.
+        lexicon: Mapping of token to 'positive', 'neutral' or 'negative'.
+        weighted: Weight every term by its TF-IDF score instead of counting
+            each distinct term of a document once.
+        sample_weight: Optional number of comments every row stands for.
+        neutral: Label documents scoring exactly zero 'neutral' instead of
+            'negative', and report them in the summary.
+        
+    Returns:
+        labels: Array with 'positive' or 'negative' per document ('neutral'
+            too when `neutral` is set), in row order.
+        summary: 'documents', 'positive', 'negative' (and 'neutral') totals,
+            their '<label>_percentage' and the corpus 'conclusion'.
+    """
     print("\nPredicting sentiment is running")
     
-    total_positive = 0
-    total_negative = 0
-    for comment in input_data:
-        temp_positive = 0
-        temp_negative = 0
-        for token in comment.keys():
-            if lexicon[token] == "positive":
-                temp_positive += 1
-            else:
-                temp_negative += 1
-        if temp_positive > temp_negative:
-            total_positive += 1
-        else:
-            total_negative += 1
-    
-    if total_positive > total_negative:
-        conclusion = "positive"
-    elif total_negative > total_positive:
-        conclusion = "negative"
+    polarity = build_polarity_vector(lexicon, terms)
+    
+    # Scored in row chunks, a memory-mapped matrix is then paged in chunk by chunk and never copied whole
+    documents = sparse.csr_matrix(tfidf_matrix)
+    scores = np.empty(documents.shape[0], dtype=np.float64)
+    for start in range(0, documents.shape[0], SCORING_CHUNK_ROWS):
+        chunk = documents[start:start + SCORING_CHUNK_ROWS]
+        if not weighted:
+            chunk.data = np.ones_like(chunk.data)
+        scores[start:start + SCORING_CHUNK_ROWS] = chunk @ polarity
+    
+    if neutral:
+        labels = np.where(scores > 0, 'positive', np.where(scores < 0, 'negative', 'neutral'))
+        classes = ('positive', 'neutral', 'negative')
+    else:
+        labels = np.where(scores > 0, 'positive', 'negative')
+        classes = ('positive', 'negative')
+    
+    if sample_weight is None:
+        sample_weight = np.ones(len(labels))
+    total_documents = float(np.sum(sample_weight))
+    
+    summary = {'documents': total_documents}
+    for label in classes:
+        total = float(np.sum(sample_weight[labels == label]))
+        summary[label] = total
+        summary[f"{label}_percentage"] = (total / total_documents) * 100 if total_documents else 0.0
+    
+    if summary['positive'] > summary['negative']:
+        summary['conclusion'] = "positive"
+    elif summary['negative'] > summary['positive']:
+        summary['conclusion'] = "negative"
     else:
-        conclusion = "neutral"
+        summary['conclusion'] = "neutral"
     
-    positive_percentage = (total_positive / len(input_data)) * 100
-    negative_percentage = (total_negative / len(input_data)) * 100
+    print(f"\nThe result of sentiment analysis prediction is : {summary['conclusion']} with percentage:")
+    print(f"Positive: {summary['positive']:,.0f} - {summary['positive_percentage']:.3f}%")
+    if neutral:
+        print(f"Neutral: {summary['neutral']:,.0f} - {summary['neutral_percentage']:.3f}%")
+    print(f"Negative: {summary['negative']:,.0f} - {summary['negative_percentage']:.3f}%")
     
-    print(f"\nThe result of sentiment analysis prediction is : {conclusion} with percentage:")
-    print(f"Positive: {total_positive} - {positive_percentage:.3f}%")
-    print(f"Negative: {total_negative} - {negative_percentage:.3f}%")
+    return labels, summary
+
+def run_sentiment(
+        tfidf_matrix: sparse.spmatrix,
+        terms: list,
+        label_new_tokens: bool = False,
+        weighted: bool = False,
+        sample_weight: np.ndarray = None,
+        neutral: bool = False,
+        **labelling_options
+    ) -> tuple:
+    """
+    Non-interactive sentiment analysis over a TF-IDF matrix, returns the labels and the summary
+    of `predict_sentiment`: one 'positive'/'negative' label per row ('neutral' as well with
+    `neutral`) and the corpus totals. `sample_weight` counts deduplicated rows once per comment
+    in the summary.
+    """
+    if label_new_tokens:
+        lexicon = label_missing_tokens(set(terms), **labelling_options)
+    else:
+        lexicon = load_lexicon_store()
+    
+    return predict_sentiment(tfidf_matrix, terms, lexicon, weighted=weighted, sample_weight=sample_weight, neutral=neutral)
 
 def main() -> None:
-    is_generate_new_tokens = questionary.confirm("Do you want to generate new labelled tokens ?").ask()
+    is_generate_new_tokens = questionary.confirm("Do you want to label tokens missing from the lexicon store ?").ask()
     
-    unique_tokens = get_unique_tokens()
     if is_generate_new_tokens:
-        lexicon = auto_labelling_with_indobert(unique_tokens)
+        unique_tokens = get_unique_tokens()
+        if not unique_tokens:
+            print("No token selected, sentiment analysis is cancelled")
+            return
+        lexicon = label_missing_tokens(unique_tokens)
     else:
-        lexicon_file = [str(f) for f in Path(DICTIONARY_PATH).iterdir() if f.is_file() and f.name.startswith("labelled-tokens-")]
-        
-        selected_file = questionary.select(
-            "Select the lexicon file",
-            choices=lexicon_file
-        ).ask()
-
-        print(f"Selected file: {selected_file}")
-        
-        lexicon: list[dict] = read_json_file(Path(selected_file))
+        lexicon = load_lexicon_store()
     
-    input_files = [str(f) for f in Path(VECTORIZATION_OUTPUT_DIR).iterdir() if f.is_file()]
+    input_files = [str(f) for f in list_vectorizations(VECTORIZATION_DIR)]
+    if not input_files:
+        print("No file found in :", VECTORIZATION_DIR)
+        return
         
     selected_file = questionary.select(
         "Select the vectorization file",
         choices=input_files
     ).ask()
+    
+    if selected_file is None:
+        return
 
     print(f"Selected file: {selected_file}")
     
-    input_data: list[dict] = read_json_file(Path(selected_file))
+    tfidf_matrix, terms = read_sparse_matrix(Path(selected_file))
     
-    predict_sentiment(input_data=input_data, lexicon=lexicon)
+    predict_sentiment(tfidf_matrix, terms, lexicon)
 
 
 if __name__ == '__main__':
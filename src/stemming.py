@@ -1,12 +1,198 @@
+import json
+import os
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from pathlib import Path
-from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
+from Sastrawi.Stemmer.Filter import TextNormalizer
 import questionary
 
-from constants import TIMESTAMP, DATASET_FILE_PATH, STEMMING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR
+from constants import TIMESTAMP, DATASET_FILE_PATH, STEMMING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, STEM_CACHE_FILE_PATH
+from helpers.io import export_stage_file, read_stage_file, is_tokenized
+from helpers.parallel import DEFAULT_SHARD_SIZE, parallel_map
+from helpers.vocabulary import TokenMap, flatten_texts, get_vocabulary, is_encoded
 
-factory = StemmerFactory()
-stemmer = factory.create_stemmer()
+# Calls of `stem_texts` (streamed chunks) between two writes of the stem cache file
+STEM_CACHE_SAVE_EVERY = 10
+
+stemmer = None
+
+def get_stemmer():
+    """Sastrawi stemmer, built on first use so importing this module does not load its root word dictionary."""
+    global stemmer
+    
+    if stemmer is None:
+        from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
+        stemmer = StemmerFactory().create_stemmer()
+    
+    return stemmer
+
+
+class StemCache:
+    """
+    Token-level cache in front of the Sastrawi rule engine.
+    
+    Keeps at most `max_size` words in memory, evicting the least recently
+    used one first, and can persist its content to a JSON file so later
+    runs start warm. The file is rewritten whole, so `checkpoint` only saves
+    every `save_every` calls and `save` is left to the end of the run.
+    """
+    
+    def __init__(self, word_stemmer, max_size: int = 200_000, cache_file: Path = None, save_every: int = STEM_CACHE_SAVE_EVERY):
+        self.word_stemmer = word_stemmer
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.save_every = save_every
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.is_dirty = False
+        self.num_checkpoints = 0
+        
+        if cache_file is not None and cache_file.exists():
+            self.load()
+    
+    def stem_word(self, word: str) -> str:
+        if word in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(word)
+            return self.entries[word]
+        
+        self.misses += 1
+        stem = self.word_stemmer.stem_word(word)
+        self.entries[word] = stem
+        self.is_dirty = True
+        
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        
+        return stem
+    
+    def stem(self, text: str) -> str:
+        """Same contract as Sastrawi's `stemmer.stem`, but every word goes through the cache."""
+        words = TextNormalizer.normalize_text(text).split(' ')
+        return ' '.join(self.stem_word(word) for word in words)
+    
+    def add(self, stems: dict) -> None:
+        """Store words that were stemmed outside of this cache (e.g. by worker processes)."""
+        for word, stem in stems.items():
+            self.misses += 1
+            self.entries[word] = stem
+            self.entries.move_to_end(word)
+            
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        
+        self.is_dirty = self.is_dirty or bool(stems)
+    
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def load(self) -> None:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Stem cache file could not be read, starting empty: {e}")
+            return
+        
+        # Keep only the most recent entries when the file is larger than the in-memory bound
+        for word, stem in list(entries.items())[-self.max_size:]:
+            self.entries[word] = stem
+    
+    def save(self) -> None:
+        if self.cache_file is None or not self.is_dirty:
+            return
+        
+        # Write to a temporary file first so a crash never leaves a half-written cache
+        temp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file, ensure_ascii=False)
+        os.replace(temp_file, self.cache_file)
+        
+        self.is_dirty = False
+        self.num_checkpoints = 0
+    
+    def checkpoint(self) -> None:
+        """Save every `save_every` calls, so a crash loses at most that many chunks of new stems."""
+        self.num_checkpoints += 1
+        if self.num_checkpoints >= self.save_every:
+            self.save()
+
+
+stem_cache = None
+
+def get_stem_cache() -> StemCache:
+    global stem_cache
+    
+    if stem_cache is None:
+        # Use the undecorated rule engine, the StemCache replaces Sastrawi's unbounded ArrayCache
+        stem_cache = StemCache(get_stemmer().delegatedStemmer, cache_file=STEM_CACHE_FILE_PATH)
+    
+    return stem_cache
+
+def save_stem_cache() -> None:
+    """Write the new stems of this run to the stem cache file, once at the end of the run."""
+    if stem_cache is not None:
+        stem_cache.save()
+
+stem_map = None
+
+def get_stem_map() -> TokenMap:
+    """Token ID table of stems for encoded columns, every distinct token goes through the stem cache once."""
+    global stem_map
+    
+    if stem_map is None:
+        # Sastrawi normalisation may split or empty a token, so a token maps to any number of stems
+        stem_map = TokenMap(lambda terms: [get_stem_cache().stem(term).split() for term in terms])
+    
+    return stem_map
+
+worker_stemmer = None
+
+def init_stemmer_worker() -> None:
+    global worker_stemmer
+    worker_stemmer = get_stemmer().delegatedStemmer
+
+def stem_word(word: str) -> str:
+    return worker_stemmer.stem_word(word)
+
+def stem_texts(texts: pd.Series, workers: int = 1, shard_size: int = DEFAULT_SHARD_SIZE) -> pd.Series:
+    cache = get_stem_cache()
+    encoded = is_encoded(texts)
+    
+    if workers > 1:
+        if encoded:
+            # Only the distinct tokens of an encoded column are ever stemmed
+            terms = get_vocabulary().terms
+            texts_to_scan = [terms[token_id] for token_id in np.unique(flatten_texts(texts)[0]).tolist()]
+        else:
+            texts_to_scan = texts
+        
+        # Shard the distinct uncached words instead of the rows, so no word is stemmed
+        # twice across workers; the rows are then resolved from the warm cache below
+        unique_words = set()
+        for text in texts_to_scan:
+            text = ' '.join(text) if isinstance(text, list) else text
+            unique_words.update(TextNormalizer.normalize_text(text).split(' '))
+        missing_words = [word for word in unique_words if word not in cache.entries]
+        
+        stems = parallel_map(stem_word, missing_words, workers=workers, shard_size=shard_size, initializer=init_stemmer_worker)
+        cache.add(dict(zip(missing_words, stems)))
+    
+    if encoded:
+        result = get_stem_map().apply_texts(texts)
+    elif is_tokenized(texts):
+        # Sastrawi normalisation may split or empty a token, so the list is re-split after stemming
+        result = texts.apply(lambda tokens: cache.stem(' '.join(tokens)).split())
+    else:
+        result = texts.apply(cache.stem)
+    cache.checkpoint()
+    
+    print(f"Stem cache: {cache.hits:,} hits, {cache.misses:,} misses ({cache.hit_rate():.1%} hit rate)")
+    
+    return result
 
 def main(prev_process: str = None):
     print("\nStemming is starting")
@@ -34,7 +220,7 @@ def main(prev_process: str = None):
         selected_file: str = questionary.select(f"Select {prev_process} file", choices=sources_files).ask()
         
         print(f"Selected file: {selected_file}")
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -44,18 +230,18 @@ def main(prev_process: str = None):
     print(source_df.head(20))
 
     print("\nData cleaning is start to process")
-    source_df['text'] = source_df['text'].apply(lambda words: stemmer.stem(words))
+    source_df['text'] = stem_texts(source_df['text'])
+    save_stem_cache()
 
     print("\nPreview result from stemming:")
     print(source_df.head(20))
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = STEMMING_OUTPUT_DIR / f"stemming_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Stemming CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, STEMMING_OUTPUT_DIR, "stemming", TIMESTAMP)
+        print(f"Stemming file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Stemming process is done!")
 
@@ -1,9 +1,61 @@
 import pandas as pd
+from functools import lru_cache
 from pathlib import Path
-from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory, ArrayDictionary, StopWordRemover
+from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
 import questionary
 
-from constants import TIMESTAMP, DATASET_FILE_PATH, WORD_REPAIR_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, STEMMING_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR
+from constants import TIMESTAMP, DATASET_FILE_PATH, WORD_REPAIR_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, STEMMING_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, CUSTOM_STOPWORDS_FILE_PATH
+from helpers.io import export_stage_file, read_stage_file
+from helpers.vocabulary import TokenMap, is_encoded
+
+def read_more_stop_words(file_path: Path = CUSTOM_STOPWORDS_FILE_PATH) -> list:
+    """Read user-defined stop words, one per line, if the file exists."""
+    if not file_path.exists():
+        return []
+    
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+@lru_cache(maxsize=8)
+def load_stop_words(more_stop_words: tuple = ()) -> frozenset:
+    stop_words = StopWordRemoverFactory().get_stop_words()
+    stop_words.extend(more_stop_words)
+    
+    return frozenset(stop_words)
+
+@lru_cache(maxsize=8)
+def load_stopword_map(stop_words: frozenset) -> TokenMap:
+    """Token ID table that drops stop words, for encoded columns."""
+    return TokenMap(lambda terms: [[] if term in stop_words else [term] for term in terms])
+
+def filter_stopwords(value, stop_words: frozenset):
+    """
+    Remove stop words from a token list or from a space separated string.
+    
+    Strings are split on single spaces and joined back the same way, like
+    Sastrawi's StopWordRemover, but every stop word is removed (Sastrawi skips
+    a stop word that directly follows another one).
+    """
+    if isinstance(value, list):
+        return [token for token in value if token not in stop_words]
+    
+    return ' '.join([word for word in value.split(' ') if word not in stop_words])
+
+def remove_stopwords(texts: pd.Series, more_stop_words: list = None) -> pd.Series:
+    if more_stop_words is None:
+        more_stop_words = read_more_stop_words()
+    
+    stop_words = load_stop_words(tuple(more_stop_words))
+    
+    if is_encoded(texts):
+        return load_stopword_map(stop_words).apply_texts(texts)
+    
+    # One hash-set lookup per word over the whole column, without a per-row Python callback
+    return pd.Series(
+        [filter_stopwords(value, stop_words) for value in texts],
+        index=texts.index,
+        name=texts.name
+    )
 
 def main(prev_process: str = None) -> None:
     print("\nStopword removal is starting")
@@ -31,7 +83,7 @@ def main(prev_process: str = None) -> None:
         selected_file: str = questionary.select(f"Select {prev_process} file", choices=source_files).ask()
         
         print(f"Selected file: {selected_file}")
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -42,31 +94,21 @@ def main(prev_process: str = None) -> None:
     
     print(f"\nStopword removal is starting to process")
     
-    more_stop_words = []
-    
-    stop_words = StopWordRemoverFactory().get_stop_words()
-    stop_words.extend(more_stop_words)
-    
-    new_array = ArrayDictionary(stop_words)
-    stop_words_remover_new = StopWordRemover(new_array)
-    
-    def stopword(text: str) -> str:
-        return stop_words_remover_new.remove(text)
+    more_stop_words = read_more_stop_words()
     
-    source_df['text'] = source_df["text"].apply(lambda x: stopword(x))
+    source_df['text'] = remove_stopwords(source_df["text"], more_stop_words)
     
     
     print(f"\nPreview result from stopword removal")
     print(source_df.head(20))
 
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = STOPWORD_OUTPUT_DIR / f"stopword_removal_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Stopword removal CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, STOPWORD_OUTPUT_DIR, "stopword_removal", TIMESTAMP)
+        print(f"Stopword removal file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Stopword removal process is done!")
 
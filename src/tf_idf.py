@@ -1,57 +1,153 @@
-import ast
 import pandas as pd
 import numpy as np
 from pathlib import Path
 import questionary
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
 
-from constants import TIMESTAMP, STEMMING_OUTPUT_DIR, VECTORIZATION_DIR, IMG_DIR, DATA_CLEANING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR
-from word_cloud import visualize_word_cloud
+from constants import RUN_REPORT_DIR, TIMESTAMP, DEDUPLICATION_OUTPUT_DIR, STEMMING_OUTPUT_DIR, VECTORIZATION_DIR, VECTORIZER_DIR, IMG_DIR, DATA_CLEANING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR
+from helpers.io import duplicate_positions, export_sparse_matrix, row_weights, sparse_rows_to_dicts, read_stage_file, split_document
+from helpers.metrics import RunReport, path_size
+from helpers.vocabulary import encode_texts, flatten_texts, get_vocabulary, is_encoded
+from fitted_vectorizer import save_vectorizer
+from incremental_tf_idf import update_tfidf
 
-def compute_tfidf(df: pd.DataFrame, token_column: str) -> pd.DataFrame:
+def weighted_idf(tfidf_matrix: sparse.csr_matrix, sample_weight: np.ndarray) -> np.ndarray:
+    """Smooth IDF with every row counted `sample_weight` times, equal to fitting on the rows repeated."""
+    row_lengths = np.diff(tfidf_matrix.indptr)
+    document_frequency = np.bincount(tfidf_matrix.indices, weights=np.repeat(sample_weight, row_lengths), minlength=tfidf_matrix.shape[1])
+    
+    return np.log((1 + sample_weight.sum()) / (1 + document_frequency)) + 1
+
+def tfidf_from_token_ids(texts: pd.Series, sample_weight: np.ndarray = None) -> tuple:
+    """
+    Build the TF-IDF matrix straight from the flat token ID arrays of an
+    encoded column, without analysing or hashing a single string. Scores equal
+    scikit-learn's TfidfVectorizer with smooth IDF, sublinear tf and l2 norm.
+
+    Returns:
+        tfidf_matrix: Sparse CSR matrix, columns in sorted term order.
+        terms: Vocabulary, aligned with the matrix columns.
+        idf: IDF weight of every term.
+    """
+    ids, offsets = flatten_texts(texts)
+    vocabulary_terms = get_vocabulary().terms
+
+    # Only the IDs that occur become columns, sorted by term like scikit-learn's vocabulary
+    used_ids = np.unique(ids)
+    if not len(used_ids):
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+    used_ids = used_ids[np.argsort(np.array([vocabulary_terms[token_id] for token_id in used_ids.tolist()], dtype=object), kind='stable')]
+    columns = np.empty(ids.max() + 1, dtype=np.int32)
+    columns[used_ids] = np.arange(len(used_ids), dtype=np.int32)
+
+    # Repeated entries of a row are summed into term counts
+    tfidf_matrix = sparse.csr_matrix((np.ones(len(ids)), columns[ids], offsets), shape=(len(texts), len(used_ids)))
+    tfidf_matrix.sum_duplicates()
+    np.log(tfidf_matrix.data, out=tfidf_matrix.data)
+    tfidf_matrix.data += 1
+
+    idf = weighted_idf(tfidf_matrix, np.ones(len(texts)) if sample_weight is None else sample_weight)
+    tfidf_matrix.data *= idf[tfidf_matrix.indices]
+    tfidf_matrix = normalize(tfidf_matrix, norm='l2', copy=False)
+
+    return tfidf_matrix, np.array([vocabulary_terms[token_id] for token_id in used_ids.tolist()], dtype=object), idf
+
+def compute_tfidf(
+        df: pd.DataFrame,
+        token_column: str,
+        preprocessing_steps: list = None,
+        export: bool = True,
+        report: RunReport = None
+    ) -> tuple:
     """
-    Compute TF-IDF using scikit-learn from a DataFrame column containing tokenized documents.
+    Compute TF-IDF from a DataFrame column containing tokenized documents.
+    
+    The matrix is kept sparse end-to-end and saved as a memory-mappable
+    vectorization store (see `helpers.io.export_sparse_matrix`), so it is
+    never densified. The fitted vectorizer is saved as well, see `fitted_vectorizer.FittedVectorizer`.
+    
+    Documents are interned into token IDs (see `helpers.vocabulary`), unless
+    they already are, and the matrix is built from the ID arrays by
+    `tfidf_from_token_ids`; scikit-learn does not fit anything. Its
+    TfidfVectorizer is only returned as a container of the result.
+    
+    A deduplicated frame (see `deduplication.deduplicate`) is fitted on its
+    unique rows with the document frequencies weighted by their `count`, so
+    the IDF equals a fit on every source comment. The returned matrix keeps
+    one row per unique text, the saved one is expanded to one row per comment.
     
     Args:
         df: Pandas DataFrame containing tokenized documents.
-        token_column: Name of the column containing lists of tokens per document.
+        token_column: Name of the column containing lists of tokens (or
+            whitespace separated strings) per document.
+        preprocessing_steps: Steps the documents went through, stored with
+            the fitted vectorizer so raw comments can be preprocessed the same way.
+        export: Save the matrix and the fitted vectorizer, off for benchmarks.
+        report: Collects per-stage metrics, None disables them.
         
     Returns:
-        tfidf_results: List of dictionaries with TF-IDF scores per document.
-        vectorizer: Trained TfidfVectorizer instance.
+        tfidf_matrix: Sparse CSR matrix with TF-IDF scores per document.
+        vectorizer: TfidfVectorizer whose `vocabulary_` and `idf_` are set from
+            the computed weights, not from a `fit` call. Its `transform` scores
+            new token lists like `fitted_vectorizer.FittedVectorizer.transform`.
     """
-    # Convert list of tokens back to strings
-    df[token_column] = df[token_column].apply(ast.literal_eval)
-    df[token_column] = df[token_column].apply(lambda tokens: ' '.join(tokens))
-    
-    # Initialize TfidfVectorizer
+    # Same weighting as `tfidf_from_token_ids`, so `transform` on new token lists matches the computed rows
     vectorizer = TfidfVectorizer(
-        lowercase=False,
-        token_pattern=r'\S+',
+        analyzer=split_document,
         smooth_idf=True,
         sublinear_tf=True,
         norm='l2',
         use_idf=True
     )
 
+    report = report or RunReport("vectorization", enabled=False)
+
     # Fit and transform the data
-    tfidf_matrix = vectorizer.fit_transform(df[token_column])
-    tfidf_df = pd.DataFrame(tfidf_matrix.toarray(), columns=vectorizer.get_feature_names_out())
+    with report.stage("TF-IDF fit") as stage:
+        texts = df[token_column]
+        if not is_encoded(texts):
+            texts = encode_texts(texts.apply(split_document))
+        
+        tfidf_matrix, terms, idf = tfidf_from_token_ids(texts, row_weights(df))
+        vectorizer.vocabulary_ = {term: column for column, term in enumerate(terms)}
+        vectorizer.idf_ = idf
+        
+        stage.add(rows_in=len(df), rows_out=tfidf_matrix.shape[0])
+        stage.set(vocabulary_size=len(terms), nnz=tfidf_matrix.nnz)
 
     # Print results
     print("\nTF-IDF Matrix:")
-    print(tfidf_df.head(10))
+    print(f"Shape: {tfidf_matrix.shape[0]:,} documents x {tfidf_matrix.shape[1]:,} terms")
+    print(f"Non-zero entries: {tfidf_matrix.nnz:,} ({tfidf_matrix.nnz / max(np.prod(tfidf_matrix.shape), 1):.4%} density)")
+    for document in sparse_rows_to_dicts(tfidf_matrix[:10], terms):
+        print(document)
+    
+    if not export:
+        return tfidf_matrix, vectorizer
     
-    print("\nConverting result from pandas data frame to CSV file")
+    # Collapsed comments get the row of the text they were collapsed into
+    _, positions = duplicate_positions(df)
+    
+    print("\nSaving sparse TF-IDF matrix to the vectorization store")
     try:
-        output_file_name = VECTORIZATION_DIR / f"vectorization_{TIMESTAMP}.csv"
-        tfidf_df.to_csv(output_file_name, index=False)
-        print(f"Vectorization CSV file successfully exported as {output_file_name}")
-        
-        return tfidf_df
+        with report.stage("Saving vectorization") as stage:
+            store_dir = export_sparse_matrix(tfidf_matrix[positions], terms, vectorizer.idf_, VECTORIZATION_DIR / f"vectorization_{TIMESTAMP}")
+            stage.add(rows_in=len(positions), bytes_written=path_size(store_dir))
+        print(f"Vectorization store successfully exported as {store_dir}")
+    except Exception as e:
+        print("An error occurred while saving the vectorization store:", e)
+    
+    try:
+        with report.stage("Saving fitted vectorizer") as stage:
+            artifact_dir = save_vectorizer(terms, vectorizer.idf_, VECTORIZER_DIR / f"vectorizer_{TIMESTAMP}", preprocessing_steps, len(positions))
+            stage.add(bytes_written=path_size(artifact_dir))
+        print(f"Fitted vectorizer successfully saved as {artifact_dir}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the fitted vectorizer:", e)
+    
+    return tfidf_matrix, vectorizer
     
 def analyze_vocabulary_stats_df(df: pd.DataFrame, token_column: str):
     """
@@ -63,21 +159,27 @@ def analyze_vocabulary_stats_df(df: pd.DataFrame, token_column: str):
     """
     vocab = set()
     doc_lengths = []
-    total_terms = 0
     
-    for tokens in df[token_column]:
+    for tokens in df[token_column].apply(split_document):
         vocab.update(tokens)
         doc_lengths.append(len(tokens))
-        total_terms += len(tokens)
+    
+    # Deduplicated rows count once per comment they stand for
+    sample_weight = row_weights(df)
+    if sample_weight is None:
+        sample_weight = np.ones(len(df))
+    total_terms = int(np.dot(doc_lengths, sample_weight))
     
     print(f"\nCorpus Statistics:")
-    print(f"Total documents: {len(df):,}")
+    print(f"Total documents: {int(sample_weight.sum()):,}")
+    if len(df) < sample_weight.sum():
+        print(f"Unique documents: {len(df):,}")
     print(f"Vocabulary size: {len(vocab):,}")
     print(f"Total terms: {total_terms:,}")
-    print(f"Average document length: {np.mean(doc_lengths):.1f} terms")
+    print(f"Average document length: {total_terms / max(sample_weight.sum(), 1):.1f} terms")
     print(f"Document length range: {min(doc_lengths)} - {max(doc_lengths)} terms")
     
-def main(last_process_of_preprocessing: str) -> None:
+def main(last_process_of_preprocessing: str, preprocessing_steps: list = None, write_metrics: bool = False) -> None:
     """Main function to run TF-IDF vectorization with improved accuracy."""
     
     SOURCE_DIR = None
@@ -94,10 +196,13 @@ def main(last_process_of_preprocessing: str) -> None:
         SOURCE_DIR = TOKENIZATION_OUTPUT_DIR
     elif last_process_of_preprocessing == "Stemming":
         SOURCE_DIR = STEMMING_OUTPUT_DIR
+    elif last_process_of_preprocessing == "Deduplication":
+        SOURCE_DIR = DEDUPLICATION_OUTPUT_DIR
     else:
         SOURCE_DIR = None
     
-    source_files = [str(f) for f in Path(SOURCE_DIR).iterdir() if f.is_file()]
+    # Streamed token stores are directories of part files
+    source_files = [str(f) for f in Path(SOURCE_DIR).iterdir() if f.is_file() or f.is_dir()]
 
     if not source_files:
         print(f"No files found in: {SOURCE_DIR}")
@@ -110,18 +215,37 @@ def main(last_process_of_preprocessing: str) -> None:
     
     print(f"Selected file: {selected_file}")
     
-    source_df = pd.read_csv(SOURCE_DIR / selected_file)
+    source_df = read_stage_file(SOURCE_DIR / selected_file)
 
     print(f"Computing TF-IDF using scikit-learn method...")
     
     # Analyze corpus statistics
     analyze_vocabulary_stats_df(source_df, 'text')
     
+    is_incremental = questionary.confirm(
+        "Add these documents to the incremental TF-IDF state instead of refitting?",
+        default=False
+    ).ask()
+    
+    report = RunReport("vectorization", enabled=write_metrics)
+    report.set_info(source_file=str(selected_file), incremental=is_incremental)
+    
     # Compute TF-IDF
-    tfidf_df = compute_tfidf(source_df, token_column="text")
+    if is_incremental:
+        tfidf_matrix, model = update_tfidf(source_df, token_column="text", report=report)
+        terms = model.terms
+    else:
+        tfidf_matrix, vectorizer = compute_tfidf(source_df, token_column="text", preprocessing_steps=preprocessing_steps, report=report)
+        terms = vectorizer.get_feature_names_out()
+    
+    report_file_name = report.export(RUN_REPORT_DIR / f"vectorization_{TIMESTAMP}.json")
+    if report_file_name:
+        print(f"Run metrics report successfully exported as {report_file_name}")
     
     if questionary.confirm("Generate word cloud visualization?").ask():
-        visualize_word_cloud(tfidf_df)
+        # wordcloud pulls in matplotlib, only import it when a word cloud is drawn
+        from word_cloud import visualize_word_cloud
+        visualize_word_cloud(tfidf_matrix, terms, sample_weight=None if is_incremental else row_weights(source_df))
 
 if __name__ == '__main__':
     main(last_process_of_preprocessing="Tokenizing")
\ No newline at end of file
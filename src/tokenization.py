@@ -3,6 +3,14 @@ import pandas as pd
 import questionary
 
 from constants import TIMESTAMP, DATASET_FILE_PATH, DATA_CLEANING_OUTPUT_DIR, TOKENIZATION_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, STEMMING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR
+from helpers.io import export_stage_file, read_stage_file, is_tokenized
+from helpers.vocabulary import is_encoded
+
+def tokenize_texts(texts: pd.Series) -> pd.Series:
+    if is_tokenized(texts) or is_encoded(texts):
+        return texts
+    
+    return texts.apply(lambda x: x.split())
 
 def main(prev_process: str) -> None:
     print("\nTokenization is starting")
@@ -31,7 +39,7 @@ def main(prev_process: str) -> None:
         
         print(f"Selected file: {selected_file}")
         
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -41,18 +49,17 @@ def main(prev_process: str) -> None:
     print(source_df.head(20))
     
     print("\nTokenization is start to process")
-    source_df['text'] = source_df['text'].apply(lambda x: x.split())
+    source_df['text'] = tokenize_texts(source_df['text'])
         
     print("\nPreview result from tokenization")
     print(source_df.head(20))
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = TOKENIZATION_OUTPUT_DIR / f"tokenization_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Tokenization CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, TOKENIZATION_OUTPUT_DIR, "tokenization", TIMESTAMP)
+        print(f"Tokenization file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Tokenization process is done!")
 
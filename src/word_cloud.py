@@ -1,50 +1,113 @@
-import pandas as pd
+import argparse
 import numpy as np
-from collections import defaultdict
+from pathlib import Path
+from scipy import sparse
 from wordcloud import WordCloud
 
 from constants import TIMESTAMP, VECTORIZATION_DIR, IMG_DIR
+from helpers.io import list_vectorizations, read_sparse_matrix, read_term_aggregates
 
-def visualize_word_cloud(tfidf_df: pd.DataFrame) -> None:
-    """Generate word cloud visualization from the latest TF-IDF results."""
-    
-    # Aggregate TF-IDF scores across all documents
-    tfidf_total = tfidf_df.sum(axis=0).to_dict()
+DEFAULT_THEME = {
+    'background_color': 'white',
+    'colormap': 'viridis',
+    'max_words': 200,
+}
+
+def select_terms(terms: list, scores: np.ndarray, min_percentile: float = 25, max_words: int = 200) -> dict:
+    """
+    Keep the terms scoring at least the `min_percentile` percentile, then the
+    `max_words` best of them. WordCloud would drop the rest anyway, selecting
+    them with numpy keeps huge vocabularies out of Python dicts and sorting.
+    """
+    scores = np.asarray(scores)
+    if not len(scores):
+        return {}
 
     # Filter out very low-scoring terms for cleaner visualization
-    scores = list(tfidf_total.values())
-    min_score = np.percentile(scores, 25)  # Keep top 75%
-    filtered_scores = {
-        term: score for term, score in tfidf_total.items()
-        if score >= min_score
-    }
+    candidates = np.flatnonzero(scores >= np.percentile(scores, min_percentile))
+
+    if len(candidates) > max_words:
+        candidates = candidates[np.argpartition(scores[candidates], -max_words)[-max_words:]]
+
+    return {terms[i]: float(scores[i]) for i in candidates}
+
+def render_word_cloud(terms: list, scores: np.ndarray, **theme) -> None:
+    """Draw a word cloud from per-term TF-IDF totals and save it as PNG."""
+    theme = {**DEFAULT_THEME, **theme}
+    filtered_scores = select_terms(terms, scores, max_words=theme['max_words'])
 
     if not filtered_scores:
         print("No significant terms found for word cloud generation.")
         return
-    
+
     # Generate word cloud with improved parameters
     wordcloud = WordCloud(
-        width=1200, 
-        height=600, 
-        background_color='white',
-        max_words=200,
-        colormap='viridis',
+        width=1200,
+        height=600,
+        background_color=theme['background_color'],
+        max_words=theme['max_words'],
+        colormap=theme['colormap'],
         relative_scaling=0.5,
         min_font_size=10
     )
     wordcloud.generate_from_frequencies(filtered_scores)
-    
+
     print("\nConverting result from wordcloud data frame to png file")
     try:
         output_file_name = IMG_DIR / f"word_cloud_{TIMESTAMP}.png"
         wordcloud.to_file(output_file_name)
-        print(f"Tokenization CSV file successfully exported as {output_file_name}")
+        print(f"Word cloud PNG file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
-    
+        print("An error occurred while saving the PNG file:", e)
+
     print("Word cloud process is done!")
     print(f"Word cloud contains {len(filtered_scores):,} terms")
 
+def visualize_word_cloud(tfidf_matrix: sparse.spmatrix, terms: list, sample_weight: np.ndarray = None, **theme) -> None:
+    """
+    Generate word cloud visualization from the latest sparse TF-IDF results.
+    `sample_weight` is the number of comments every row stands for, when the
+    rows were deduplicated.
+    """
+
+    # Aggregate TF-IDF scores across all documents (column sums stay sparse-friendly)
+    if sample_weight is None:
+        column_sums = np.asarray(tfidf_matrix.sum(axis=0)).ravel()
+    else:
+        column_sums = tfidf_matrix.T @ sample_weight
+    render_word_cloud(terms, column_sums, **theme)
+
+def visualize_word_cloud_from_file(matrix_file: Path, **theme) -> None:
+    """
+    Generate word cloud visualization for a saved vectorization. Uses the
+    per-term aggregates sidecar when it exists, so the matrix is not loaded;
+    older vectorizations without it fall back to summing the matrix.
+    """
+    terms, column_sums = read_term_aggregates(matrix_file)
+
+    if len(column_sums):
+        render_word_cloud(terms, column_sums, **theme)
+    else:
+        print("No aggregates sidecar found, summing the TF-IDF matrix")
+        visualize_word_cloud(*read_sparse_matrix(matrix_file), **theme)
+
 if __name__ == '__main__':
-    visualize_word_cloud()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Regenerate a word cloud from a saved vectorization.")
+    parser.add_argument('matrix_file', nargs='?', type=Path, help="Vectorization store or .npz file (default: the latest one)")
+    parser.add_argument('--colormap', default=DEFAULT_THEME['colormap'], help="Matplotlib colormap name")
+    parser.add_argument('--background-color', default=DEFAULT_THEME['background_color'])
+    parser.add_argument('--max-words', type=int, default=DEFAULT_THEME['max_words'])
+    args = parser.parse_args()
+
+    matrix_files = [args.matrix_file] if args.matrix_file else list_vectorizations(VECTORIZATION_DIR)
+
+    if not matrix_files:
+        print("No file found in :", VECTORIZATION_DIR)
+    else:
+        print(f"Selected file: {matrix_files[-1]}")
+        visualize_word_cloud_from_file(
+            matrix_files[-1],
+            colormap=args.colormap,
+            background_color=args.background_color,
+            max_words=args.max_words
+        )
@@ -1,10 +1,173 @@
+import numpy as np
 import pandas as pd
+from functools import lru_cache
 from pathlib import Path
 import re
 import questionary
-from constants import TIMESTAMP, DATASET_FILE_PATH, TOKENIZATION_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, STEMMING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, DICTIONARY_PATH
+from constants import TIMESTAMP, DATASET_FILE_PATH, TOKENIZATION_OUTPUT_DIR, WORD_REPAIR_OUTPUT_DIR, DATA_CLEANING_OUTPUT_DIR, STOPWORD_OUTPUT_DIR, STEMMING_OUTPUT_DIR, CASE_FOLDING_OUTPUT_DIR, CUSTOM_DICTIONARY_FILE_PATH
+from helpers.io import export_stage_file, read_stage_file
+from helpers.vocabulary import TokenMap, flatten_texts, get_vocabulary, is_encoded
 from rapidfuzz import process, fuzz
 
+@lru_cache(maxsize=1)
+def load_dictionary() -> dict:
+    dictionary_df = pd.read_csv(CUSTOM_DICTIONARY_FILE_PATH)
+
+    # Fungsi koreksi menggunakan RapidFuzz
+    # custom_kamus sekarang adalah dict, contoh: { "gw": "saya", "elo": "kamu", ... }
+
+    # Jangan konversi ke set, biarkan tetap dict
+    # custom_kamus = {"gue": "saya", ...} sudah dari file JSON
+
+    return dict(zip(dictionary_df['informal'], dictionary_df['formal']))
+
+WORD_PATTERN = re.compile(r'\w+')
+
+def build_normalizer(dictionary_dict: dict) -> tuple:
+    """
+    Split the dictionary into a one-word lookup table and a table of
+    multi-word entries indexed by their first word.
+
+    Returns:
+        single_words: {informal word: formal replacement}
+        phrases: {first word: [(words of the entry, replacement), ...]}, longest entry first
+    """
+    single_words = {}
+    phrases = {}
+    
+    for informal, formal in dictionary_dict.items():
+        words = tuple(informal.split())
+        if len(words) == 1:
+            single_words[informal] = formal
+        elif words:
+            phrases.setdefault(words[0], []).append((words, formal))
+    
+    for entries in phrases.values():
+        entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+    
+    return single_words, phrases
+
+@lru_cache(maxsize=1)
+def load_normalizer() -> tuple:
+    return build_normalizer(load_dictionary())
+
+def build_repair_map(single_words: dict) -> TokenMap:
+    """Token ID table of the one-word entries, for encoded columns."""
+    return TokenMap(lambda terms: [single_words[term].split() if term in single_words else [term] for term in terms])
+
+@lru_cache(maxsize=1)
+def load_repair_map() -> TokenMap:
+    return build_repair_map(load_normalizer()[0])
+
+def match_phrase(words: list, position: int, phrases: dict, separators: list = None) -> tuple:
+    """Return (entry length, replacement) of the longest multi-word entry starting at `position`."""
+    for entry_words, replacement in phrases.get(words[position], ()):
+        end = position + len(entry_words)
+        if end > len(words) or tuple(words[position:end]) != entry_words:
+            continue
+        # In raw text the words of an entry must be separated by exactly one space
+        if separators is not None and any(separator != ' ' for separator in separators[position + 1:end]):
+            continue
+        return len(entry_words), replacement
+    
+    return 0, None
+
+def repair_text(text: str, single_words: dict, phrases: dict) -> str:
+    if not phrases:
+        return WORD_PATTERN.sub(lambda m: single_words.get(m.group(0), m.group(0)), text)
+    
+    matches = list(WORD_PATTERN.finditer(text))
+    words = [m.group(0) for m in matches]
+    # separators[i] is the text between word i - 1 and word i
+    separators = [''] + [text[matches[i - 1].end():matches[i].start()] for i in range(1, len(matches))]
+    
+    pieces = []
+    last_end = 0
+    i = 0
+    while i < len(words):
+        length, replacement = match_phrase(words, i, phrases, separators) if words[i] in phrases else (0, None)
+        if not length and words[i] in single_words:
+            length, replacement = 1, single_words[words[i]]
+        
+        if length:
+            pieces.append(text[last_end:matches[i].start()])
+            pieces.append(replacement)
+            last_end = matches[i + length - 1].end()
+            i += length
+        else:
+            i += 1
+    
+    pieces.append(text[last_end:])
+    return ''.join(pieces)
+
+def repair_tokens(tokens: list, single_words: dict, phrases: dict) -> list:
+    repaired = []
+    i = 0
+    while i < len(tokens):
+        length, replacement = match_phrase(tokens, i, phrases) if tokens[i] in phrases else (0, None)
+        if not length and tokens[i] in single_words:
+            length, replacement = 1, single_words[tokens[i]]
+        
+        if length:
+            # A replacement may hold several words ("makasih" -> "terima kasih")
+            repaired.extend(replacement.split())
+            i += length
+        else:
+            repaired.append(tokens[i])
+            i += 1
+    
+    return repaired
+
+def repair_token_ids(texts: pd.Series, single_words: dict, phrases: dict, repair_map: TokenMap) -> pd.Series:
+    """
+    Repair an encoded column with one table lookup per token. Only the rows
+    holding the first word of a multi-word entry are decoded and go through
+    `repair_tokens`.
+    """
+    repaired = repair_map.apply_texts(texts)
+    
+    vocabulary = get_vocabulary()
+    phrase_ids = [vocabulary.ids[word] for word in phrases if word in vocabulary.ids]
+    if not phrase_ids:
+        return repaired
+    
+    ids, offsets = flatten_texts(texts)
+    phrase_rows = np.unique(np.searchsorted(offsets, np.flatnonzero(np.isin(ids, phrase_ids)), side='right') - 1)
+    if not len(phrase_rows):
+        return repaired
+    
+    values = repaired.tolist()
+    for position in phrase_rows.tolist():
+        values[position] = vocabulary.encode(repair_tokens(vocabulary.decode(texts.iloc[position]), single_words, phrases))
+    
+    return pd.Series(values, index=texts.index, name=texts.name, dtype=object)
+
+def repair_words(texts: pd.Series, dictionary_dict: dict = None) -> pd.Series:
+    """
+    Replace informal words with their formal form using one dictionary lookup
+    per word, so the cost does not grow with the size of the dictionary.
+    Works on raw strings, on token lists and on token ID arrays.
+    """
+    if dictionary_dict is None:
+        single_words, phrases = load_normalizer()
+        repair_map = load_repair_map() if is_encoded(texts) else None
+    else:
+        single_words, phrases = build_normalizer(dictionary_dict)
+        repair_map = build_repair_map(single_words) if is_encoded(texts) else None
+    
+    if repair_map is not None:
+        return repair_token_ids(texts, single_words, phrases, repair_map)
+    
+    return pd.Series(
+        [
+            repair_tokens(value, single_words, phrases) if isinstance(value, list)
+            else repair_text(value, single_words, phrases)
+            for value in texts
+        ],
+        index=texts.index,
+        name=texts.name
+    )
+
 def main(prev_process: str = None) -> None:
     print("\nWord repair is starting")
     
@@ -31,7 +194,7 @@ def main(prev_process: str = None) -> None:
         selected_file: str = questionary.select(f"Select {prev_process} file", choices=source_files).ask()
         
         print(f"Selected file: {selected_file}")
-        source_df = pd.read_csv(SOURCE_DIR / selected_file)
+        source_df = read_stage_file(SOURCE_DIR / selected_file)
     else:
         selected_file = DATASET_FILE_PATH
         source_df = pd.read_csv(selected_file)
@@ -41,35 +204,20 @@ def main(prev_process: str = None) -> None:
     print(source_df.head(20))
     
     print("\nLoad dictionary")
-    dictionary_df = pd.read_csv(DICTIONARY_PATH / "custom_dictionary.csv")
-
-    # Fungsi koreksi menggunakan RapidFuzz
-    # custom_kamus sekarang adalah dict, contoh: { "gw": "saya", "elo": "kamu", ... }
-
-    # Jangan konversi ke set, biarkan tetap dict
-    # custom_kamus = {"gue": "saya", ...} sudah dari file JSON
-
-    dictionary_dict = dict(zip(dictionary_df['informal'], dictionary_df['formal']))
+    dictionary_dict = load_dictionary()
     
-    pattern = re.compile(r'\b(' + '|'.join(map(re.escape, dictionary_dict.keys())) + r')\b')
-
-    # def word_correction(word: str):
-    #     return dictionary_dict.get(key=word, default=word)
-
-    # source_df['text'] = source_df['text'].apply(lambda sentence: [word_correction(word) for word in sentence])
-    source_df['text'] = source_df['text'].str.replace(pattern, lambda m: dictionary_dict[m.group(0)], regex=True)
+    source_df['text'] = repair_words(source_df['text'], dictionary_dict)
 
     print(f"\nPreview result from stopword removal")
     print(source_df.head(20))
 
     
-    print("\nConverting result from pandas data frame to CSV file")
+    print("\nSaving result from pandas data frame")
     try:
-        output_file_name = WORD_REPAIR_OUTPUT_DIR / f"word_repair_{TIMESTAMP}.csv"
-        source_df.to_csv(output_file_name, index=False)
-        print(f"Word repair CSV file successfully exported as {output_file_name}")
+        output_file_name = export_stage_file(source_df, WORD_REPAIR_OUTPUT_DIR, "word_repair", TIMESTAMP)
+        print(f"Word repair file successfully exported as {output_file_name}")
     except Exception as e:
-        print("An error occurred while saving the CSV file:", e)
+        print("An error occurred while saving the file:", e)
     
     print("Word repair process is done!")
 
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+# The modules under src import each other as top-level modules (`from constants import ...`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def tiny_model_dir(tmp_path_factory):
+    """A randomly initialised 2-layer BERT sentiment classifier with a character vocabulary, saved locally."""
+    torch = pytest.importorskip('torch')
+    transformers = pytest.importorskip('transformers')
+
+    model_dir = tmp_path_factory.mktemp("tiny-bert")
+    vocab_file = model_dir / "vocab.txt"
+    vocab_file.write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', *'abcdefghijklmnopqrstuvwxyz0123456789']), encoding='utf-8')
+    transformers.BertTokenizer(str(vocab_file)).save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=41,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        num_labels=3
+    )
+    transformers.BertForSequenceClassification(config).save_pretrained(model_dir)
+
+    return model_dir
@@ -0,0 +1,77 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+pytest.importorskip('Sastrawi')
+
+from helpers.io import read_stage_file
+
+
+BASE_PATH = Path(__file__).resolve().parent.parent
+NUM_ROWS = 12
+LEXICON = {'diskon': 'positive', 'mahal': 'negative', 'token': 'neutral', 'listrik': 'neutral', 'murah': 'positive'}
+
+
+@pytest.fixture
+def project_dir(tmp_path) -> Path:
+    """
+    A copy of the project whose outputs land under tmp_path: the paths in
+    `constants` are relative to the copied `src`. The dataset is cut down,
+    uncached Sastrawi stemming is slow.
+    """
+    shutil.copytree(BASE_PATH / "src", tmp_path / "src", ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(BASE_PATH / "config", tmp_path / "config")
+    (tmp_path / "data" / "dataset").mkdir(parents=True)
+    (tmp_path / "data" / "dictionary").mkdir()
+    shutil.copy(BASE_PATH / "data" / "dictionary" / "custom_dictionary.csv", tmp_path / "data" / "dictionary")
+
+    dataset = pd.read_csv(BASE_PATH / "data" / "dataset" / "tiktok_comments_text.csv").head(NUM_ROWS)
+    dataset.to_csv(tmp_path / "data" / "dataset" / "tiktok_comments_text.csv", index=False)
+    with open(tmp_path / "data" / "dictionary" / "lexicon.jsonl", 'w', encoding='utf-8') as file:
+        file.writelines(json.dumps({'token': token, 'label': label}) + "\n" for token, label in LEXICON.items())
+
+    return tmp_path
+
+def run_batch(project_dir: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "src/batch.py", "--config", "config/pipeline.yaml", *args],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+        timeout=300
+    )
+
+
+def test_headless_run_from_pipeline_config(project_dir):
+    run = run_batch(project_dir)
+
+    assert run.returncode == 0, run.stderr
+    assert "=== BATCH RUN IS DONE ===" in run.stdout
+
+    # The last step of config/pipeline.yaml is tokenizing, written as a token store
+    tokenized, = (project_dir / "data" / "preprocessed-data" / "tokenization").iterdir()
+    tokenized_df = read_stage_file(tokenized)
+    assert tokenized_df['index'].tolist() == list(range(1, NUM_ROWS + 1))
+    assert all(isinstance(tokens, list) for tokens in tokenized_df['text'])
+
+    assert len(list((project_dir / "data" / "vectorization").glob("vectorization_*"))) == 1
+
+    sentiment_file, = (project_dir / "data" / "sentiment").iterdir()
+    sentiment_df = pd.read_csv(sentiment_file)
+    assert sentiment_df['index'].tolist() == list(range(1, NUM_ROWS + 1))
+    assert set(sentiment_df['sentiment']) <= {'positive', 'negative'}
+
+    report_file, = (project_dir / "data" / "reports").glob("batch_*.json")
+    assert json.loads(report_file.read_text(encoding='utf-8'))
+
+def test_invalid_config_exits_with_error(project_dir):
+    run = run_batch(project_dir, "--steps", "data-cleaning,no-such-step")
+
+    assert run.returncode == 1
+    assert "ERROR" in run.stderr
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from constants import DATASET_FILE_PATH
+from data_cleaning import clean_text_batch, clean_text_data, clean_text_data_stepwise
+
+
+def test_fused_cleaners_match_stepwise_cleaner_on_sample_dataset():
+    texts = pd.read_csv(DATASET_FILE_PATH)['text'].tolist()
+    expected = [clean_text_data_stepwise(text) for text in texts]
+
+    assert [clean_text_data(text) for text in texts] == expected
+    assert clean_text_batch(texts) == expected
+
+def test_fused_cleaners_match_stepwise_cleaner_on_noisy_text():
+    texts = [
+        "Mantappp bgt!!! @pln_123 #diskonlistrik https://t.co/abc ok",
+        "1111",
+        "a b  c   d",
+        "token\tlistrik\nmahal ??? 😂😂",
+        "",
+    ]
+
+    expected = [clean_text_data_stepwise(text) for text in texts]
+
+    assert [clean_text_data(text) for text in texts] == expected
+    assert clean_text_batch(texts) == expected
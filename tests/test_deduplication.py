@@ -0,0 +1,70 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+import deduplication
+from deduplication import NEAR_DUPLICATE_THRESHOLD, deduplicate, minhash_signatures, near_duplicate_groups
+
+
+BASE = "tagihan listrik bulan ini naik terus padahal pemakaian sama saja seperti bulan lalu kok bisa begitu ya pln"
+OTHER = "mantap diskon token listrik dari pln bulan ini terima kasih banyak"
+
+
+def test_exact_duplicates_collapse_into_first_row():
+    df = pd.DataFrame({'index': [1, 2, 3, 4], 'text': ["Token PLN mahal!", OTHER, "token pln  mahal", "TOKEN PLN MAHAL"]})
+
+    result = deduplicate(df, near_duplicates=False)
+
+    assert result['index'].tolist() == [1, 2]
+    assert result['count'].tolist() == [3, 1]
+    assert result['duplicates'].tolist() == ["3 4", ""]
+
+
+def test_near_duplicates_share_earliest_position():
+    texts = [OTHER, BASE, BASE + " tolong", OTHER + " ya", BASE + " dicek"]
+
+    assert near_duplicate_groups(texts).tolist() == [0, 1, 1, 0, 1]
+
+
+def test_similarity_is_not_chained():
+    # Estimated Jaccard: a~b 0.84, b~c 0.83, but a~c only 0.69
+    a = BASE
+    b = BASE + " tolong dicek"
+    c = BASE + " tolong dicek lagi dong min segera"
+
+    assert near_duplicate_groups([a, b, c, OTHER]).tolist() == [0, 0, 2, 3]
+
+    result = deduplicate(pd.DataFrame({'index': [1, 2, 3, 4], 'text': [a, b, c, OTHER]}))
+    assert result['index'].tolist() == [1, 3, 4]
+    assert result['count'].tolist() == [2, 1, 1]
+
+
+def crowded_texts(num_texts: int, seed: int = 0) -> tuple[list, list]:
+    """Comments built from a few words, their LSH buckets are crowded with dissimilar texts. Every fifth is an edited copy."""
+    rng = random.Random(seed)
+    words = "tagihan listrik bulan ini naik token pln mahal diskon mantap bayar kok".split()
+    texts, copies = [], []
+    for position in range(num_texts):
+        if position % 5 == 4:
+            source = rng.randrange(position)
+            texts.append(texts[source] + " ya")
+            copies.append((source, position))
+        else:
+            texts.append(' '.join(rng.choices(words, k=12)))
+    return texts, copies
+
+def test_crowded_buckets_keep_members_similar_to_their_row(monkeypatch):
+    monkeypatch.setattr(deduplication, 'MAX_BUCKET_REPRESENTATIVES', 2)
+    texts, copies = crowded_texts(3_000)
+
+    groups = near_duplicate_groups(texts)
+
+    signatures = minhash_signatures(texts)
+    members = np.flatnonzero(groups != np.arange(len(texts)))
+    agreement = (signatures[members] == signatures[groups[members]]).mean(axis=1)
+    assert np.all(agreement >= NEAR_DUPLICATE_THRESHOLD)
+    assert np.all(groups[members] < members)
+    # Edited copies are still found through their other bands
+    found = sum(groups[copy] == groups[source] for source, copy in copies)
+    assert found >= 0.95 * len(copies)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+from incremental_tf_idf import IncrementalTfidf, sublinear_tf, count_terms, weight_rows
+
+
+BATCHES = [
+    [['listrik', 'mahal'], ['token', 'listrik'], ['bayar', 'token', 'mahal']],
+    [['diskon', 'mantap'], ['diskon', 'listrik'], ['diskon', 'token'], ['diskon']],
+    [['pln', 'diskon', 'mahal']],
+]
+
+
+def refit(model: IncrementalTfidf, num_batches: int = len(BATCHES)) -> np.ndarray:
+    """Rows of the first batches weighted at once with the reference IDF, over the reference columns."""
+    documents = [document for batch in BATCHES[:num_batches] for document in batch]
+    vocabulary = {term: column for term, column in model.vocabulary.items() if column < len(model.reference_idf)}
+    return weight_rows(sublinear_tf(count_terms(documents, vocabulary)), model.reference_idf).toarray()
+
+
+def test_drift_marks_older_parts_stale_without_rewriting_them(tmp_path, monkeypatch):
+    model = IncrementalTfidf(tmp_path, drift_threshold=0.1)
+    model.partial_fit_transform(BATCHES[0])
+
+    written = []
+    write_matrix = model.write_matrix
+    monkeypatch.setattr(model, 'write_matrix', lambda matrix, kind, num_part: written.append((kind, num_part)) or write_matrix(matrix, kind, num_part))
+    model.partial_fit_transform(BATCHES[1])
+
+    assert model.idf_version == 1
+    assert model.stale_parts() == [0]
+    assert written == [("tf", 1), ("tfidf", 1)]
+
+
+def test_stale_parts_are_reweighted_on_read(tmp_path):
+    model = IncrementalTfidf(tmp_path, drift_threshold=0.1)
+    for batch in BATCHES[:2]:
+        model.partial_fit_transform(batch)
+
+    # The last batch is below the drift threshold, so it keeps its own weights
+    model.partial_fit_transform(BATCHES[2])
+    matrix = model.matrix().toarray()
+
+    assert model.stale_parts() == []
+    np.testing.assert_allclose(matrix[:7, :len(model.reference_idf)], refit(model, 2))
+
+    # The re-weighted parts were written back, a reloaded state reads the same rows
+    reloaded = IncrementalTfidf(tmp_path)
+    assert reloaded.part_versions == [1, 1, 1]
+    np.testing.assert_allclose(reloaded.matrix().toarray(), matrix)
+
+
+def test_renormalize_reweights_every_part(tmp_path):
+    model = IncrementalTfidf(tmp_path, drift_threshold=None)
+    for batch in BATCHES:
+        model.partial_fit_transform(batch)
+
+    model.renormalize()
+
+    assert IncrementalTfidf(tmp_path).part_versions == [1, 1, 1]
+    np.testing.assert_allclose(model.matrix().toarray(), refit(model))
@@ -0,0 +1,125 @@
+import csv
+import json
+
+import pandas as pd
+import pytest
+
+from JSONtoCSV import extract_text_to_csv, extract_text_to_csv_streaming, iter_json_records
+
+
+RECORDS = [
+    {'text': "Token listrik, [mahal] bgt", 'authorMeta': {'name': "andi"}, 'diggCount': 3},
+    {'text': "kok \"diskon\" 50%}] ga masuk?", 'diggCount': 0},
+    {'authorMeta': {'name': "budi"}},
+    {'text': "Mantap 👍 makasih min", 'authorMeta': {}},
+    {'text': "", 'diggCount': None},
+    [1, 2, 3],
+    {'text': "  spasi di akhir \n "},
+]
+# Kecil dan ganjil agar batas chunk jatuh di tengah string, escape, emoji dan pemisah record
+CHUNK_SIZES = [1, 2, 7, 64, 1 << 20]
+
+
+def write_json(path, records, indent=None):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(records, file, ensure_ascii=False, indent=indent)
+    return path
+
+def write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_json_array_matches_json_load(tmp_path, chunk_size, indent):
+    json_file = write_json(tmp_path / "comments.json", RECORDS, indent)
+    with open(json_file, encoding='utf-8') as file:
+        expected = json.load(file)
+
+    assert list(iter_json_records(json_file, chunk_size)) == expected
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_jsonl_matches_json_load(tmp_path, chunk_size):
+    jsonl_file = write_jsonl(tmp_path / "comments.jsonl", RECORDS)
+    with open(jsonl_file, encoding='utf-8') as file:
+        expected = [json.loads(line) for line in file]
+
+    assert list(iter_json_records(jsonl_file, chunk_size)) == expected
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_leading_whitespace_before_array(tmp_path, chunk_size):
+    json_file = tmp_path / "comments.json"
+    json_file.write_text("\n" * 10 + json.dumps(RECORDS), encoding='utf-8')
+
+    assert list(iter_json_records(json_file, chunk_size)) == RECORDS
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_empty_array(tmp_path, chunk_size):
+    json_file = tmp_path / "comments.json"
+    json_file.write_text(" [ ] \n", encoding='utf-8')
+
+    assert list(iter_json_records(json_file, chunk_size)) == []
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("cut", [1, 10, 25])
+def test_truncated_input_raises_like_json_load(tmp_path, chunk_size, cut):
+    content = json.dumps(RECORDS, ensure_ascii=False)
+    json_file = tmp_path / "comments.json"
+    json_file.write_text(content[:-cut], encoding='utf-8')
+
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(content[:-cut])
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(json_file, chunk_size))
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_truncated_jsonl_keeps_complete_records(tmp_path, chunk_size):
+    jsonl_file = tmp_path / "comments.jsonl"
+    content = "".join(json.dumps(record) + "\n" for record in RECORDS)
+    jsonl_file.write_text(content[:-10], encoding='utf-8')
+
+    records = iter_json_records(jsonl_file, chunk_size)
+    assert [next(records) for _ in RECORDS[:-1]] == RECORDS[:-1]
+    with pytest.raises(json.JSONDecodeError):
+        next(records)
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_streaming_csv_matches_json_load_csv(tmp_path, chunk_size, capsys):
+    json_file = write_json(tmp_path / "comments.json", RECORDS)
+
+    expected = extract_text_to_csv(json_file, tmp_path / "expected.csv")
+    stats = extract_text_to_csv_streaming(json_file, tmp_path / "streamed.csv", chunk_size=chunk_size, batch_size=2)
+
+    streamed = pd.read_csv(tmp_path / "streamed.csv", keep_default_na=False)
+    assert streamed['index'].tolist() == expected['index'].tolist()
+    assert streamed['text'].tolist() == expected['text'].tolist()
+    assert stats['records'] == len(RECORDS)
+    assert stats['extracted'] == len(expected)
+
+def test_missing_fields_are_left_empty(tmp_path, capsys):
+    jsonl_file = write_jsonl(tmp_path / "comments.jsonl", RECORDS)
+    output_file = tmp_path / "comments.csv"
+
+    stats = extract_text_to_csv_streaming(jsonl_file, output_file, fields=('authorMeta.name', 'diggCount'), chunk_size=7)
+
+    with open(output_file, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    assert rows == [
+        ['index', 'text', 'authorMeta.name', 'diggCount'],
+        ['1', "Token listrik, [mahal] bgt", "andi", '3'],
+        ['2', "kok \"diskon\" 50%}] ga masuk?", '', '0'],
+        ['4', "Mantap 👍 makasih min", '', ''],
+        ['5', '', '', ''],
+        ['7', "  spasi di akhir \n ", '', ''],
+    ]
+    assert stats['missing_fields'] == {'text': 2, 'authorMeta.name': 5, 'diggCount': 5}
+    assert "2 record tidak memiliki field 'text' (pertama: record ke-3)" in capsys.readouterr().out
+
+def test_truncated_file_returns_none(tmp_path, capsys):
+    json_file = tmp_path / "comments.json"
+    json_file.write_text(json.dumps(RECORDS)[:-5], encoding='utf-8')
+
+    assert extract_text_to_csv_streaming(json_file, tmp_path / "comments.csv", chunk_size=7) is None
+    assert "bukan format JSON yang valid" in capsys.readouterr().out
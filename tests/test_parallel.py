@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('Sastrawi')
+
+import stemming
+from constants import DATASET_FILE_PATH
+from data_cleaning import clean_texts
+from helpers.vocabulary import decode_texts, encode_texts
+from stemming import StemCache, stem_texts
+
+
+# Small enough to split the sample dataset into many shards
+SHARD_SIZE = 7
+
+
+@pytest.fixture
+def texts() -> pd.Series:
+    # A shuffled, non-default index checks that rows come back in place
+    texts = pd.read_csv(DATASET_FILE_PATH)['text']
+    return texts.sample(frac=1, random_state=0)
+
+@pytest.fixture
+def fresh_stem_cache(monkeypatch):
+    """A stem cache without a file, so neither run starts warm or writes the dictionary cache."""
+    def reset():
+        monkeypatch.setattr(stemming, 'stem_cache', StemCache(stemming.get_stemmer().delegatedStemmer))
+        monkeypatch.setattr(stemming, 'stem_map', None)
+    return reset
+
+
+def test_parallel_cleaning_matches_serial(texts):
+    serial = clean_texts(texts, workers=1)
+    parallel = clean_texts(texts, workers=2, shard_size=SHARD_SIZE)
+
+    pd.testing.assert_series_equal(parallel, serial)
+
+def test_parallel_cleaning_of_token_lists_matches_serial(texts):
+    tokens = texts.str.split()
+
+    pd.testing.assert_series_equal(clean_texts(tokens, workers=2, shard_size=SHARD_SIZE), clean_texts(tokens, workers=1))
+
+# Sastrawi stems an uncached word in tens of milliseconds, so the stemming check uses few distinct words
+STEMMING_TEXTS = pd.Series([
+    "tagihan listriknya dinaikkan",
+    "pembayaran token dipercepat",
+    "",
+    "pelayanan pln mengecewakan sekali",
+    "listriknya padam lagi",
+    "membayar tagihan pelayanan",
+    "diskon token menyenangkan",
+], index=[7, 3, 5, 0, 6, 2, 1])
+
+@pytest.mark.parametrize('column', ['strings', 'token_lists', 'token_ids'])
+def test_parallel_stemming_matches_serial(fresh_stem_cache, column):
+    cleaned = STEMMING_TEXTS
+    if column != 'strings':
+        cleaned = cleaned.str.split()
+    if column == 'token_ids':
+        cleaned = encode_texts(cleaned)
+
+    fresh_stem_cache()
+    serial = stem_texts(cleaned, workers=1)
+    fresh_stem_cache()
+    # Shards of distinct words: 3 words per shard gives several shards
+    parallel = stem_texts(cleaned, workers=2, shard_size=3)
+
+    if column == 'token_ids':
+        serial, parallel = decode_texts(serial), decode_texts(parallel)
+    pd.testing.assert_series_equal(parallel, serial)
@@ -0,0 +1,118 @@
+import pandas as pd
+import pytest
+
+import pipeline
+from constants import DATASET_FILE_PATH
+from helpers.io import read_stage_file
+from helpers.stage_cache import StageCache
+
+
+STEPS = ["Data cleaning", "Case folding", "Tokenizing", "Stopword removal", "Word repair"]
+
+
+@pytest.fixture
+def output_dirs(monkeypatch, tmp_path):
+    """Write step outputs under tmp_path instead of data/preprocessed-data."""
+    for step, (transform, output_dir, prefix) in pipeline.PREPROCESSING_STEPS.items():
+        monkeypatch.setitem(pipeline.PREPROCESSING_STEPS, step, (transform, tmp_path / output_dir.name, prefix))
+    return tmp_path
+
+@pytest.fixture
+def applied_steps(monkeypatch):
+    """Steps actually computed by `apply_steps`, in call order."""
+    applied = []
+    apply_steps = pipeline.apply_steps
+
+    def record(df, steps, **kwargs):
+        applied.extend(steps)
+        return apply_steps(df, steps, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'apply_steps', record)
+    return applied
+
+
+def test_fingerprint_covers_shared_helper_modules(monkeypatch, tmp_path):
+    pipeline.step_fingerprint.cache_clear()
+    before = pipeline.step_fingerprint("Tokenizing")
+
+    # Pretend helpers/vocabulary.py was edited
+    edited = tmp_path / "vocabulary.py"
+    edited.write_text("# edited\n", encoding='utf-8')
+    find_spec = pipeline.util.find_spec
+    monkeypatch.setattr(pipeline.util, 'find_spec', lambda name: type('Spec', (), {'origin': str(edited)}) if name == "helpers.vocabulary" else find_spec(name))
+    pipeline.step_fingerprint.cache_clear()
+
+    assert pipeline.step_fingerprint("Tokenizing") != before
+    pipeline.step_fingerprint.cache_clear()
+
+def test_fingerprint_covers_cache_format_version(monkeypatch):
+    pipeline.step_fingerprint.cache_clear()
+    before = pipeline.step_fingerprint("Case folding")
+
+    monkeypatch.setattr(pipeline, 'CACHE_FORMAT_VERSION', pipeline.CACHE_FORMAT_VERSION + 1)
+    pipeline.step_fingerprint.cache_clear()
+
+    assert pipeline.step_fingerprint("Case folding") != before
+    pipeline.step_fingerprint.cache_clear()
+
+def test_data_cleaning_after_tokenizing_cleans_every_token():
+    df = pd.DataFrame({'index': [1, 2, 3], 'text': ["Mantappp bgt!!! @pln_123", "a tagihan ??? naik", ""]})
+
+    result = pipeline.apply_steps(df.copy(), ["Tokenizing", "Data cleaning"], token_ids=True)
+
+    assert result['text'].tolist() == [["Mantap", "bgt"], ["tagihan", "naik"], []]
+
+
+def test_checkpoints_hold_every_intermediate_step(output_dirs):
+    result = pipeline.run_pipeline(STEPS[:3], save_checkpoints=True)
+
+    for step in STEPS[:3]:
+        _, output_dir, _ = pipeline.PREPROCESSING_STEPS[step]
+        assert len(list(output_dir.iterdir())) == 1
+    assert read_stage_file(next((output_dirs / "tokenization").iterdir()))['text'].tolist() == result['text'].tolist()
+
+def test_resuming_from_stage_cache_skips_cached_steps(output_dirs, applied_steps, tmp_path):
+    stage_cache = StageCache(tmp_path / "cache")
+    uncached = pipeline.run_pipeline(STEPS)
+
+    # A shorter run caches the prefix, the full run then only computes the rest
+    pipeline.run_pipeline(STEPS[:3], stage_cache=stage_cache)
+    applied_steps.clear()
+    resumed = pipeline.run_pipeline(STEPS, stage_cache=stage_cache)
+
+    assert applied_steps == STEPS[3:]
+    pd.testing.assert_frame_equal(resumed, uncached)
+
+    applied_steps.clear()
+    cached = pipeline.run_pipeline(STEPS, stage_cache=stage_cache)
+
+    assert applied_steps == []
+    pd.testing.assert_frame_equal(cached, uncached)
+
+@pytest.mark.parametrize('output_format', ['auto', 'csv'])
+@pytest.mark.parametrize('token_ids', [True, False])
+def test_streaming_output_equals_in_memory_output(output_dirs, output_format, token_ids, monkeypatch):
+    in_memory = pipeline.run_pipeline(STEPS, output_format=output_format, token_ids=token_ids)
+
+    # Both runs would otherwise write to the same timestamped file
+    monkeypatch.setattr(pipeline, 'TIMESTAMP', "streaming")
+    # 7 rows per chunk splits the sample dataset into many chunks, the last one shorter
+    output_file_name = pipeline.run_pipeline_streaming(STEPS, chunk_size=7, output_format=output_format, token_ids=token_ids)
+
+    _, output_dir, _ = pipeline.PREPROCESSING_STEPS[STEPS[-1]]
+    in_memory_file_name, = [path for path in output_dir.iterdir() if path != output_file_name]
+    pd.testing.assert_frame_equal(read_stage_file(output_file_name), read_stage_file(in_memory_file_name))
+    assert read_stage_file(output_file_name)['index'].tolist() == in_memory['index'].tolist()
+
+def test_streaming_cache_hit_copies_the_output(output_dirs, applied_steps, tmp_path, monkeypatch):
+    stage_cache = StageCache(tmp_path / "cache")
+    first = pipeline.run_pipeline_streaming(STEPS, chunk_size=50, stage_cache=stage_cache)
+    applied_steps.clear()
+
+    # Another run writes under a new timestamp
+    monkeypatch.setattr(pipeline, 'TIMESTAMP', "cached")
+    second = pipeline.run_pipeline_streaming(STEPS, chunk_size=50, stage_cache=stage_cache)
+
+    assert applied_steps == []
+    assert second != first
+    pd.testing.assert_frame_equal(read_stage_file(second), read_stage_file(first))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from sentiment_analysis import predict_sentiment
+
+
+TERMS = ['bagus', 'jelek', 'listrik', 'mantap']
+LEXICON = {'bagus': 'positive', 'jelek': 'negative', 'listrik': 'neutral', 'mantap': 'positive'}
+# Rows: positive, negative, tie, neutral token only, no token
+MATRIX = sparse.csr_matrix(np.array([
+    [0.5, 0.0, 0.2, 0.7],
+    [0.0, 0.9, 0.1, 0.0],
+    [0.6, 0.6, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.0, 0.0, 0.0, 0.0],
+]))
+
+
+def test_labels_are_binary_by_default():
+    labels, summary = predict_sentiment(MATRIX, TERMS, LEXICON)
+
+    assert labels.tolist() == ['positive', 'negative', 'negative', 'negative', 'negative']
+    assert set(summary) == {'documents', 'positive', 'positive_percentage', 'negative', 'negative_percentage', 'conclusion'}
+    assert summary['positive'] == 1 and summary['negative'] == 4
+    assert summary['conclusion'] == 'negative'
+
+
+def test_neutral_tokens_count_against_the_comment_like_the_original_count():
+    documents = [['bagus', 'listrik'], ['bagus', 'mantap', 'listrik'], ['bagus', 'kata_baru'], ['listrik', 'kata_baru']]
+    vocabulary = {term: column for column, term in enumerate(TERMS + ['kata_baru'])}
+    rows = [[vocabulary[token] for token in document] for document in documents]
+    matrix = sparse.csr_matrix(
+        (np.ones(sum(map(len, rows))), [column for row in rows for column in row], np.cumsum([0] + [len(row) for row in rows])),
+        shape=(len(documents), len(vocabulary))
+    )
+
+    labels, _ = predict_sentiment(matrix, list(vocabulary), LEXICON)
+
+    # The original count: positive only with more positive tokens than all other labelled tokens
+    expected = []
+    for document in documents:
+        positive = sum(LEXICON[token] == 'positive' for token in document if token in LEXICON)
+        other = sum(LEXICON[token] != 'positive' for token in document if token in LEXICON)
+        expected.append('positive' if positive > other else 'negative')
+
+    assert labels.tolist() == expected == ['negative', 'positive', 'positive', 'negative']
+
+
+def test_neutral_is_opt_in():
+    labels, summary = predict_sentiment(MATRIX, TERMS, LEXICON, neutral=True)
+
+    assert labels.tolist() == ['positive', 'negative', 'neutral', 'negative', 'neutral']
+    assert summary['neutral'] == 2
+    assert summary['neutral_percentage'] == pytest.approx(40.0)
+    assert summary['conclusion'] == 'negative'
+
+
+def test_sample_weight_counts_comments():
+    labels, summary = predict_sentiment(MATRIX, TERMS, LEXICON, sample_weight=np.array([5, 1, 1, 1, 1]))
+
+    assert summary['documents'] == 9
+    assert summary['positive'] == 5
+    assert summary['positive_percentage'] == pytest.approx(500 / 9)
+    assert summary['conclusion'] == 'positive'
+
+
+def test_main_returns_without_vectorizations(monkeypatch, tmp_path):
+    import sentiment_analysis
+
+    monkeypatch.setattr(sentiment_analysis, 'VECTORIZATION_DIR', tmp_path)
+    monkeypatch.setattr(sentiment_analysis.questionary, 'confirm', lambda *args, **kwargs: type('Prompt', (), {'ask': lambda self: True})())
+    monkeypatch.setattr(sentiment_analysis, 'label_missing_tokens', lambda *args, **kwargs: pytest.fail("nothing to label"))
+
+    assert sentiment_analysis.get_unique_tokens() == set()
+    sentiment_analysis.main()
@@ -0,0 +1,50 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+
+import pandas as pd
+
+from benchmark import LABEL_DISAGREEMENT_TOLERANCE
+from constants import DATASET_FILE_PATH
+from sentiment_analysis import label_tokens, load_quantized_model, quantized_model_file
+
+
+TOKENS = ['bagus', 'jelek', 'listrik', 'token', 'mahal', 'murah', 'diskon', 'pln']
+
+
+def test_quantized_model_is_cached_and_reloaded(tiny_model_dir, tmp_path, monkeypatch):
+    tokenizer = transformers.AutoTokenizer.from_pretrained(tiny_model_dir)
+    model_file = quantized_model_file(str(tiny_model_dir), tmp_path)
+
+    quantized = load_quantized_model(str(tiny_model_dir), tmp_path)
+    assert model_file.exists()
+    assert isinstance(quantized.classifier, torch.ao.nn.quantized.dynamic.Linear)
+
+    # A cache hit must not read the fp32 weights again
+    def fail(*args, **kwargs):
+        raise AssertionError("fp32 weights loaded on a cache hit")
+    monkeypatch.setattr(transformers.AutoModelForSequenceClassification, 'from_pretrained', fail)
+
+    reloaded = load_quantized_model(str(tiny_model_dir), tmp_path)
+    reloaded.eval()
+
+    assert isinstance(reloaded.classifier, torch.ao.nn.quantized.dynamic.Linear)
+    assert label_tokens(reloaded, tokenizer, TOKENS, torch.device("cpu")) == label_tokens(quantized, tokenizer, TOKENS, torch.device("cpu"))
+
+def test_quantized_labels_agree_with_fp32(tiny_model_dir, tmp_path):
+    # The distinct words of the sample dataset, enough for the tolerance to allow some disagreement
+    tokens = sorted(set(' '.join(pd.read_csv(DATASET_FILE_PATH)['text'].astype(str).str.lower()).split()))
+    tokenizer = transformers.AutoTokenizer.from_pretrained(tiny_model_dir)
+    fp32_model = transformers.AutoModelForSequenceClassification.from_pretrained(tiny_model_dir).eval()
+    int8_model = load_quantized_model(str(tiny_model_dir), tmp_path)
+
+    fp32_labels = label_tokens(fp32_model, tokenizer, tokens, torch.device("cpu"))
+    int8_labels = label_tokens(int8_model, tokenizer, tokens, torch.device("cpu"))
+
+    agreement = sum(fp32_labels[token] == int8_labels[token] for token in tokens) / len(tokens)
+    assert len(tokens) > 500
+    assert agreement >= 1 - LABEL_DISAGREEMENT_TOLERANCE
+
+def test_cache_file_depends_on_model(tiny_model_dir, tmp_path):
+    assert quantized_model_file(str(tiny_model_dir), tmp_path) != quantized_model_file("mdhugol/indonesia-bert-sentiment-classification", tmp_path)
@@ -0,0 +1,34 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+
+from sentiment_analysis import auto_labelling_with_indobert, label_tokens, load_sentiment_model
+
+
+TOKENS = ['listrik', 'a', 'diskonnya', 'pln', 'tokenlistrik', 'bagus', 'xy', 'mahal', 'murahbanget', 'ok']
+
+
+def test_batched_labelling_keeps_token_order(tiny_model_dir):
+    labels = auto_labelling_with_indobert(TOKENS, batch_size=3, pretrained=str(tiny_model_dir))
+
+    assert list(labels) == TOKENS
+    assert set(labels.values()) <= {'positive', 'neutral', 'negative'}
+
+def test_batch_size_does_not_change_labels(tiny_model_dir):
+    model, device = load_sentiment_model(str(tiny_model_dir))
+    tokenizer = transformers.AutoTokenizer.from_pretrained(tiny_model_dir)
+
+    one_batch = label_tokens(model, tokenizer, TOKENS, device, batch_size=len(TOKENS))
+    per_token = label_tokens(model, tokenizer, TOKENS, device, batch_size=1)
+
+    assert one_batch == per_token
+
+def test_falls_back_to_cpu_without_cuda(tiny_model_dir, monkeypatch):
+    monkeypatch.setattr(torch.cuda, 'is_available', lambda: False)
+
+    model, device = load_sentiment_model(str(tiny_model_dir))
+
+    assert device.type == 'cpu'
+    assert next(model.parameters()).device.type == 'cpu'
+    assert len(auto_labelling_with_indobert(TOKENS, batch_size=4, num_threads=1, pretrained=str(tiny_model_dir))) == len(TOKENS)
@@ -0,0 +1,19 @@
+import statistics
+
+import pytest
+
+from benchmark import IMPORT_BUDGETS, IMPORT_TIME_RUNS, measure_import
+
+
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS))
+def test_entry_point_import_stays_within_budget(module):
+    budget, heavy_modules = IMPORT_BUDGETS[module]
+    measurements = [measure_import(module, heavy_modules) for _ in range(IMPORT_TIME_RUNS)]
+
+    assert statistics.median(seconds for seconds, _ in measurements) <= budget
+    assert measurements[-1][1] == []
+
+def test_main_does_not_load_heavy_dependencies():
+    _, loaded = measure_import('main', ['pandas', 'sklearn', 'torch', 'Sastrawi'])
+
+    assert loaded == []
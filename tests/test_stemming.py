@@ -0,0 +1,60 @@
+import json
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('Sastrawi')
+
+import pipeline
+import stemming
+from stemming import StemCache
+
+
+class SuffixStemmer:
+    """Stands in for Sastrawi's rule engine, strips a trailing 'nya'."""
+
+    def stem_word(self, word: str) -> str:
+        return word[:-3] if word.endswith('nya') else word
+
+
+@pytest.fixture
+def stem_cache(monkeypatch, tmp_path):
+    cache = StemCache(SuffixStemmer(), cache_file=tmp_path / "stem_cache.json", save_every=3)
+    saves = []
+    save = cache.save
+    monkeypatch.setattr(cache, 'save', lambda: saves.append(cache.is_dirty) or save())
+    monkeypatch.setattr(stemming, 'stem_cache', cache)
+    monkeypatch.setattr(stemming, 'stem_map', None)
+    cache.saves = saves
+
+    return cache
+
+
+def test_checkpoint_saves_every_n_calls(stem_cache):
+    for chunk in (["listriknya mahal"], ["tokennya"], ["bayarnya"], ["pln"]):
+        stemming.stem_texts(pd.Series(chunk))
+
+    assert stem_cache.saves == [True]
+    assert json.loads(stem_cache.cache_file.read_text(encoding='utf-8')) == {
+        'listriknya': 'listrik', 'mahal': 'mahal', 'tokennya': 'token', 'bayarnya': 'bayar'
+    }
+
+    stemming.save_stem_cache()
+    stemming.save_stem_cache()
+
+    assert 'pln' in json.loads(stem_cache.cache_file.read_text(encoding='utf-8'))
+    # The second save found nothing new and did not rewrite the file
+    assert stem_cache.saves == [True, True, False]
+
+
+def test_streaming_run_saves_stem_cache_once(stem_cache, monkeypatch, tmp_path):
+    source_file = tmp_path / "comments.csv"
+    pd.DataFrame({'index': range(1, 6), 'text': ["listriknya mahal", "tokennya", "bayarnya", "pln", "mahal"]}).to_csv(source_file, index=False)
+    module, _, prefix = pipeline.PREPROCESSING_STEPS["Stemming"]
+    monkeypatch.setitem(pipeline.PREPROCESSING_STEPS, "Stemming", (module, tmp_path / "stemming", prefix))
+    stem_cache.save_every = 10
+
+    pipeline.run_pipeline_streaming(["Stemming"], source_file=source_file, chunk_size=1, output_format='csv', token_ids=False)
+
+    assert stem_cache.saves == [True]
+    assert len(json.loads(stem_cache.cache_file.read_text(encoding='utf-8'))) == 5
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('Sastrawi')
+
+from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
+
+from helpers.vocabulary import decode_texts, encode_texts
+from stopword import remove_stopwords
+
+
+def sastrawi_remove(texts: list) -> list:
+    remover = StopWordRemoverFactory().create_stop_word_remover()
+    return [remover.remove(text) for text in texts]
+
+
+def test_matches_sastrawi_without_consecutive_stop_words():
+    texts = ["token pln yang mahal", "bayar listrik di kantor", ""]
+
+    assert remove_stopwords(pd.Series(texts), more_stop_words=[]).tolist() == sastrawi_remove(texts)
+
+
+def test_removes_stop_word_that_follows_another_one():
+    # Sastrawi mutates its word list while iterating it and skips the word after a removed one
+    texts = ["listrik yang dan mahal", "saya dan kamu bayar listrik"]
+
+    assert sastrawi_remove(texts) == ["listrik dan mahal", "dan kamu bayar listrik"]
+    assert remove_stopwords(pd.Series(texts), more_stop_words=[]).tolist() == ["listrik mahal", "kamu bayar listrik"]
+
+
+def test_token_lists_and_token_ids_agree():
+    tokens = pd.Series([["listrik", "yang", "dan", "mahal"], [], ["saya", "dan", "kamu"]])
+    expected = [["listrik", "mahal"], [], ["kamu"]]
+
+    assert remove_stopwords(tokens, more_stop_words=[]).tolist() == expected
+    assert decode_texts(remove_stopwords(encode_texts(tokens), more_stop_words=[])).tolist() == expected
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+
+from fitted_vectorizer import FittedVectorizer, save_vectorizer
+from tf_idf import compute_tfidf
+
+
+DOCUMENTS = [
+    ['listrik', 'diskon', 'mantap', 'diskon'],
+    ['bayar', 'listrik', 'mahal'],
+    ['token', 'pln', 'diskon'],
+    [],
+    ['mahal', 'mahal', 'mahal'],
+]
+NEW_DOCUMENTS = [['diskon', 'listrik'], ['kata', 'baru', 'mahal'], []]
+
+
+@pytest.mark.parametrize('counts', [None, [1, 3, 1, 2, 1]])
+def test_returned_vectorizer_transforms_like_fitted_vectorizer(counts, tmp_path):
+    df = pd.DataFrame({'index': np.arange(1, len(DOCUMENTS) + 1), 'text': DOCUMENTS})
+    if counts is not None:
+        df['count'] = counts
+
+    tfidf_matrix, vectorizer = compute_tfidf(df, 'text', export=False)
+    terms = vectorizer.get_feature_names_out()
+    fitted = FittedVectorizer(save_vectorizer(terms, vectorizer.idf_, tmp_path / "vectorizer"))
+
+    assert list(fitted.terms) == list(terms)
+    np.testing.assert_allclose(vectorizer.transform(DOCUMENTS).toarray(), tfidf_matrix.toarray())
+    np.testing.assert_allclose(fitted.transform(DOCUMENTS).toarray(), tfidf_matrix.toarray())
+    np.testing.assert_allclose(vectorizer.transform(NEW_DOCUMENTS).toarray(), fitted.transform(NEW_DOCUMENTS).toarray())
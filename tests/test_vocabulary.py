@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.vocabulary import TokenMap, Vocabulary, decode_texts, encode_texts, flatten_texts
+
+
+REPLACEMENTS = {'gk': ['tidak'], 'makasih': ['terima', 'kasih'], 'yg': [], 'bgt': ['banget']}
+ROWS = [
+    ['makasih', 'min', 'gk', 'jadi'],
+    [],
+    ['yg', 'yg', 'bgt'],
+    ['listrik', 'makasih'],
+    ['yg'],
+]
+
+
+def map_terms(terms: list) -> list:
+    return [REPLACEMENTS.get(term, [term]) for term in terms]
+
+def string_map(rows: list) -> list:
+    return [[word for token in row for word in REPLACEMENTS.get(token, [token])] for row in rows]
+
+
+@pytest.fixture
+def vocabulary() -> Vocabulary:
+    return Vocabulary()
+
+
+def test_token_map_matches_string_map(vocabulary):
+    texts = pd.Series(ROWS, index=[4, 0, 3, 1, 2], name='text')
+    encoded = encode_texts(texts, vocabulary)
+
+    mapped = TokenMap(map_terms, vocabulary).apply_texts(encoded)
+
+    assert decode_texts(mapped, vocabulary).tolist() == string_map(ROWS)
+    assert mapped.index.tolist() == [4, 0, 3, 1, 2]
+
+def test_token_map_resolves_tokens_added_to_the_vocabulary_later(vocabulary):
+    token_map = TokenMap(map_terms, vocabulary)
+    token_map.apply_texts(encode_texts(pd.Series([['listrik', 'gk']]), vocabulary))
+
+    # 'bgt' and 'makasih' are not in the vocabulary (nor in the table) yet
+    later_rows = [['bgt', 'listrik', 'makasih'], ['baru']]
+    mapped = token_map.apply_texts(encode_texts(pd.Series(later_rows), vocabulary))
+
+    assert decode_texts(mapped, vocabulary).tolist() == string_map(later_rows)
+
+def test_one_to_one_map_keeps_offsets(vocabulary):
+    rows = [['Token', 'PLN'], [], ['Mahal']]
+    ids, offsets = flatten_texts(encode_texts(pd.Series(rows), vocabulary))
+
+    new_ids, new_offsets = TokenMap(lambda terms: [[term.lower()] for term in terms], vocabulary).apply(ids, offsets)
+
+    assert new_offsets is offsets
+    assert vocabulary.decode(new_ids) == ['token', 'pln', 'mahal']
+
+def test_token_map_of_only_deleted_tokens(vocabulary):
+    ids, offsets = flatten_texts(encode_texts(pd.Series([['yg'], ['yg', 'yg']]), vocabulary))
+
+    new_ids, new_offsets = TokenMap(map_terms, vocabulary).apply(ids, offsets)
+
+    assert len(new_ids) == 0
+    assert new_offsets.tolist() == [0, 0, 0]
+
+
+word_repair = pytest.importorskip('word_repair')
+
+DICTIONARY = {
+    'gk': 'tidak',
+    'ga': 'tidak',
+    'makasih': 'terima kasih',
+    'yg': '',
+    'ga tau': 'tidak tahu',
+    'ga tau diri': 'sombong',
+    'sm aja': 'sama saja',
+}
+REPAIR_ROWS = [
+    ['makasih', 'pln', 'gk', 'jadi', 'padam'],
+    ['ga', 'tau', 'kenapa', 'ga', 'tau', 'diri'],
+    [],
+    ['yg', 'penting', 'sm'],
+    ['sm', 'aja', 'ga'],
+    ['kata_baru_sekali', 'ga', 'tau'],
+    ['ga'],
+]
+
+
+def test_repair_token_ids_matches_repair_tokens():
+    single_words, phrases = word_repair.build_normalizer(DICTIONARY)
+    texts = pd.Series(REPAIR_ROWS, index=range(10, 10 + len(REPAIR_ROWS)), name='text')
+
+    repaired = word_repair.repair_token_ids(encode_texts(texts), single_words, phrases, word_repair.build_repair_map(single_words))
+
+    expected = [word_repair.repair_tokens(row, single_words, phrases) for row in REPAIR_ROWS]
+    assert decode_texts(repaired).tolist() == expected
+    assert repaired.index.tolist() == texts.index.tolist()
+    # Expansion, deletion and the longest phrase all took place
+    assert expected[0][:2] == ['terima', 'kasih']
+    assert expected[1] == ['tidak', 'tahu', 'kenapa', 'sombong']
+    assert expected[3] == ['penting', 'sm']
+
+def test_repair_words_on_token_ids_matches_token_lists():
+    texts = pd.Series(REPAIR_ROWS)
+
+    from_ids = word_repair.repair_words(encode_texts(texts), DICTIONARY)
+
+    assert decode_texts(from_ids).tolist() == word_repair.repair_words(texts, DICTIONARY).tolist()
+    assert all(isinstance(ids, np.ndarray) for ids in from_ids)